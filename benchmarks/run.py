@@ -0,0 +1,276 @@
+"""
+Throughput benchmarks for Cache, Core and Simulation.
+
+    python -m benchmarks.run [--cases REGEX] [--scale N] [--output results.json]
+        [--baseline benchmarks/baseline.json] [--threshold 0.1] [--update-baseline]
+
+Every case runs in a fresh process so that its peak RSS is its own, and reports
+records (trace instructions) per second, peak RSS and the time split between
+its components. With --baseline, the run fails if any case's throughput falls
+more than --threshold below the stored one; --update-baseline stores this run
+as the new baseline instead.
+
+Baselines are machine specific, so each build machine keeps its own.
+"""
+from array import array
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import json
+import math
+import multiprocessing
+import platform
+import re
+import resource
+import sys
+import time
+from compact_cache import CompactCache
+from cache import Cache
+from constants import WORD_SIZE_BITS
+from core import Core
+from instruction import OTHER, STORE
+from simulation import Simulation
+from traces import load_trace, resolve_trace_sources
+from benchmarks.synthetic import PATTERNS, SyntheticTrace
+
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+DEFAULT_THRESHOLD = 0.10
+SYNTHETIC_ACCESSES = 100_000
+BLACKSCHOLES_RECORDS = 500_000
+
+GEOMETRIES = {
+    "1k-dm-16": (1024, 1, 16),
+    "4k-2w-32": (4096, 2, 32),
+    "64k-8w-64": (65536, 8, 64),
+}
+
+@dataclass
+class Case:
+    name: str
+    component: str # "cache", "core" or "simulation"
+    trace: str # "bodytrack", "blackscholes" or a synthetic pattern
+    geometry: str
+    cache_engine: str = "default"
+
+@dataclass
+class LimitedTrace:
+    """
+    The first `limit` records of a trace source
+    """
+    source: object
+    limit: int
+
+    @property
+    def name(self) -> str:
+        return self.source.name
+
+    def chunks(self, chunk_size: int, buffer_size: int = None):
+        remaining = self.limit
+        for types, values in self.source.chunks(chunk_size):
+            if remaining <= 0:
+                return
+            yield types[:remaining], values[:remaining]
+            remaining -= len(types)
+
+@dataclass
+class BinaryReplay:
+    """
+    A plain trace file replayed from its memory-mapped binary form, as
+    Simulation does
+    """
+    path: str
+
+    @property
+    def name(self) -> str:
+        return self.path
+
+    def chunks(self, chunk_size: int, buffer_size: int = None):
+        with load_trace(self.path) as trace:
+            # start of the last chunk
+            last = max(len(trace) - 1, 0) // chunk_size * chunk_size
+            for start in range(0, last, chunk_size):
+                yield trace.types[start:start + chunk_size], trace.values[start:start + chunk_size]
+            # copied, as the consumer still holds the last chunk once the trace is closed
+            yield array("B", trace.types[last:]), array("I", trace.values[last:])
+
+def all_cases() -> list[Case]:
+    cases = []
+    for geometry in GEOMETRIES:
+        for trace in ("bodytrack", "blackscholes") + PATTERNS:
+            cases.append(Case(f"simulation/{trace}/{geometry}", "simulation", trace, geometry))
+        for engine in ("default", "compact"):
+            for trace in ("bodytrack", "random", "conflict"):
+                cases.append(Case(f"cache/{engine}/{trace}/{geometry}", "cache", trace, geometry, engine))
+        cases.append(Case(f"core/bodytrack/{geometry}", "core", "bodytrack", geometry))
+    return cases
+
+def trace_sources(trace: str, scale: float):
+    if trace == "bodytrack":
+        return [BinaryReplay(source.path) for source in resolve_trace_sources("bodytrack")]
+    if trace == "blackscholes":
+        return [LimitedTrace(resolve_trace_sources("blackscholes")[0], int(BLACKSCHOLES_RECORDS * scale))]
+    cores = 4 if trace == "sharing" else 1
+    return [SyntheticTrace(trace, int(SYNTHETIC_ACCESSES * scale), seed) for seed in range(cores)]
+
+class _Timed:
+    """
+    Wraps a chunk iterator, adding the time spent producing chunks to `seconds`
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.seconds = 0.0
+        self.records = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            chunk = next(self.chunks)
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.records += len(chunk[0])
+        return chunk
+
+def _run_cache(case: Case, sources) -> tuple[int, dict]:
+    cache_type = CompactCache if case.cache_engine == "compact" else Cache
+    cache = cache_type(0, *GEOMETRIES[case.geometry])
+    chunks = _Timed(sources[0].chunks(1 << 16))
+    decode = lookup = 0.0
+    records = 0
+    read_block, write_block = cache.read_block, cache.write_block
+    for types, values in chunks:
+        stores = [type_code == STORE for type_code in types if type_code != OTHER]
+        addrs = [value for type_code, value in zip(types, values) if type_code != OTHER]
+        records += len(addrs)
+        start = time.perf_counter()
+        set_indexes, tags = cache.decode_addrs(addrs)
+        decoded = time.perf_counter()
+        for is_store, set_ind, tag in zip(stores, set_indexes, tags):
+            if is_store:
+                write_block(set_ind, tag)
+            else:
+                read_block(set_ind, tag)
+        lookup += time.perf_counter() - decoded
+        decode += decoded - start
+    return records, {"decode": decode, "lookup": lookup}
+
+def _run_core(case: Case, sources) -> tuple[int, dict]:
+    core = Core(0, Cache(0, *GEOMETRIES[case.geometry]))
+    chunks = _Timed(sources[0].chunks(1 << 16))
+    core.attach(chunks)
+    start = time.perf_counter()
+    core.run_until(math.inf, 0)
+    total = time.perf_counter() - start
+    return chunks.records, {"trace": chunks.seconds, "execute": total - chunks.seconds}
+
+def _run_simulation(case: Case, sources) -> tuple[int, dict]:
+    timed = []
+
+    @dataclass
+    class TimedSource:
+        source: object
+
+        @property
+        def name(self):
+            return self.source.name
+
+        def chunks(self, chunk_size, buffer_size=None):
+            chunks = _Timed(self.source.chunks(chunk_size))
+            timed.append(chunks)
+            return chunks
+
+    simulation = Simulation(
+        [TimedSource(source) for source in sources], *GEOMETRIES[case.geometry], WORD_SIZE_BITS,
+        cache_engine=case.cache_engine,
+    )
+    start = time.perf_counter()
+    simulation.run()
+    total = time.perf_counter() - start
+    trace = sum(t.seconds for t in timed)
+    return sum(t.records for t in timed), {"trace": trace, "simulate": total - trace}
+
+RUNNERS = {"cache": _run_cache, "core": _run_core, "simulation": _run_simulation}
+
+def run_case(case: Case, scale: float) -> dict:
+    sources = trace_sources(case.trace, scale)
+    start = time.perf_counter()
+    records, components = RUNNERS[case.component](case, sources)
+    seconds = time.perf_counter() - start
+    return {
+        "records": records,
+        "seconds": seconds,
+        "records_per_sec": records / seconds if seconds else 0.0,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "components": components,
+    }
+
+def run_benchmarks(cases: list[Case], scale: float) -> dict:
+    results = {}
+    # a fresh process per case, so peak RSS is not inherited from earlier cases
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[case.name] = executor.submit(run_case, case, scale).result()
+        result = results[case.name]
+        print(f"{case.name:45} {result['records_per_sec']:>12,.0f} records/s {result['peak_rss_kb'] / 1024:>8.1f} MB", flush=True)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": scale,
+        "cases": results,
+    }
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Cases whose throughput fell more than `threshold` below the baseline
+    """
+    failures = []
+    for name, result in results["cases"].items():
+        expected = baseline.get("cases", {}).get(name)
+        if expected is None:
+            continue
+        floor = expected["records_per_sec"] * (1 - threshold)
+        if result["records_per_sec"] < floor:
+            failures.append(
+                f"{name}: {result['records_per_sec']:,.0f} records/s, baseline {expected['records_per_sec']:,.0f}"
+            )
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks.run")
+    parser.add_argument("--cases", default=".", help="regex selecting case names")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for synthetic and blackscholes trace lengths")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in all_cases() if re.search(args.cases, case.name)]
+    results = run_benchmarks(cases, args.scale)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, not checking for regressions")
+        return
+    failures = regressions(results, baseline, args.threshold)
+    if failures:
+        print(f"Throughput regressed more than {args.threshold:.0%}:")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print("No throughput regressions")
+
+if __name__ == "__main__":
+    main()
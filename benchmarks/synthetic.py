@@ -0,0 +1,93 @@
+"""
+Synthetic traces for benchmarking, generated chunk by chunk so that even
+hundreds of millions of accesses are never held in memory at once.
+
+Every access is followed by a short compute record, like the real traces.
+Patterns:
+    streaming  sequential words, so one miss per block
+    random     uniform over a 1 MB footprint, 30% stores
+    conflict   16 blocks 64 KB apart, all mapping to the same set
+    sharing    every core works on the same 4 KB region, 50% stores
+"""
+from array import array
+from dataclasses import dataclass
+import random
+from instruction import LOAD, STORE, OTHER
+try:
+    import numpy as np
+except ImportError: # generation falls back to plain Python
+    np = None
+
+PATTERNS = ("streaming", "random", "conflict", "sharing")
+
+FOOTPRINT_BYTES = 1 << 20
+CONFLICT_STRIDE = 1 << 16
+CONFLICT_BLOCKS = 16
+SHARED_REGION_BYTES = 1 << 12
+STORE_FRACTION = {"streaming": 0.0, "random": 0.3, "conflict": 0.3, "sharing": 0.5}
+
+def _addresses(pattern, start, n, rng):
+    if pattern == "streaming":
+        return [((start + i) * 4) & 0xFFFFFFFF for i in range(n)]
+    if pattern == "random":
+        return [rng.randrange(FOOTPRINT_BYTES) & ~3 for _ in range(n)]
+    if pattern == "conflict":
+        return [rng.randrange(CONFLICT_BLOCKS) * CONFLICT_STRIDE for _ in range(n)]
+    return [rng.randrange(SHARED_REGION_BYTES) & ~3 for _ in range(n)]
+
+def _np_addresses(pattern, start, n, rng):
+    if pattern == "streaming":
+        return ((np.arange(start, start + n, dtype=np.uint64) * 4) & 0xFFFFFFFF).astype(np.uint32)
+    if pattern == "random":
+        return (rng.integers(0, FOOTPRINT_BYTES, n, dtype=np.uint32) & ~np.uint32(3))
+    if pattern == "conflict":
+        return rng.integers(0, CONFLICT_BLOCKS, n, dtype=np.uint32) * np.uint32(CONFLICT_STRIDE)
+    return rng.integers(0, SHARED_REGION_BYTES, n, dtype=np.uint32) & ~np.uint32(3)
+
+@dataclass
+class SyntheticTrace:
+    """
+    A generated trace of `accesses` loads/stores, usable wherever Simulation
+    takes a trace source.
+    """
+    pattern: str
+    accesses: int
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.pattern not in PATTERNS:
+            raise ValueError(f"Unknown pattern {self.pattern}, expected one of {', '.join(PATTERNS)}")
+
+    @property
+    def name(self) -> str:
+        return f"{self.pattern}_{self.seed}"
+
+    def __len__(self):
+        return 2 * self.accesses
+
+    def chunks(self, chunk_size: int, buffer_size: int = None):
+        """
+        Yield (types, values) chunks of up to `chunk_size` records
+        """
+        per_chunk = max(1, chunk_size // 2)
+        store_fraction = STORE_FRACTION[self.pattern]
+        if np is not None:
+            rng = np.random.default_rng(self.seed)
+        else:
+            rng = random.Random(self.seed)
+        for start in range(0, self.accesses, per_chunk):
+            n = min(per_chunk, self.accesses - start)
+            if np is not None:
+                types = np.full(2 * n, OTHER, dtype=np.uint8)
+                types[0::2] = np.where(rng.random(n) < store_fraction, STORE, LOAD)
+                values = np.empty(2 * n, dtype=np.uint32)
+                values[0::2] = _np_addresses(self.pattern, start, n, rng)
+                values[1::2] = rng.integers(1, 5, n, dtype=np.uint32)
+                yield memoryview(types), memoryview(values)
+            else:
+                types = array("B", [OTHER]) * (2 * n)
+                values = array("I", [0]) * (2 * n)
+                types[0::2] = array("B", [STORE if rng.random() < store_fraction else LOAD for _ in range(n)])
+                values[0::2] = array("I", _addresses(self.pattern, start, n, rng))
+                values[1::2] = array("I", [rng.randint(1, 4) for _ in range(n)])
+                yield types, values
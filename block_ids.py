@@ -0,0 +1,205 @@
+"""
+Dense block ids.
+
+Trace addresses are sparse 32-bit values, so whatever is kept per block (a
+set's blocks, LRU links) is a hash map keyed by address. remap_chunks is a
+pre-pass that numbers the distinct blocks of a trace (address >> log2(block
+size)) 0, 1, 2, ... in order of first access, and rewrites the trace with each
+access's value replaced by its block id; compute records keep their cycles.
+A cache can then find a block by indexing an array with its id, see
+dense_cache.py.
+
+Ids only depend on the trace and the block size, so the remapped trace is
+stored next to the original, one file per block size:
+
+    header   magic, format version, record count, block count, block size,
+             sha256 of the source file
+    values   record count x uint32, block ids and compute cycles
+    blocks   block count x uint32, the block address of each id
+    types    record count x uint8
+
+and, like a binary trace, rebuilt once the source changes. Each core's trace
+is numbered on its own. Traces without a file of their own (decoded into
+shared memory, say) are remapped in memory on every run.
+
+    python block_ids.py input_file [block_size]
+"""
+from array import array
+from dataclasses import dataclass, field
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+from instruction import OTHER
+from traces import TraceSource, file_digest, load_trace, resolve_trace_sources
+try:
+    import numpy as np
+except ImportError: # remapping falls back to plain Python
+    np = None
+
+LOGGER = logging.getLogger("coherence")
+
+DENSE_TRACE_MAGIC = b"CCDENSE\0"
+DENSE_TRACE_VERSION = 1
+DENSE_HEADER = struct.Struct("<8sIQQI32s")
+DENSE_HEADER_SIZE = 64
+
+def remap_chunks(chunks, block_size_bytes: int) -> tuple[array, array, array]:
+    """
+    Remap a stream of (types, values) chunks. Returns the types, the values
+    with block ids for addresses, and the block address of each id.
+    """
+    n_block = int(math.log(block_size_bytes, 2))
+    ids = {}
+    out_types, out_values, blocks = array("B"), array("I"), array("I")
+    for types, values in chunks:
+        if np is not None:
+            # copies, so no view outlives a memory-mapped source
+            types = np.array(types, dtype=np.uint8)
+            values = np.array(values, dtype=np.uint32)
+            is_access = types != OTHER
+            chunk_blocks, first, inverse = np.unique(values[is_access] >> n_block, return_index=True, return_inverse=True)
+            chunk_ids = np.empty(len(chunk_blocks), dtype=np.uint32)
+            # new blocks are numbered in order of first access
+            for i in np.argsort(first, kind="stable").tolist():
+                block = int(chunk_blocks[i])
+                block_id = ids.get(block)
+                if block_id is None:
+                    block_id = ids[block] = len(blocks)
+                    blocks.append(block)
+                chunk_ids[i] = block_id
+            values[is_access] = chunk_ids[inverse]
+            out_types.frombytes(types.tobytes())
+            out_values.frombytes(values.tobytes())
+            continue
+        for type_code, value in zip(types, values):
+            out_types.append(type_code)
+            if type_code == OTHER:
+                out_values.append(value)
+                continue
+            block = value >> n_block
+            block_id = ids.get(block)
+            if block_id is None:
+                block_id = ids[block] = len(blocks)
+                blocks.append(block)
+            out_values.append(block_id)
+    return out_types, out_values, blocks
+
+@dataclass
+class DenseTrace:
+    """
+    A remapped trace: `types` and `values` columns as in a BinaryTrace, plus
+    `blocks`, the block address of each id
+    """
+    types: object
+    values: object
+    blocks: object
+    # the mapped file, None for a trace remapped in memory
+    _mmap: object = field(default=None, repr=False)
+
+    @classmethod
+    def open(cls, path: str) -> "DenseTrace":
+        count, block_count, _, _ = read_dense_header(path)
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        values_end = DENSE_HEADER_SIZE + 4 * count
+        blocks_end = values_end + 4 * block_count
+        trace = cls(
+            view[blocks_end:blocks_end + count], view[DENSE_HEADER_SIZE:values_end].cast("I"),
+            view[values_end:blocks_end].cast("I"), mapped,
+        )
+        view.release()
+        return trace
+
+    def __len__(self):
+        return len(self.types)
+
+    def close(self):
+        if self._mmap is not None:
+            for column in (self.types, self.values, self.blocks):
+                column.release()
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_dense_header(path: str) -> tuple[int, int, int, str]:
+    """
+    (record count, block count, block size, source digest) of a remapped trace
+    """
+    with open(path, "rb") as f:
+        header = f.read(DENSE_HEADER.size)
+    if len(header) < DENSE_HEADER.size:
+        raise ValueError(f"{path} is not a remapped trace")
+    magic, version, count, block_count, block_size_bytes, digest = DENSE_HEADER.unpack(header)
+    if magic != DENSE_TRACE_MAGIC:
+        raise ValueError(f"{path} is not a remapped trace")
+    if version != DENSE_TRACE_VERSION:
+        raise ValueError(f"{path} has unsupported remapped trace version {version}")
+    return count, block_count, block_size_bytes, digest.hex()
+
+def write_dense_trace(path: str, types, values, blocks, block_size_bytes: int, digest: str):
+    # written under a temporary name and renamed, as binary traces are
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        header = DENSE_HEADER.pack(DENSE_TRACE_MAGIC, DENSE_TRACE_VERSION, len(types), len(blocks), block_size_bytes, bytes.fromhex(digest))
+        f.write(header.ljust(DENSE_HEADER_SIZE, b"\0"))
+        values.tofile(f)
+        blocks.tofile(f)
+        types.tofile(f)
+    os.replace(tmp_path, path)
+
+def dense_path_for(source: TraceSource, block_size_bytes: int) -> str:
+    name = source.path if source.member is None else f"{source.path}.{source.member.replace('/', '_')}"
+    return f"{name}.b{block_size_bytes}.dense"
+
+def load_dense_trace(source, block_size_bytes: int, read_chunks=None) -> DenseTrace:
+    """
+    The remapped trace of `source`, remapping it first if there is no up to
+    date copy. `read_chunks()` gives the (types, values) chunks of the source,
+    and defaults to reading it afresh.
+    """
+    if read_chunks is None:
+        read_chunks = lambda: _read_chunks(source)
+    if not isinstance(source, TraceSource):
+        return DenseTrace(*remap_chunks(read_chunks(), block_size_bytes))
+    path = dense_path_for(source, block_size_bytes)
+    digest = file_digest(source.path)
+    if os.path.exists(path):
+        try:
+            header = read_dense_header(path)
+        except ValueError:
+            header = None
+        if header is not None and header[2:] == (block_size_bytes, digest):
+            return DenseTrace.open(path)
+        LOGGER.info(f"{path} is stale, remapping")
+    types, values, blocks = remap_chunks(read_chunks(), block_size_bytes)
+    write_dense_trace(path, types, values, blocks, block_size_bytes, digest)
+    LOGGER.info(f"Remapped {source.name} to {path} ({len(types)} records, {len(blocks)} blocks)")
+    return DenseTrace.open(path)
+
+def _read_chunks(source: TraceSource):
+    if source.member is None:
+        with load_trace(source.path) as trace:
+            yield trace.types, trace.values
+    else:
+        yield from source.chunks(1 << 16)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        raise SystemExit("usage: python block_ids.py input_file [block_size]")
+    logging.basicConfig(level=logging.INFO)
+    block_size_bytes = int(argv[1]) if len(argv) > 1 else 32
+    for source in resolve_trace_sources(argv[0]):
+        with load_dense_trace(source, block_size_bytes) as trace:
+            print(f"{source.name}: {len(trace)} records, {len(trace.blocks)} distinct blocks")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Shared snooping bus between CoherentCaches.
+
+The bus is atomic: one transaction at a time, each holding the bus for its
+whole duration, so a transaction issued while the bus is busy waits for it.
+Only the caches the directory lists as possible holders are snooped.
+
+Durations (constants.py):
+    BusRd, BusRdX  2 cycles per word when another cache supplies the block,
+                   otherwise a memory fetch
+    BusUpgr        no data, takes no bus cycles
+    BusUpd         one word
+    BusWB          a dirty block written back to memory
+"""
+from dataclasses import dataclass, field
+from constants import (
+    BUS_UPDATE_WORD_CC,
+    EVICT_DIRTY_CACHE_BLOCK_CC,
+    MEM_FETCH_CC,
+    WORD_SIZE_BITS,
+)
+from directory import Directory, attach_directory
+from protocols import (
+    BUS_RD,
+    BUS_RDX,
+    BUS_UPD,
+    BUS_UPGR,
+    BUS_WB,
+    INVALID,
+    TRANSACTIONS,
+    Protocol,
+)
+
+# what a cache's transactions cost, as counted in Bus.ledger
+LEDGER_EVENTS = ("memory_fetches", "word_transfers", "writebacks", "wait_cycles")
+MEMORY_FETCHES, WORD_TRANSFERS, WRITEBACKS, WAIT_CYCLES = range(len(LEDGER_EVENTS))
+
+@dataclass
+class Bus:
+    protocol: Protocol
+    block_size_bytes: int
+    word_size_bits: int = WORD_SIZE_BITS
+    caches: list = field(default_factory=list, repr=False)
+    directory: Directory = field(default=None, repr=False)
+    # cycle at which the current transaction completes
+    busy_until: int = 0
+    # bytes of data (not addresses) moved by BusRd, BusRdX, BusUpd and BusWB
+    data_traffic_bytes: int = 0
+    # BusRdX/BusUpgr transactions that invalidated, and BusUpd that updated, another copy
+    invalidations: int = 0
+    updates: int = 0
+    transaction_counts: list[int] = field(default_factory=lambda: [0] * len(TRANSACTIONS))
+    # per requesting cache, counts of LEDGER_EVENTS, for re-costing (see ledger.py)
+    ledger: list[list[int]] = field(default_factory=list, repr=False)
+
+    def __post_init__(self):
+        self.word_bytes = self.word_size_bits // 8
+        self.words = self.block_size_bytes // self.word_bytes
+        self.transfer_cycles = BUS_UPDATE_WORD_CC * self.words
+
+    def connect(self, caches, directory: Directory = None):
+        """
+        Put `caches` on the bus, tracked by `directory` (an unbounded one by default)
+        """
+        self.caches = list(caches)
+        self.directory = directory if directory is not None else Directory(len(self.caches))
+        attach_directory(self.caches, self.directory)
+        for cache in self.caches:
+            cache.bus = self
+        self.ledger = [[0] * len(LEDGER_EVENTS) for _ in self.caches]
+
+    def shared(self, requester_id: int, block: int) -> bool:
+        """
+        The shared line: whether any other cache holds `block`
+        """
+        caches = self.caches
+        for cache_id in self.directory.sharers(block, requester_id):
+            if caches[cache_id].block_state(block) != INVALID:
+                return True
+        return False
+
+    def transact(self, requester_id: int, block: int, txn: int, now: int) -> int:
+        """
+        Issue `txn` for `block` at cycle `now`, applying the protocol's snoop
+        transitions to the other holders. Returns the cycles until the
+        transaction completes, including any wait for the bus.
+        """
+        supplied = False
+        snooped = 0
+        if txn != BUS_WB:
+            snoop, caches = self.protocol.snoop, self.caches
+            for cache_id in self.directory.sharers(block, requester_id):
+                cache = caches[cache_id]
+                state = cache.block_state(block)
+                if state == INVALID:
+                    # a bounded directory may name caches that dropped the block
+                    continue
+                snooped += 1
+                next_state, supplies = snoop[state][txn]
+                supplied = supplied or supplies
+                if next_state != state:
+                    cache.set_block_state(block, next_state)
+
+        events = self.ledger[requester_id]
+        if txn == BUS_RD or txn == BUS_RDX:
+            if supplied:
+                duration = self.transfer_cycles
+                events[WORD_TRANSFERS] += self.words
+            else:
+                duration = MEM_FETCH_CC
+                events[MEMORY_FETCHES] += 1
+            self.data_traffic_bytes += self.block_size_bytes
+            if txn == BUS_RDX and snooped:
+                self.invalidations += 1
+        elif txn == BUS_UPGR:
+            duration = 0
+            if snooped:
+                self.invalidations += 1
+        elif txn == BUS_UPD:
+            duration = BUS_UPDATE_WORD_CC
+            events[WORD_TRANSFERS] += 1
+            self.data_traffic_bytes += self.word_bytes
+            if snooped:
+                self.updates += 1
+        else:
+            duration = EVICT_DIRTY_CACHE_BLOCK_CC
+            events[WRITEBACKS] += 1
+            self.data_traffic_bytes += self.block_size_bytes
+        self.transaction_counts[txn] += 1
+
+        start = now if now > self.busy_until else self.busy_until
+        events[WAIT_CYCLES] += start - now
+        self.busy_until = start + duration
+        return self.busy_until - now
+
+    def stats(self) -> dict:
+        return {
+            "data_traffic_bytes": self.data_traffic_bytes,
+            "invalidations": self.invalidations,
+            "updates": self.updates,
+            "transactions": dict(zip(TRANSACTIONS, self.transaction_counts)),
+        }
+
+    def get_state(self) -> dict:
+        return {
+            "busy_until": self.busy_until,
+            "data_traffic_bytes": self.data_traffic_bytes,
+            "invalidations": self.invalidations,
+            "updates": self.updates,
+            "transaction_counts": list(self.transaction_counts),
+            "ledger": [list(events) for events in self.ledger],
+        }
+
+    def set_state(self, state: dict):
+        self.busy_until = state["busy_until"]
+        self.data_traffic_bytes = state["data_traffic_bytes"]
+        self.invalidations = state["invalidations"]
+        self.updates = state["updates"]
+        self.transaction_counts = list(state["transaction_counts"])
+        self.ledger = [list(events) for events in state["ledger"]]
+        # the caches have been restored, so are the directory's source of truth
+        self.directory.rebuild(self.caches)
+
+    def reset_stats(self):
+        self.data_traffic_bytes = 0
+        self.invalidations = 0
+        self.updates = 0
+        self.transaction_counts = [0] * len(TRANSACTIONS)
+        self.ledger = [[0] * len(LEDGER_EVENTS) for _ in self.caches]
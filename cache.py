@@ -5,10 +5,12 @@ from constants import (
     BUS_UPDATE_WORD_CC,
     EVICT_DIRTY_CACHE_BLOCK_CC,
 )
+from instruction import OTHER, STORE
 import math
-import logging
-logging.basicConfig(level=logging.INFO)
-LOGGER = logging.getLogger("coherence")
+try:
+    import numpy as np
+except ImportError: # batched decoding falls back to plain Python
+    np = None
 
 @dataclass
 class MemAddressCacheInfo:
@@ -16,10 +18,21 @@ class MemAddressCacheInfo:
     set_index: int
     offset: int
 
+@dataclass
+class AccessSummary:
+    """
+    Counter deltas from a batch of accesses
+    """
+    hits: int = 0
+    misses: int = 0
+    cycles: int = 0
+
 @dataclass
 class CacheBlock:
     tag: int
     dirty: bool = False
+    # coherence state, see protocols.py; unused by a cache without a protocol
+    state: int = 0
     # data and size ?
 
 @dataclass
@@ -88,6 +101,9 @@ class LRUEvictionHandler:
         self.tag_to_node.pop(evicted_node.tag)
         return evicted_node.tag
 
+    def remove(self, tag: int):
+        self.tag_to_node.pop(tag).remove()
+
 @dataclass
 class CacheSet:
     associativity: int
@@ -103,30 +119,30 @@ class CacheSet:
 
     def read(self, tag, cache: "Cache"):
         if tag not in self.cache_blocks:
-            cache.log(f"Cache miss for tag: {tag}, set id = {self.index}")
             cache.cache_misses+=1
             cache.cycles+=MEM_FETCH_CC
             # have to load it in, check if set is at full capacity
             if len(self.cache_blocks) == self.associativity:
-                cache.log(f"Cache set full with size {len(self.cache_blocks)} and associativity {self.associativity}. Evicting.")
                 # have to choose one to evict
                 evicted_tag = self.eviction_handler.evict()
                 # handle writing of evicted block if needed
                 evicted_block = self.cache_blocks[evicted_tag]
-                cache.log(f"Evicting block: {evicted_block}")
                 if evicted_block.dirty:
                     # write
-                    cache.log(f"Writing to memory for dirty evicted block")
                     cache.cycles+=EVICT_DIRTY_CACHE_BLOCK_CC
+                    cache.dirty_evictions+=1
 
                 self.cache_blocks.pop(evicted_tag)
+                if cache.observer is not None:
+                    cache.observer.evicted(cache.id, (evicted_tag << cache.m_set) | self.index)
 
             # bring in new block
             self.cache_blocks[tag] = CacheBlock(tag)
+            if cache.observer is not None:
+                cache.observer.filled(cache.id, (tag << cache.m_set) | self.index)
             # add cc for final read from cache
             cache.cycles+=L1_CACHE_HIT_CC
         else:
-            cache.log(f"Cache hit for tag: {tag}, set id = {self.index}")
             cache.cache_hits+=1
             cache.cycles+=L1_CACHE_HIT_CC
         
@@ -135,29 +151,29 @@ class CacheSet:
 
     def write(self, tag, cache: "Cache"):
         if tag not in self.cache_blocks:
-            cache.log(f"Cache miss for tag: {tag}, set id = {self.index}")
             cache.cache_misses+=1
             cache.cycles+=MEM_FETCH_CC
             # have to load it in, check if set is at full capacity
             if len(self.cache_blocks) == self.associativity:
                 # have to choose one to evict
-                cache.log(f"Cache set full with size {len(self.cache_blocks)} and associativity {self.associativity}. Evicting.")
                 evicted_tag = self.eviction_handler.evict()
                 # handle writing of evicted block if needed
                 evicted_block = self.cache_blocks[evicted_tag]
-                cache.log(f"Evicting block: {evicted_block}")
                 if evicted_block.dirty:
                     # write
-                    cache.log(f"Writing to memory for dirty evicted block")
                     cache.cycles+=EVICT_DIRTY_CACHE_BLOCK_CC
+                    cache.dirty_evictions+=1
 
                 self.cache_blocks.pop(evicted_tag)
+                if cache.observer is not None:
+                    cache.observer.evicted(cache.id, (evicted_tag << cache.m_set) | self.index)
             # bring in new block
             self.cache_blocks[tag] = CacheBlock(tag)
+            if cache.observer is not None:
+                cache.observer.filled(cache.id, (tag << cache.m_set) | self.index)
             # add cc for final read from cache
             cache.cycles+=L1_CACHE_HIT_CC
         else:
-            cache.log(f"Cache hit for tag: {tag}, set id = {self.index}")
             cache.cache_hits+=1
             cache.cycles+=L1_CACHE_HIT_CC
         
@@ -165,6 +181,33 @@ class CacheSet:
         # perform write
         self.cache_blocks[tag].dirty = True
 
+@dataclass
+class Observers:
+    """
+    Several observers of one cache's fills and evictions
+    """
+    observers: list
+
+    def filled(self, cache_id: int, block: int):
+        for observer in self.observers:
+            observer.filled(cache_id, block)
+
+    def evicted(self, cache_id: int, block: int):
+        for observer in self.observers:
+            observer.evicted(cache_id, block)
+
+def add_observer(cache: "Cache", observer):
+    """
+    Report `cache`'s fills and evictions to `observer`, as well as to any
+    observer it already has
+    """
+    if cache.observer is None:
+        cache.observer = observer
+    elif isinstance(cache.observer, Observers):
+        cache.observer.observers.append(observer)
+    else:
+        cache.observer = Observers([cache.observer, observer])
+
 @dataclass
 class Cache:
     """
@@ -181,6 +224,12 @@ class Cache:
     cache_hits:int = 0
     cache_misses: int = 0
     cycles: int = 0
+    # dirty blocks written back on eviction, for re-costing (see ledger.py)
+    dirty_evictions: int = 0
+    # told of every fill and eviction, e.g. a directory.Directory; None for a standalone cache
+    observer: object = None
+    # cycle at which the current access was issued, set by Core
+    now: int = 0
 
     def __init__(self, id, size, associativity, block_size_bytes):
         self.id = id
@@ -190,6 +239,12 @@ class Cache:
         self.n_block = int(math.log(self.block_size_bytes, 2))
         self.set_count = self.size // (self.block_size_bytes * self.associativity)
         self.m_set = int(math.log(self.set_count, 2))
+        self.observer = None
+        self.now = 0
+        self.dirty_evictions = 0
+        self.init_storage()
+
+    def init_storage(self):
         self.sets = [CacheSet(self.associativity, i) for i in range(self.set_count)]
     
     def get_info_from_addr(self, mem_addr: int):
@@ -200,21 +255,153 @@ class Cache:
             tag, set_index, offset
         )
     
+    def decode_addrs(self, mem_addrs):
+        """
+        Decode a chunk of addresses at once. Returns (set indexes, tags) as two
+        lists, with NumPy doing the shifts and masks when it is installed.
+        """
+        set_mask = (1 << self.m_set) - 1
+        tag_shift = self.n_block + self.m_set
+        if np is not None:
+            addrs = np.asarray(mem_addrs, dtype=np.uint32)
+            return ((addrs >> self.n_block) & set_mask).tolist(), (addrs >> tag_shift).tolist()
+        n_block = self.n_block
+        return [(addr >> n_block) & set_mask for addr in mem_addrs], [addr >> tag_shift for addr in mem_addrs]
+
+    def access_many(self, types, mem_addrs) -> AccessSummary:
+        """
+        Perform a chunk of loads/stores, given as parallel sequences of type codes
+        and addresses. Addresses are decoded up front, so the per-access work is
+        only the set lookup.
+        """
+        hits, misses, cycles = self.cache_hits, self.cache_misses, self.cycles
+        set_indexes, tags = self.decode_addrs(mem_addrs)
+        read_block, write_block = self.read_block, self.write_block
+        for type_code, set_ind, tag in zip(types, set_indexes, tags):
+            if type_code == STORE:
+                write_block(set_ind, tag)
+            else:
+                read_block(set_ind, tag)
+        return AccessSummary(self.cache_hits - hits, self.cache_misses - misses, self.cycles - cycles)
+
+    def reset_stats(self):
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cycles = 0
+        self.dirty_evictions = 0
+
+    def get_state(self) -> dict:
+        """
+        Counters and contents, as plain data that set_state() restores exactly
+        """
+        return {
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cycles": self.cycles,
+            "dirty_evictions": self.dirty_evictions,
+            "storage": self.get_storage_state(),
+        }
+
+    def set_state(self, state: dict):
+        self.cache_hits = state["cache_hits"]
+        self.cache_misses = state["cache_misses"]
+        self.cycles = state["cycles"]
+        self.dirty_evictions = state["dirty_evictions"]
+        self.set_storage_state(state["storage"])
+
+    def get_storage_state(self):
+        # per set, (tag, dirty) pairs from least to most recently used
+        storage = []
+        for cache_set in self.sets:
+            blocks = []
+            node = cache_set.eviction_handler.dll.tail.prev
+            while node is not cache_set.eviction_handler.dll.head:
+                blocks.append((node.tag, cache_set.cache_blocks[node.tag].dirty))
+                node = node.prev
+            storage.append(blocks)
+        return storage
+
+    def set_storage_state(self, storage):
+        self.init_storage()
+        for cache_set, blocks in zip(self.sets, storage):
+            for tag, dirty in blocks:
+                cache_set.cache_blocks[tag] = CacheBlock(tag, dirty)
+                cache_set.eviction_handler.use(tag)
+
+    def merge_sets(self, storage, set_indexes):
+        """
+        Take the contents of sets `set_indexes` from `storage`, the
+        get_storage_state() of a cache that simulated those sets
+        """
+        for i in set_indexes:
+            cache_set = self.sets[i] = CacheSet(self.associativity, i)
+            for tag, dirty in storage[i]:
+                cache_set.cache_blocks[tag] = CacheBlock(tag, dirty)
+                cache_set.eviction_handler.use(tag)
+
+    def blocks(self) -> list[int]:
+        """
+        Block addresses of every block held
+        """
+        m_set = self.m_set
+        return [(tag << m_set) | cache_set.index for cache_set in self.sets for tag in cache_set.cache_blocks]
+
+    def record_hits(self, count: int):
+        """
+        Account for `count` accesses known to hit the most recently used block,
+        e.g. the rest of a same-block run collapsed by preprocess.coalesce_chunks
+        """
+        self.cache_hits+=count
+        self.cycles+=count*L1_CACHE_HIT_CC
+
+    def warm(self, types, set_indexes, tags, start: int, end: int):
+        """
+        Functional warming: bring records start..end of a decoded chunk into
+        the cache, updating contents, LRU order and dirty bits exactly as the
+        accesses would, but counting nothing and charging no cycles.
+        """
+        sets, associativity, observer = self.sets, self.associativity, self.observer
+        for i in range(start, end):
+            type_code = types[i]
+            if type_code == OTHER:
+                continue
+            tag = tags[i]
+            cache_set = sets[set_indexes[i]]
+            blocks = cache_set.cache_blocks
+            handler = cache_set.eviction_handler
+            block = blocks.get(tag)
+            if block is None:
+                if len(blocks) == associativity:
+                    evicted_tag = handler.evict()
+                    blocks.pop(evicted_tag)
+                    if observer is not None:
+                        observer.evicted(self.id, (evicted_tag << self.m_set) | cache_set.index)
+                block = blocks[tag] = CacheBlock(tag)
+                if observer is not None:
+                    observer.filled(self.id, (tag << self.m_set) | cache_set.index)
+                handler.use(tag)
+            elif handler.dll.head.next.tag != tag:
+                # already the most recently used block is the common case, and needs no LRU update
+                handler.use(tag)
+            if type_code == STORE:
+                block.dirty = True
+
     def read(self, mem_addr: int):
-        self.log(f"Processing read from address {mem_addr}")
         addr_info: MemAddressCacheInfo = self.get_info_from_addr(mem_addr)
-        set_ind = addr_info.set_index
-        set = self.sets[set_ind]
-        tag = addr_info.tag
-        return set.read(tag, self)
+        return self.read_block(addr_info.set_index, addr_info.tag)
 
     def write(self, mem_addr: int):
-        self.log(f"Processing write from address {mem_addr}")
         addr_info: MemAddressCacheInfo = self.get_info_from_addr(mem_addr)
-        set_ind = addr_info.set_index
-        set = self.sets[set_ind]
-        tag = addr_info.tag
-        return set.write(tag, self)
+        return self.write_block(addr_info.set_index, addr_info.tag)
+
+    def read_block(self, set_ind: int, tag: int):
+        """
+        Read from an already decoded address
+        """
+        return self.sets[set_ind].read(tag, self)
 
-    def log(self, message:str):
-        LOGGER.info(f"Cache {self.id}: " + message)
\ No newline at end of file
+    def write_block(self, set_ind: int, tag: int):
+        """
+        Write to an already decoded address
+        """
+        return self.sets[set_ind].write(tag, self)
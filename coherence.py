@@ -15,42 +15,173 @@ coherence MESI bodytrack 1024 1 16
 Assume default parameters as 32-bit word size, 32-byte block size, and 4KB 2-way
 set associative cache per processor.
 """
+import argparse
+import cProfile
 import logging
-import sys
-from simulation import Simulation
+import os
+import pstats
+import time
+from simulation import Simulation, CACHE_ENGINES, print_results
 from constants import WORD_SIZE_BITS
+from hotspots import HotspotProfiler
+from interval_stats import IntervalStats, UNITS
+from ledger import build_ledger, save_ledger
+from profiling import PhaseTimer
+from sampling import Sampling
+from sharing import SharingClassifier
+from traces import BACKGROUND_MODES
+from result_cache import DEFAULT_MAX_BYTES, DEFAULT_RESULT_CACHE_DIR, ResultCache
+from protocols import PROTOCOLS
+from tracing import EventRing, LogTracer
 
-logging.basicConfig(level=logging.INFO)
 LOGGER = logging.getLogger("coherence")
 
 DEFAULT_BLOCK_SIZE_BYTES = 32
 DEFAULT_CACHE_SIZE_BYTES = 4096
 DEFAULT_ASSOCIATIVITY = 2
 
-def main():
-    protocol = sys.argv[1]
-    input_file = sys.argv[2]
-    
-    if (len(sys.argv)<4):
-        cache_size = DEFAULT_CACHE_SIZE_BYTES
-    else:
-        cache_size = int(sys.argv[3])
-    
-    if len(sys.argv)<5:
-        associativity = DEFAULT_ASSOCIATIVITY
-    else:
-        associativity = int(sys.argv[4])
-
-    if len(sys.argv)<6:
-        block_size = DEFAULT_BLOCK_SIZE_BYTES
-    else:
-        block_size = int(sys.argv[5])
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="coherence")
+    parser.add_argument("protocol", help=f"one of {', '.join(PROTOCOLS)}")
+    parser.add_argument("input_file")
+    parser.add_argument("cache_size", nargs="?", type=int, default=DEFAULT_CACHE_SIZE_BYTES)
+    parser.add_argument("associativity", nargs="?", type=int, default=DEFAULT_ASSOCIATIVITY)
+    parser.add_argument("block_size", nargs="?", type=int, default=DEFAULT_BLOCK_SIZE_BYTES)
+    parser.add_argument("--cache-engine", choices=list(CACHE_ENGINES), default="default")
+    parser.add_argument("--coalesce", action="store_true", help="merge compute records and same-block access runs")
+    parser.add_argument(
+        "--background-decode", choices=BACKGROUND_MODES,
+        help="read and parse zipped traces in a background thread or process while simulating",
+    )
+    parser.add_argument(
+        "--directory-entries", type=int, metavar="N",
+        help="bound the coherence directory to N exact entries, for traces with huge footprints",
+    )
+    tracing = parser.add_mutually_exclusive_group()
+    tracing.add_argument("--trace-log", action="store_true", help="log every cache access")
+    tracing.add_argument(
+        "--trace-events", type=int, default=0, metavar="N",
+        help="keep the last N cache accesses and write them to --trace-dump",
+    )
+    parser.add_argument("--trace-dump", default="coherence_events.bin", metavar="PATH")
+    parser.add_argument("--sharing", action="store_true", help="count accesses to private and to shared data per core")
+    parser.add_argument(
+        "--hotspots", nargs="?", type=int, const=10, metavar="K",
+        help="report the K blocks and sets with the most misses, evictions, invalidations and updates",
+    )
+    parser.add_argument("--checkpoint", metavar="PATH", help="periodically snapshot the simulation to PATH")
+    parser.add_argument("--checkpoint-interval", type=int, default=10_000_000, metavar="N", help="instructions between snapshots")
+    parser.add_argument("--resume", action="store_true", help="carry on from the snapshot at --checkpoint if there is one")
+    parser.add_argument("--interval-stats", metavar="PATH", help="stream per-interval statistics as NDJSON to PATH (- for stdout)")
+    parser.add_argument("--interval", type=int, default=1_000_000, metavar="N", help="length of each statistics interval")
+    parser.add_argument("--interval-unit", choices=UNITS, default="instructions")
+    parser.add_argument(
+        "--sample-window", type=int, metavar="N",
+        help="estimate results by simulating N records of every --sample-period in detail, only warming the cache in between",
+    )
+    parser.add_argument("--sample-period", type=int, default=100_000, metavar="N")
+    parser.add_argument("--sample-confidence", type=float, default=0.95)
+    parser.add_argument(
+        "--sample-warmup", type=int, metavar="N",
+        help="only warm the cache for the N records before each window and skip the rest: faster, but biased",
+    )
+    parser.add_argument(
+        "--result-cache", nargs="?", const=DEFAULT_RESULT_CACHE_DIR, metavar="DIR",
+        help=f"reuse results of identical earlier runs, stored in DIR (default {DEFAULT_RESULT_CACHE_DIR})",
+    )
+    parser.add_argument("--result-cache-mb", type=int, default=DEFAULT_MAX_BYTES >> 20, metavar="MB")
+    parser.add_argument(
+        "--set-partitions", nargs="?", type=int, const=os.cpu_count(), metavar="N",
+        help="split a single core's cache sets between N worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--parallel-cores", action="store_true",
+        help="run each core in a worker process of its own, synchronising only at bus transactions",
+    )
+    parser.add_argument("--ledger", metavar="PATH", help="write the run's event counts to PATH, to re-cost with ledger.py")
+    parser.add_argument("--profile", action="store_true", help="time each phase of the run and print a breakdown")
+    parser.add_argument("--cprofile", metavar="PATH", help="run under cProfile and write its stats to PATH")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    protocol = args.protocol
+    input_file = args.input_file
+    cache_size = args.cache_size
+    associativity = args.associativity
+    block_size = args.block_size
 
     LOGGER.info(f"Command arguments: Protocol - {protocol}, input file - {input_file}, cache size - {cache_size}, associativity - {associativity}, block size - {block_size}")
     word_size = WORD_SIZE_BITS
 
-    simulation: Simulation = Simulation(input_file, cache_size, associativity, block_size, word_size)
-    simulation.simulate()
+    tracer = None
+    if args.trace_log:
+        tracer = LogTracer()
+    elif args.trace_events:
+        tracer = EventRing(args.trace_events)
+    profiler = PhaseTimer() if args.profile else None
+    sharing = SharingClassifier() if args.sharing else None
+    hotspots = HotspotProfiler(args.hotspots) if args.hotspots else None
+    sampling = None
+    if args.sample_window:
+        sampling = Sampling(args.sample_period, args.sample_window, args.sample_confidence, args.sample_warmup)
+    interval_stats = None
+    if args.interval_stats:
+        interval_stats = IntervalStats(args.interval_stats, args.interval, args.interval_unit)
+
+    simulation: Simulation = Simulation(
+        input_file, cache_size, associativity, block_size, word_size,
+        cache_engine=args.cache_engine, protocol=protocol, directory_entries=args.directory_entries,
+        tracer=tracer, sharing=sharing, hotspots=hotspots, coalesce=args.coalesce, background_decode=args.background_decode,
+        checkpoint_path=args.checkpoint, checkpoint_interval=args.checkpoint_interval,
+        profiler=profiler, interval_stats=interval_stats, sampling=sampling,
+        set_partitions=args.set_partitions, parallel_cores=args.parallel_cores,
+    )
+    if args.resume:
+        if not args.checkpoint:
+            raise SystemExit("--resume needs --checkpoint")
+        if os.path.exists(args.checkpoint):
+            simulation.load_checkpoint(args.checkpoint)
+            LOGGER.info(f"Resuming from {args.checkpoint}")
+    result_cache = None
+    # sampled results are estimates, so are neither looked up nor stored
+    if args.result_cache and sampling is None:
+        result_cache = ResultCache(args.result_cache, args.result_cache_mb << 20)
+        cache_key = result_cache.key_for(simulation)
+        # a traced, classified, profiled, streamed or ledgered run has to actually happen
+        instruments = (tracer, sharing, hotspots, profiler, interval_stats)
+        run_needed = any(instrument is not None for instrument in instruments)
+        if not (run_needed or args.cprofile or args.ledger):
+            results = result_cache.get(cache_key)
+            if results is not None:
+                LOGGER.info(f"Results found in {args.result_cache}")
+                print_results(results)
+                return
+    start = time.perf_counter()
+    try:
+        if args.cprofile:
+            profile = cProfile.Profile()
+            results = profile.runcall(simulation.simulate)
+            profile.dump_stats(args.cprofile)
+            pstats.Stats(profile).sort_stats("cumulative").print_stats(15)
+            LOGGER.info(f"cProfile stats written to {args.cprofile}")
+        else:
+            results = simulation.simulate()
+        if result_cache is not None and not simulation.stopped_early:
+            result_cache.put(cache_key, results)
+        if args.ledger:
+            save_ledger(build_ledger(simulation), args.ledger)
+            LOGGER.info(f"Event ledger written to {args.ledger}, re-cost it with ledger.py")
+        if hotspots is not None:
+            hotspots.print_report()
+        if profiler is not None:
+            profiler.total = time.perf_counter() - start
+            profiler.print_report()
+    finally:
+        if isinstance(tracer, EventRing):
+            tracer.dump(args.trace_dump)
+            LOGGER.info(f"Last {len(tracer)} cache accesses written to {args.trace_dump}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,170 @@
+from dataclasses import dataclass
+from cache import Cache, CacheBlock
+from constants import L1_CACHE_HIT_CC
+from instruction import OTHER, STORE
+from protocols import INVALID, PR_RD, PR_WR, BUS_WB, Protocol
+
+@dataclass(init=False)
+class CoherentCache(Cache):
+    """
+    Write-back, write allocate cache with LRU policy, kept coherent with the
+    other caches on its Bus by a table-driven protocol (see protocols.py).
+
+    Each access looks up (block state, event) in the protocol's table, issues
+    the listed bus transactions, and moves the block to the next state. The
+    core sets `now` to the cycle an access is issued, so the bus can make it
+    wait while another transaction is in progress.
+    """
+    protocol: Protocol = None
+    bus: object = None
+
+    def __init__(self, id, size, associativity, block_size_bytes, protocol: Protocol):
+        super().__init__(id, size, associativity, block_size_bytes)
+        self.protocol = protocol
+        self.bus = None
+
+    def block_state(self, block: int) -> int:
+        cache_block = self.sets[block & (self.set_count - 1)].cache_blocks.get(block >> self.m_set)
+        return INVALID if cache_block is None else cache_block.state
+
+    def set_block_state(self, block: int, state: int):
+        """
+        Apply a snooped transition; moving to INVALID drops the block
+        """
+        cache_set = self.sets[block & (self.set_count - 1)]
+        tag = block >> self.m_set
+        if state == INVALID:
+            cache_set.cache_blocks.pop(tag)
+            cache_set.eviction_handler.remove(tag)
+            self.observer.evicted(self.id, block)
+        else:
+            cache_block = cache_set.cache_blocks[tag]
+            cache_block.state = state
+            cache_block.dirty = self.protocol.dirty[state]
+
+    def _access(self, set_ind: int, tag: int, event: int):
+        cache_set = self.sets[set_ind]
+        blocks = cache_set.cache_blocks
+        cache_block = blocks.get(tag)
+        cycles = 0
+        if cache_block is None:
+            self.cache_misses+=1
+            state = INVALID
+            if len(blocks) == self.associativity:
+                cycles += self._evict(cache_set)
+        else:
+            self.cache_hits+=1
+            state = cache_block.state
+
+        next_alone, txns_alone, next_shared, txns_shared = self.protocol.processor[state][event]
+        if txns_alone or txns_shared:
+            bus = self.bus
+            block = (tag << self.m_set) | set_ind
+            # the shared line only matters when the table says it does
+            shared = (next_alone != next_shared or txns_alone != txns_shared) and bus.shared(self.id, block)
+            next_state = next_shared if shared else next_alone
+            for txn in (txns_shared if shared else txns_alone):
+                cycles += bus.transact(self.id, block, txn, self.now + cycles)
+        else:
+            next_state = next_alone
+
+        if cache_block is None:
+            cache_block = blocks[tag] = CacheBlock(tag)
+            self.observer.filled(self.id, (tag << self.m_set) | set_ind)
+        cache_block.state = next_state
+        cache_block.dirty = self.protocol.dirty[next_state]
+        cache_set.eviction_handler.use(tag)
+        self.cycles+=cycles + L1_CACHE_HIT_CC
+
+    def _evict(self, cache_set) -> int:
+        # make room in a full set, returning the cycles spent writing back
+        evicted_tag = cache_set.eviction_handler.evict()
+        evicted_block = cache_set.cache_blocks.pop(evicted_tag)
+        block = (evicted_tag << self.m_set) | cache_set.index
+        self.observer.evicted(self.id, block)
+        if evicted_block.dirty:
+            return self.bus.transact(self.id, block, BUS_WB, self.now)
+        return 0
+
+    def quiet_until(self, types, set_indexes, tags, start: int, end: int) -> int:
+        """
+        Index of the first access in records start..end of a decoded chunk
+        that would miss or issue a bus transaction, `end` if none would. The
+        hits before it are followed through the protocol's states, but not made.
+        """
+        processor, sets, m_set = self.protocol.processor, self.sets, self.m_set
+        # block -> state after the hits scanned so far, where it changed
+        states = {}
+        for i in range(start, end):
+            type_code = types[i]
+            if type_code == OTHER:
+                continue
+            block = (tags[i] << m_set) | set_indexes[i]
+            state = states.get(block)
+            if state is None:
+                cache_block = sets[set_indexes[i]].cache_blocks.get(tags[i])
+                if cache_block is None:
+                    return i
+                state = cache_block.state
+            next_alone, txns_alone, _, txns_shared = processor[state][PR_WR if type_code == STORE else PR_RD]
+            if txns_alone or txns_shared:
+                return i
+            if next_alone != state:
+                states[block] = next_alone
+        return end
+
+    def warm(self, types, set_indexes, tags, start: int, end: int):
+        """
+        Functional warming for a cache that is alone on its bus: blocks move
+        through the protocol's states as if no other cache held them, with no
+        bus transactions, counters or cycles.
+        """
+        processor, dirty = self.protocol.processor, self.protocol.dirty
+        sets, associativity, m_set = self.sets, self.associativity, self.m_set
+        for i in range(start, end):
+            type_code = types[i]
+            if type_code == OTHER:
+                continue
+            tag = tags[i]
+            set_ind = set_indexes[i]
+            cache_set = sets[set_ind]
+            blocks = cache_set.cache_blocks
+            cache_block = blocks.get(tag)
+            if cache_block is None:
+                if len(blocks) == associativity:
+                    evicted_tag = cache_set.eviction_handler.evict()
+                    blocks.pop(evicted_tag)
+                    self.observer.evicted(self.id, (evicted_tag << m_set) | set_ind)
+                cache_block = blocks[tag] = CacheBlock(tag)
+                self.observer.filled(self.id, (tag << m_set) | set_ind)
+            next_state = processor[cache_block.state][PR_WR if type_code == STORE else PR_RD][0]
+            cache_block.state = next_state
+            cache_block.dirty = dirty[next_state]
+            cache_set.eviction_handler.use(tag)
+
+    def read_block(self, set_ind: int, tag: int):
+        self._access(set_ind, tag, PR_RD)
+
+    def write_block(self, set_ind: int, tag: int):
+        self._access(set_ind, tag, PR_WR)
+
+    def get_storage_state(self):
+        # per set, (tag, state) pairs from least to most recently used
+        return [
+            [(tag, cache_set.cache_blocks[tag].state) for tag, _ in blocks]
+            for cache_set, blocks in zip(self.sets, super().get_storage_state())
+        ]
+
+    def set_storage_state(self, storage):
+        dirty = self.protocol.dirty
+        super().set_storage_state([[(tag, dirty[state]) for tag, state in blocks] for blocks in storage])
+        for cache_set, blocks in zip(self.sets, storage):
+            for tag, state in blocks:
+                cache_set.cache_blocks[tag].state = state
+
+    def merge_sets(self, storage, set_indexes):
+        dirty = self.protocol.dirty
+        super().merge_sets([[(tag, dirty[state]) for tag, state in blocks] for blocks in storage], set_indexes)
+        for i in set_indexes:
+            for tag, state in storage[i]:
+                self.sets[i].cache_blocks[tag].state = state
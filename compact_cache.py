@@ -0,0 +1,138 @@
+from array import array
+from dataclasses import dataclass, field
+from cache import Cache
+from instruction import OTHER, STORE
+from constants import (
+    L1_CACHE_HIT_CC,
+    MEM_FETCH_CC,
+    EVICT_DIRTY_CACHE_BLOCK_CC,
+)
+
+INVALID_TAG = -1
+
+@dataclass(init=False)
+class CompactCache(Cache):
+    """
+    Write-back, write allocate cache with LRU policy, with the same behaviour and
+    counters as Cache but without per-set or per-block objects.
+
+    Every way of every set lives in flat arrays indexed by
+    set_index * associativity + way:
+        tags    block tag, or INVALID_TAG for an empty way
+        dirty   1 if the block has been written since it was filled
+        stamps  last use time; the way with the lowest stamp in a set is the LRU
+    """
+    tags: array = field(default=None, repr=False)
+    dirty: bytearray = field(default=None, repr=False)
+    stamps: array = field(default=None, repr=False)
+    clock: int = 0
+
+    def init_storage(self):
+        self.sets = None
+        ways = self.set_count * self.associativity
+        self.tags = array("q", [INVALID_TAG]) * ways
+        self.dirty = bytearray(ways)
+        self.stamps = array("Q", [0]) * ways
+        self.clock = 0
+
+    def get_storage_state(self):
+        return {
+            "tags": self.tags.tobytes(),
+            "dirty": bytes(self.dirty),
+            "stamps": self.stamps.tobytes(),
+            "clock": self.clock,
+        }
+
+    def set_storage_state(self, storage):
+        self.init_storage()
+        self.tags = array("q", storage["tags"])
+        self.dirty = bytearray(storage["dirty"])
+        self.stamps = array("Q", storage["stamps"])
+        self.clock = storage["clock"]
+
+    def merge_sets(self, storage, set_indexes):
+        tags, dirty, stamps = array("q", storage["tags"]), storage["dirty"], array("Q", storage["stamps"])
+        associativity = self.associativity
+        for i in set_indexes:
+            # stamps are only ever compared within a set, so another cache's clock will do
+            ways = slice(i * associativity, (i + 1) * associativity)
+            self.tags[ways] = tags[ways]
+            self.dirty[ways] = dirty[ways]
+            self.stamps[ways] = stamps[ways]
+        self.clock = max(self.clock, storage["clock"])
+
+    def blocks(self) -> list[int]:
+        associativity, m_set = self.associativity, self.m_set
+        return [(tag << m_set) | (slot // associativity) for slot, tag in enumerate(self.tags) if tag != INVALID_TAG]
+
+    def _lookup(self, set_ind: int, tag: int) -> int:
+        """
+        Find the way holding `tag` in the set, filling it on a miss. Counts the
+        hit or miss and its cycles, and returns the way's array index.
+        """
+        base = set_ind * self.associativity
+        end = base + self.associativity
+        tags = self.tags
+        try:
+            slot = tags.index(tag, base, end)
+        except ValueError:
+            self.cache_misses+=1
+            self.cycles+=MEM_FETCH_CC
+            try:
+                slot = tags.index(INVALID_TAG, base, end)
+            except ValueError:
+                # set is full, evict the least recently used way
+                stamps = self.stamps
+                slot = min(range(base, end), key=stamps.__getitem__)
+                if self.dirty[slot]:
+                    self.cycles+=EVICT_DIRTY_CACHE_BLOCK_CC
+                    self.dirty_evictions+=1
+                    self.dirty[slot] = 0
+                if self.observer is not None:
+                    self.observer.evicted(self.id, (tags[slot] << self.m_set) | set_ind)
+            tags[slot] = tag
+            if self.observer is not None:
+                self.observer.filled(self.id, (tag << self.m_set) | set_ind)
+        else:
+            self.cache_hits+=1
+        self.cycles+=L1_CACHE_HIT_CC
+        self.clock+=1
+        self.stamps[slot] = self.clock
+        return slot
+
+    def warm(self, types, set_indexes, tags, start: int, end: int):
+        associativity, observer = self.associativity, self.observer
+        cache_tags, dirty, stamps = self.tags, self.dirty, self.stamps
+        clock = self.clock
+        for i in range(start, end):
+            type_code = types[i]
+            if type_code == OTHER:
+                continue
+            tag = tags[i]
+            set_ind = set_indexes[i]
+            base = set_ind * associativity
+            end_way = base + associativity
+            try:
+                slot = cache_tags.index(tag, base, end_way)
+            except ValueError:
+                try:
+                    slot = cache_tags.index(INVALID_TAG, base, end_way)
+                except ValueError:
+                    slot = min(range(base, end_way), key=stamps.__getitem__)
+                    dirty[slot] = 0
+                    if observer is not None:
+                        observer.evicted(self.id, (cache_tags[slot] << self.m_set) | set_ind)
+                cache_tags[slot] = tag
+                if observer is not None:
+                    observer.filled(self.id, (tag << self.m_set) | set_ind)
+            clock+=1
+            stamps[slot] = clock
+            if type_code == STORE:
+                dirty[slot] = 1
+        self.clock = clock
+
+    def read_block(self, set_ind: int, tag: int):
+        self._lookup(set_ind, tag)
+
+    def write_block(self, set_ind: int, tag: int):
+        self.dirty[self._lookup(set_ind, tag)] = 1
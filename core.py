@@ -1,43 +1,291 @@
 from cache import Cache
-from dataclasses import dataclass
+from constants import L1_CACHE_HIT_CC
+from dataclasses import dataclass, field
+import math
 from instruction import (
     Instruction,
-    InstructionType
+    LOAD,
+    STORE,
+    OTHER,
 )
-import logging
-
-LOGGER = logging.getLogger("coherence")
+try:
+    import numpy as np
+except ImportError: # batched execution falls back to plain Python
+    np = None
 
 @dataclass
 class Core:
     id: int
     cache: Cache
-    #execution_cycles: int = 0
+    # cycle at which the core is ready for its next instruction
+    execution_cycles: int = 0
     compute_cycles: int = 0
     load_store_instrs: int = 0
-    #idle_cycles: int = 0
+    # cycle at which statistics were last reset, see reset_stats()
+    start_cycle: int = 0
+    # current chunk of the core's trace, set by attach()
+    _chunks: object = field(default=None, repr=False)
+    _types: object = field(default=(), repr=False)
+    _values: object = field(default=(), repr=False)
+    _repeats: object = field(default=None, repr=False)
+    _set_indexes: list = field(default_factory=list, repr=False)
+    _tags: list = field(default_factory=list, repr=False)
+    _pos: int = field(default=0, repr=False)
+    _consumed: int = field(default=0, repr=False)
+
+    @property
+    def measured_cycles(self) -> int:
+        return self.execution_cycles - self.start_cycle
+
+    @property
+    def idle_cycles(self) -> int:
+        return self.measured_cycles - self.compute_cycles
+
+    @property
+    def position(self) -> int:
+        """
+        Number of records of the attached trace executed so far
+        """
+        return self._consumed + self._pos
 
     def execute_instr(self, instr: Instruction):
-        LOGGER.info(f"Core {self.id}: Executing instruction: {instr}")
+        self.execute(instr.type.code, instr.value)
 
-        if instr.type == InstructionType.LOAD:
-            LOGGER.info(f"Core {self.id}: Attempting to read address: {instr.value} from cache")
+    def execute(self, type_code: int, value: int):
+        """
+        Execute a record given as a type code and value, without wrapping it in
+        an Instruction (e.g. replayed from a binary trace).
+        """
+        cache_cycles = self.cache.cycles
+        self.cache.now = self.execution_cycles
+        if type_code == LOAD:
             self.load_store_instrs+=1
-            self.cache.read(instr.value)
-        elif instr.type == InstructionType.STORE:
-            LOGGER.info(f"Core {self.id}: Attempting to write to address: {instr.value} from cache")
+            self.cache.read(value)
+        elif type_code == STORE:
             self.load_store_instrs+=1
-            self.cache.write(instr.value)
+            self.cache.write(value)
         else:
-            LOGGER.info(f"Core {self.id}: {instr.value} compute cycles")
-            self.compute_cycles += instr.value
+            self.compute_cycles += value
+            self.execution_cycles += value
+        self.execution_cycles += self.cache.cycles - cache_cycles
+
+    def execute_many(self, types, values):
+        """
+        Execute a chunk of records given as parallel sequences of type codes and
+        values. Compute records are summed and the loads/stores are handed to
+        the cache in one batch.
+        """
+        compute_cycles = 0
+        if np is not None:
+            types = np.asarray(types, dtype=np.uint8)
+            values = np.asarray(values, dtype=np.uint32)
+            is_access = types != OTHER
+            compute_cycles = int(values[~is_access].sum(dtype=np.uint64))
+            access_types = types[is_access]
+            access_addrs = values[is_access]
+        else:
+            access_types = []
+            access_addrs = []
+            for type_code, value in zip(types, values):
+                if type_code == OTHER:
+                    compute_cycles += value
+                else:
+                    access_types.append(type_code)
+                    access_addrs.append(value)
+        self.compute_cycles += compute_cycles
+        self.load_store_instrs += len(access_types)
+        summary = self.cache.access_many(access_types, access_addrs)
+        self.execution_cycles += compute_cycles + summary.cycles
+
+    def attach(self, chunks, position: int = 0):
+        """
+        Give the core its trace, as an iterable of (types, values) chunks, to be
+        executed by run_until. Chunks from preprocess.coalesce_chunks carry a
+        third column, the number of guaranteed hits following each access.
+        `position` is the number of records already executed before `chunks`
+        (when resuming from a checkpoint).
+        """
+        self._chunks = iter(chunks)
+        self._types = ()
+        self._pos = 0
+        self._consumed = position
+
+    def detach(self):
+        """
+        Drop the attached trace before it has been executed to the end, so
+        that it can be closed. The core keeps its position.
+        """
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        self._consumed = self.position
+        self._chunks = None
+        self._types = self._values = ()
+        self._repeats = None
+        self._set_indexes, self._tags = [], []
+        self._pos = 0
+
+    def _next_chunk(self) -> bool:
+        self._consumed += len(self._types)
+        for chunk in self._chunks:
+            types, values = chunk[0], chunk[1]
+            if len(types):
+                self._types = types
+                self._values = values
+                self._repeats = chunk[2] if len(chunk) > 2 else None
+                self._set_indexes, self._tags = self.cache.decode_addrs(values)
+                self._pos = 0
+                return True
+        # drop the last chunk so a memory-mapped trace can be closed
+        self._types = self._values = ()
+        self._repeats = None
+        self._set_indexes, self._tags = [], []
+        self._pos = 0
+        return False
+
+    def run_until(self, limit_cycle, limit_id, max_records=math.inf) -> bool:
+        """
+        Execute instructions from the attached trace until this core is next
+        ready after (limit_cycle, limit_id), the next event of any other core,
+        or `max_records` records have been executed. At least one instruction
+        is executed. Returns False once the trace is exhausted.
+        """
+        cache = self.cache
+        read_block, write_block = cache.read_block, cache.write_block
+        cycle = self.execution_cycles
+        while True:
+            if self._pos == len(self._types) and not self._next_chunk():
+                self.execution_cycles = cycle
+                return False
+            types, values, repeats = self._types, self._values, self._repeats
+            set_indexes, tags = self._set_indexes, self._tags
+            pos, end = self._pos, len(types)
+            if end - pos > max_records:
+                end = pos + max_records
+            max_records -= end - pos
+            while pos < end:
+                type_code = types[pos]
+                if type_code == OTHER:
+                    self.compute_cycles += values[pos]
+                    cycle += values[pos]
+                else:
+                    self.load_store_instrs += 1
+                    cache_cycles = cache.cycles
+                    cache.now = cycle
+                    if type_code == STORE:
+                        write_block(set_indexes[pos], tags[pos])
+                    else:
+                        read_block(set_indexes[pos], tags[pos])
+                    if repeats is not None and repeats[pos]:
+                        self.load_store_instrs += repeats[pos]
+                        cache.record_hits(repeats[pos])
+                    cycle += cache.cycles - cache_cycles
+                pos += 1
+                if cycle > limit_cycle or (cycle == limit_cycle and self.id > limit_id):
+                    self._pos = pos
+                    self.execution_cycles = cycle
+                    return pos < len(types) or self._next_chunk()
+            self._pos = pos
+            if not max_records:
+                self.execution_cycles = cycle
+                return pos < len(types) or self._next_chunk()
+
+    def lookahead(self):
+        """
+        Scan the rest of the current chunk, without executing anything, for
+        the first access the cache cannot complete on its own (see
+        CoherentCache.quiet_until). Returns (position, cycle, found): that
+        record's position and the cycle it would be issued at, or with found
+        False the position and cycle just past the chunk. None once the trace
+        is exhausted.
+        """
+        if self._pos == len(self._types) and not self._next_chunk():
+            return None
+        types, values, repeats, pos = self._types, self._values, self._repeats, self._pos
+        end = self.cache.quiet_until(types, self._set_indexes, self._tags, pos, len(types))
+        cycle = self.execution_cycles
+        for i in range(pos, end):
+            if types[i] == OTHER:
+                cycle += values[i]
+            else:
+                cycle += L1_CACHE_HIT_CC * (1 + (repeats[i] if repeats is not None else 0))
+        return self._consumed + end, cycle, end < len(types)
+
+    def skip(self, max_records: int) -> bool:
+        """
+        Pass over the next `max_records` records without executing them at
+        all. Returns False once the trace is exhausted.
+        """
+        while max_records:
+            if self._pos == len(self._types) and not self._next_chunk():
+                return False
+            end = min(len(self._types), self._pos + max_records)
+            max_records -= end - self._pos
+            self._pos = end
+        return True
+
+    def warm(self, max_records: int) -> bool:
+        """
+        Fast-forward through the next `max_records` records with Cache.warm:
+        the cache contents follow the trace, but no counter, cycle or other
+        statistic changes. Returns False once the trace is exhausted.
+        """
+        while max_records:
+            if self._pos == len(self._types) and not self._next_chunk():
+                return False
+            end = min(len(self._types), self._pos + max_records)
+            self.cache.warm(self._types, self._set_indexes, self._tags, self._pos, end)
+            max_records -= end - self._pos
+            self._pos = end
+        return True
+
+    def reset_stats(self):
+        """
+        Start measuring afresh from the current point, keeping the cache
+        contents and the core's place in simulated time
+        """
+        self.start_cycle = self.execution_cycles
+        self.compute_cycles = 0
+        self.load_store_instrs = 0
+        self.cache.reset_stats()
+
+    def get_state(self) -> dict:
+        return {
+            "position": self.position,
+            "execution_cycles": self.execution_cycles,
+            "compute_cycles": self.compute_cycles,
+            "load_store_instrs": self.load_store_instrs,
+            "start_cycle": self.start_cycle,
+            "cache": self.cache.get_state(),
+        }
+
+    def set_state(self, state: dict):
+        """
+        Restore counters and cache contents from get_state(). The trace must be
+        re-attached from state["position"].
+        """
+        self.execution_cycles = state["execution_cycles"]
+        self.compute_cycles = state["compute_cycles"]
+        self.load_store_instrs = state["load_store_instrs"]
+        self.start_cycle = state["start_cycle"]
+        self.cache.set_state(state["cache"])
+
+    def stats(self) -> dict:
+        return {
+            "core": self.id,
+            "execution_cycles": self.measured_cycles,
+            "compute_cycles": self.compute_cycles,
+            "load_store_instrs": self.load_store_instrs,
+            "idle_cycles": self.idle_cycles,
+            "cache_hits": self.cache.cache_hits,
+            "cache_misses": self.cache.cache_misses,
+        }
     
     def print_final_outputs(self):
-        idle_cycles = self.cache.cycles
-        self.print(f"{idle_cycles+self.compute_cycles} Execution cycles")
+        self.print(f"{self.measured_cycles} Execution cycles")
         self.print(f"{self.compute_cycles} Compute cycles")
         self.print(f"{self.load_store_instrs} load/store instructions")
-        self.print(f"{idle_cycles} idle cycles")
+        self.print(f"{self.idle_cycles} idle cycles")
         self.print(f"{self.cache.cache_hits} cache hits")
         self.print(f"{self.cache.cache_misses} cache misses")
 
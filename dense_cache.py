@@ -0,0 +1,147 @@
+from array import array
+from dataclasses import dataclass, field
+from compact_cache import CompactCache, INVALID_TAG
+from instruction import OTHER, STORE
+from constants import (
+    L1_CACHE_HIT_CC,
+    MEM_FETCH_CC,
+    EVICT_DIRTY_CACHE_BLOCK_CC,
+)
+try:
+    import numpy as np
+except ImportError: # set indexes are looked up in plain Python
+    np = None
+
+@dataclass(init=False)
+class DenseCache(CompactCache):
+    """
+    CompactCache for traces remapped to dense block ids (see block_ids.py).
+
+    Accesses name their block by id rather than by address, and the ways hold
+    ids in place of tags. Instead of scanning a set for a block, the way
+    holding it is read from
+        slots   per block id, the array index of its way, -1 if not held
+    so neither a hit nor a miss hashes or searches for the block. The block
+    addresses of the ids, which give their set indexes and are what observers
+    are told, are bound with bind_blocks() before the first access.
+    """
+    # block address of each id
+    block_addresses: array = field(default=None, repr=False)
+    slots: array = field(default=None, repr=False)
+
+    def bind_blocks(self, block_addresses):
+        """
+        Take the block address of each id of the trace to be run
+        """
+        # copied, as the trace's may be mapped only for the run
+        self.block_addresses = block_addresses = array("I", block_addresses)
+        set_mask = self.set_count - 1
+        if np is not None:
+            self._set_indexes = np.asarray(block_addresses, dtype=np.uint32) & set_mask
+        else:
+            self._set_indexes = [block & set_mask for block in block_addresses]
+        self._index_slots()
+
+    def _index_slots(self):
+        self.slots = array("i", [-1]) * len(self.block_addresses)
+        for slot, block_id in enumerate(self.tags):
+            if block_id != INVALID_TAG:
+                self.slots[block_id] = slot
+
+    def init_storage(self):
+        super().init_storage()
+        if self.block_addresses is not None:
+            self._index_slots()
+
+    def set_storage_state(self, storage):
+        super().set_storage_state(storage)
+        if self.block_addresses is not None:
+            self._index_slots()
+
+    def decode_addrs(self, mem_addrs):
+        """
+        Set indexes and block ids of a chunk of block ids. Compute records'
+        values are not ids, and get a set index of 0.
+        """
+        count = len(self.block_addresses)
+        if np is not None:
+            ids = np.asarray(mem_addrs, dtype=np.uint32)
+            if not count:
+                return [0] * len(ids), ids.tolist()
+            set_indexes = np.where(ids < count, self._set_indexes[np.minimum(ids, count - 1)], 0)
+            return set_indexes.tolist(), ids.tolist()
+        set_indexes = self._set_indexes
+        return [set_indexes[i] if i < count else 0 for i in mem_addrs], list(mem_addrs)
+
+    def blocks(self) -> list[int]:
+        return [self.block_addresses[block_id] for block_id in self.tags if block_id != INVALID_TAG]
+
+    def _lookup(self, set_ind: int, block_id: int) -> int:
+        slots = self.slots
+        slot = slots[block_id]
+        if slot < 0:
+            self.cache_misses+=1
+            self.cycles+=MEM_FETCH_CC
+            base = set_ind * self.associativity
+            end = base + self.associativity
+            tags = self.tags
+            try:
+                slot = tags.index(INVALID_TAG, base, end)
+            except ValueError:
+                # set is full, evict the least recently used way
+                stamps = self.stamps
+                slot = min(range(base, end), key=stamps.__getitem__)
+                if self.dirty[slot]:
+                    self.cycles+=EVICT_DIRTY_CACHE_BLOCK_CC
+                    self.dirty_evictions+=1
+                    self.dirty[slot] = 0
+                slots[tags[slot]] = -1
+                if self.observer is not None:
+                    self.observer.evicted(self.id, self.block_addresses[tags[slot]])
+            tags[slot] = block_id
+            slots[block_id] = slot
+            if self.observer is not None:
+                self.observer.filled(self.id, self.block_addresses[block_id])
+        else:
+            self.cache_hits+=1
+        self.cycles+=L1_CACHE_HIT_CC
+        self.clock+=1
+        self.stamps[slot] = self.clock
+        return slot
+
+    def warm(self, types, set_indexes, tags, start: int, end: int):
+        associativity, observer, addresses = self.associativity, self.observer, self.block_addresses
+        cache_tags, dirty, stamps, slots = self.tags, self.dirty, self.stamps, self.slots
+        clock = self.clock
+        for i in range(start, end):
+            type_code = types[i]
+            if type_code == OTHER:
+                continue
+            block_id = tags[i]
+            slot = slots[block_id]
+            if slot < 0:
+                base = set_indexes[i] * associativity
+                end_way = base + associativity
+                try:
+                    slot = cache_tags.index(INVALID_TAG, base, end_way)
+                except ValueError:
+                    slot = min(range(base, end_way), key=stamps.__getitem__)
+                    dirty[slot] = 0
+                    slots[cache_tags[slot]] = -1
+                    if observer is not None:
+                        observer.evicted(self.id, addresses[cache_tags[slot]])
+                cache_tags[slot] = block_id
+                slots[block_id] = slot
+                if observer is not None:
+                    observer.filled(self.id, addresses[block_id])
+            clock+=1
+            stamps[slot] = clock
+            if type_code == STORE:
+                dirty[slot] = 1
+        self.clock = clock
+
+    def read(self, block_id: int):
+        self._lookup(int(self._set_indexes[block_id]), block_id)
+
+    def write(self, block_id: int):
+        self.dirty[self._lookup(int(self._set_indexes[block_id]), block_id)] = 1
@@ -0,0 +1,130 @@
+"""
+Coherence directory (snoop filter) over a group of caches.
+
+A bus that probes every other cache on each miss or write does O(cores) work
+per access. Directory instead keeps, per block address, a bitmask of the caches
+that may hold the block, maintained by the caches themselves: a Cache with an
+observer reports every fill and eviction to it (misses only, so hits pay
+nothing). A bus transaction then only visits the caches in sharers().
+
+Blocks are identified by their block address (mem_addr >> n_block), which is
+(tag << m_set) | set_index for every cache of the same geometry.
+
+With max_entries, the directory keeps at most that many exact entries. When an
+entry has to make room it is folded into a fixed table of overflow masks,
+indexed by block address; sharers() ORs the block's overflow mask into the
+answer. Each slot also counts, per cache, the folded blocks the cache still
+holds, and clears the cache's bit once that count drops to zero, so the masks
+do not drift towards every cache over a long run. The answer is always a
+superset of the true sharers: a bounded directory costs extra probes, never
+wrong results.
+"""
+from dataclasses import dataclass, field
+
+DEFAULT_OVERFLOW_SLOTS = 4096
+
+@dataclass
+class Directory:
+    cache_count: int
+    # bound on exact entries, None for unbounded
+    max_entries: int = None
+    overflow_slots: int = DEFAULT_OVERFLOW_SLOTS
+    # block address -> bitmask of caches holding it, in least recently filled order
+    entries: dict[int, int] = field(default_factory=dict)
+    overflow: list[int] = field(init=False, repr=False)
+    # per overflow slot and cache (slot * cache_count + cache id), folded blocks the cache still holds
+    overflow_counts: list[int] = field(init=False, repr=False)
+    # entries folded into overflow so far
+    spills: int = 0
+
+    def __post_init__(self):
+        if self.max_entries is not None and self.max_entries <= 0:
+            raise ValueError("Directory max_entries must be positive")
+        self.overflow = [0] * self.overflow_slots if self.max_entries is not None else None
+        self.overflow_counts = [0] * (self.overflow_slots * self.cache_count) if self.max_entries is not None else None
+
+    def filled(self, cache_id: int, block: int):
+        entries = self.entries
+        mask = entries.pop(block, 0) | (1 << cache_id)
+        entries[block] = mask
+        if self.max_entries is not None and len(entries) > self.max_entries:
+            self._spill()
+
+    def evicted(self, cache_id: int, block: int):
+        bit = 1 << cache_id
+        mask = self.entries.get(block, 0)
+        if not mask & bit:
+            # the cache's copy was folded into an overflow slot, if tracked at all
+            if self.overflow is not None:
+                self._release(cache_id, block % self.overflow_slots)
+            return
+        mask &= ~bit
+        if mask:
+            self.entries[block] = mask
+        else:
+            del self.entries[block]
+
+    def _spill(self):
+        # fold the least recently filled entry into its overflow slot
+        block = next(iter(self.entries))
+        mask = self.entries.pop(block)
+        slot = block % self.overflow_slots
+        self.overflow[slot] |= mask
+        base = slot * self.cache_count
+        while mask:
+            low = mask & -mask
+            self.overflow_counts[base + low.bit_length() - 1] += 1
+            mask ^= low
+        self.spills += 1
+
+    def _release(self, cache_id: int, slot: int):
+        i = slot * self.cache_count + cache_id
+        if self.overflow_counts[i]:
+            self.overflow_counts[i] -= 1
+            if not self.overflow_counts[i]:
+                self.overflow[slot] &= ~(1 << cache_id)
+
+    def sharer_mask(self, block: int) -> int:
+        mask = self.entries.get(block, 0)
+        if self.overflow is not None:
+            mask |= self.overflow[block % self.overflow_slots]
+        return mask
+
+    def sharers(self, block: int, exclude: int = None) -> list[int]:
+        """
+        Ids of the caches that may hold `block`, other than `exclude`
+        """
+        mask = self.sharer_mask(block)
+        if exclude is not None:
+            mask &= ~(1 << exclude)
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(low.bit_length() - 1)
+            mask ^= low
+        return ids
+
+    def clear(self):
+        self.entries.clear()
+        if self.overflow is not None:
+            self.overflow = [0] * self.overflow_slots
+            self.overflow_counts = [0] * (self.overflow_slots * self.cache_count)
+        self.spills = 0
+
+    def rebuild(self, caches):
+        """
+        Refill the directory from the caches' contents, e.g. after restoring
+        them from a checkpoint
+        """
+        self.clear()
+        for cache in caches:
+            for block in cache.blocks():
+                self.filled(cache.id, block)
+
+def attach_directory(caches, directory: Directory):
+    """
+    Have every cache report its fills and evictions to `directory`
+    """
+    for cache in caches:
+        cache.observer = directory
+    directory.rebuild(caches)
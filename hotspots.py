@@ -0,0 +1,178 @@
+"""
+Hot-block profiling in fixed memory.
+
+Exact counters per block would grow with the trace's footprint, so
+HotspotProfiler counts each kind of event in a count-min sketch (depth rows
+of width counters, each row indexed by its own hash of the block address)
+and keeps the k blocks with the highest estimates alongside. A count-min
+estimate never undercounts, and overcounts by at most 2N/width (N events of
+that kind) with probability at least 1 - 2^-depth. Per-set counts are exact,
+since there are only as many sets as the cache has.
+
+Events:
+    misses         a cache filled the block
+    evictions      the block left a cache, including by invalidation
+    invalidations  a BusRdX/BusUpgr for the block invalidated another copy
+    updates        a BusUpd for the block updated another copy
+
+Misses and evictions come from the caches' observers, which only fire on
+misses, and invalidations and updates from wrapping Bus.transact, so hits
+cost nothing and an unprofiled run is untouched.
+"""
+from array import array
+from dataclasses import dataclass, field
+import random
+from cache import add_observer
+
+EVENTS = ("misses", "evictions", "invalidations", "updates")
+
+# 2^61 - 1, a Mersenne prime for the row hashes
+HASH_PRIME = (1 << 61) - 1
+
+@dataclass
+class CountMinSketch:
+    # counters per row, a power of two
+    width: int = 2048
+    depth: int = 4
+    seed: int = 0
+    total: int = 0
+
+    def __post_init__(self):
+        if self.width <= 0 or self.width & (self.width - 1):
+            raise ValueError("Sketch width must be a power of two")
+        rng = random.Random(self.seed)
+        self.hashes = [(rng.randrange(1, HASH_PRIME), rng.randrange(HASH_PRIME)) for _ in range(self.depth)]
+        self.rows = [array("Q", [0]) * self.width for _ in range(self.depth)]
+
+    def add(self, item: int, count: int = 1) -> int:
+        """
+        Count `item`, returning its new estimate
+        """
+        mask = self.width - 1
+        estimate = None
+        for row, (a, b) in zip(self.rows, self.hashes):
+            slot = ((a * item + b) % HASH_PRIME) & mask
+            row[slot] += count
+            if estimate is None or row[slot] < estimate:
+                estimate = row[slot]
+        self.total += count
+        return estimate
+
+    def estimate(self, item: int) -> int:
+        mask = self.width - 1
+        return min(row[((a * item + b) % HASH_PRIME) & mask] for row, (a, b) in zip(self.rows, self.hashes))
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.width * self.depth * self.rows[0].itemsize
+
+@dataclass
+class TopK:
+    """
+    The k items with the highest estimates offered so far
+    """
+    k: int
+    counts: dict = field(default_factory=dict)
+    # no more than the lowest count held, so lower offers are turned away without a scan
+    floor: int = 0
+
+    def offer(self, item: int, estimate: int):
+        counts = self.counts
+        if item in counts or len(counts) < self.k:
+            counts[item] = estimate
+            return
+        if estimate <= self.floor:
+            return
+        low = min(counts, key=counts.get)
+        if estimate > counts[low]:
+            del counts[low]
+            counts[item] = estimate
+            self.floor = min(counts.values())
+        else:
+            self.floor = counts[low]
+
+    def items(self) -> list[tuple[int, int]]:
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+
+@dataclass
+class _EventCounter:
+    sketch: CountMinSketch
+    top: TopK
+    sets: list
+
+    def record(self, block: int, set_mask: int):
+        self.top.offer(block, self.sketch.add(block))
+        self.sets[block & set_mask] += 1
+
+@dataclass
+class HotspotProfiler:
+    # hottest blocks and sets reported per event
+    k: int = 10
+    width: int = 2048
+    depth: int = 4
+    counters: dict = field(init=False, default_factory=dict)
+
+    def attach(self, caches, bus=None):
+        """
+        Count the events of `caches`, which must share one geometry, and of
+        the bus between them if there is one
+        """
+        cache = caches[0]
+        self.n_block = cache.n_block
+        self.set_mask = cache.set_count - 1
+        self.counters = {
+            event: _EventCounter(CountMinSketch(self.width, self.depth, seed), TopK(self.k), [0] * cache.set_count)
+            for seed, event in enumerate(EVENTS)
+        }
+        for cache in caches:
+            add_observer(cache, self)
+        if bus is not None:
+            self._wrap_bus(bus)
+
+    def filled(self, cache_id: int, block: int):
+        self.counters["misses"].record(block, self.set_mask)
+
+    def evicted(self, cache_id: int, block: int):
+        self.counters["evictions"].record(block, self.set_mask)
+
+    def _wrap_bus(self, bus):
+        transact = bus.transact
+        invalidations, updates, set_mask = self.counters["invalidations"], self.counters["updates"], self.set_mask
+
+        def counted(requester_id: int, block: int, txn: int, now: int) -> int:
+            before = bus.invalidations, bus.updates
+            cycles = transact(requester_id, block, txn, now)
+            if bus.invalidations != before[0]:
+                invalidations.record(block, set_mask)
+            if bus.updates != before[1]:
+                updates.record(block, set_mask)
+            return cycles
+
+        bus.transact = counted
+
+    def report(self) -> dict:
+        """
+        Per event, the total, the hottest block addresses and the hottest sets
+        with their counts (estimated for blocks, exact for sets)
+        """
+        report = {}
+        for event, counter in self.counters.items():
+            sets = sorted(range(len(counter.sets)), key=lambda i: (-counter.sets[i], i))
+            report[event] = {
+                "total": counter.sketch.total,
+                "blocks": [[block << self.n_block, count] for block, count in counter.top.items() if count],
+                "sets": [[i, counter.sets[i]] for i in sets[:self.k] if counter.sets[i]],
+            }
+        report["memory_bytes"] = sum(counter.sketch.memory_bytes for counter in self.counters.values())
+        return report
+
+    def print_report(self):
+        report = self.report()
+        for event in EVENTS:
+            counts = report[event]
+            if not counts["total"]:
+                continue
+            print(f"{counts['total']} {event}, hottest blocks (estimated):")
+            for address, count in counts["blocks"]:
+                print(f"    0x{address:08x} {count}")
+            print(f"hottest sets: {', '.join(f'{i} ({count})' for i, count in counts['sets'])}")
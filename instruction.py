@@ -1,12 +1,22 @@
 from dataclasses import dataclass
 from enum import Enum
 
+# Integer instruction codes, as they appear in the first column of a trace.
+# Used on the replay paths where building an Instruction per record is too slow.
+LOAD = 0
+STORE = 1
+OTHER = 2
+
 class InstructionType(Enum):
     LOAD = "0"
     STORE = "1"
     OTHER = "2"
 
+    @property
+    def code(self) -> int:
+        return int(self.value)
+
 @dataclass
 class Instruction:
     type: InstructionType
-    value: int
\ No newline at end of file
+    value: int
@@ -0,0 +1,107 @@
+"""
+Statistics streamed while a simulation runs.
+
+IntervalStats writes one JSON object per line every `every` instructions
+(trace records, summed over cores) or simulated cycles, with what happened
+during that interval:
+
+    {"interval": 3, "instructions": 4000000, "cycle": 2091355,
+     "cores": [{"core": 0, "records": 1000000, "load_store_instrs": 312000,
+                "compute_cycles": ..., "execution_cycles": ..., "cache_hits": ...,
+                "cache_misses": ...}, ...],
+     "bus": {"data_traffic_bytes": ..., "invalidations": ..., "updates": ...}}
+
+"instructions" and "cycle" say where the interval ended (for cycles, the
+earliest ready cycle of any core still running), every other count is the
+change over the interval. A last record with "final": true covers the rest of
+the run. Each line is flushed as it is written, so the output can be a pipe
+that another process follows. Only the previous totals are kept in memory.
+
+`stop_when`, if given, sees every record and ends the run early by returning
+True, e.g. to abandon a sweep point whose miss rate is already out of range.
+"""
+from dataclasses import dataclass, field
+import json
+import sys
+
+UNITS = ("instructions", "cycles")
+
+CORE_COUNTERS = ("load_store_instrs", "compute_cycles", "execution_cycles", "cache_hits", "cache_misses")
+BUS_COUNTERS = ("data_traffic_bytes", "invalidations", "updates")
+
+@dataclass
+class IntervalStats:
+    # file (or named pipe) to write records to, or "-" for stdout
+    path: str
+    every: int
+    unit: str = "instructions"
+    stop_when: object = None
+    # instruction count or cycle at which the next record is due
+    next_at: int = field(default=0, init=False)
+    interval: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        if self.unit not in UNITS:
+            raise ValueError(f"Unknown interval unit {self.unit}, expected one of {', '.join(UNITS)}")
+        if self.every <= 0:
+            raise ValueError("Interval must be positive")
+        self._out = None
+        self._previous = None
+
+    def begin(self, simulation, frontier: int):
+        """
+        Start the first interval at the simulation's current point
+        """
+        if self._out is None:
+            self._out = sys.stdout if self.path == "-" else open(self.path, "w")
+        self._previous = self._totals(simulation)
+        self._schedule(simulation._executed() if self.unit == "instructions" else frontier)
+
+    def due(self, executed: int, frontier) -> bool:
+        return (executed if self.unit == "instructions" else frontier) >= self.next_at
+
+    def emit(self, simulation, frontier: int, final: bool = False) -> bool:
+        """
+        Write the record for the interval just finished. Returns True if the
+        run should stop.
+        """
+        executed = simulation._executed()
+        totals = self._totals(simulation)
+        record = {
+            "interval": self.interval,
+            "instructions": executed,
+            "cycle": frontier,
+            "cores": [
+                {"core": core["core"], **{key: core[key] - before[key] for key in core if key != "core"}}
+                for core, before in zip(totals["cores"], self._previous["cores"])
+            ],
+        }
+        if totals["bus"] is not None:
+            record["bus"] = {key: totals["bus"][key] - self._previous["bus"][key] for key in BUS_COUNTERS}
+        if final:
+            record["final"] = True
+        self._out.write(json.dumps(record) + "\n")
+        self._out.flush()
+        self._previous = totals
+        self.interval += 1
+        self._schedule(executed if self.unit == "instructions" else frontier)
+        return self.stop_when is not None and self.stop_when(record)
+
+    def _schedule(self, position: int):
+        # the next multiple of `every` after position
+        self.next_at = (position // self.every + 1) * self.every
+
+    def close(self):
+        if self._out is not None and self._out is not sys.stdout:
+            self._out.close()
+        self._out = None
+
+    def _totals(self, simulation) -> dict:
+        cores = []
+        for core in simulation.cores:
+            stats = core.stats()
+            totals = {"core": core.id, "records": core.position}
+            totals.update((key, stats[key]) for key in CORE_COUNTERS)
+            cores.append(totals)
+        bus = simulation.bus.stats() if simulation.bus is not None else None
+        return {"cores": cores, "bus": bus}
@@ -0,0 +1,136 @@
+"""
+Event-count ledgers, to re-cost a finished run under other latencies.
+
+Every cycle a core spends is either a compute cycle from its trace or a
+multiple of one of the latencies in constants.py, so a run can be summed up
+per core as counts of the events each latency is charged for:
+
+    accesses         L1_CACHE_HIT_CC       every load/store, hit or miss
+    memory_fetches   MEM_FETCH_CC          blocks fetched from memory
+    word_transfers   BUS_UPDATE_WORD_CC    words sent between caches (a block
+                                           supplied by another cache, or a
+                                           BusUpd)
+    writebacks       EVICT_DIRTY_CACHE_BLOCK_CC  dirty blocks written back
+    wait_cycles      -                     cycles spent waiting for the bus
+
+and recost() recomputes the execution cycles for any other latencies without
+simulating again. Private caches (no protocol) and a lone core never wait, so
+their ledgers are exact. When several cores share a bus, different latencies
+would change how their transactions interleave, and with it which cache
+supplies a block, how long each waits and even the protocol's transitions;
+their ledgers are marked "exact": false and re-costing keeps the wait cycles
+as they were, so it is only an estimate.
+
+    python ledger.py LEDGER [NAME=CYCLES ...]   e.g. MEM_FETCH_CC=200
+"""
+import json
+import sys
+from bus import LEDGER_EVENTS
+from result_cache import constants_values
+
+LEDGER_VERSION = 1
+
+# event -> the constant charged for each, None for cycles counted as they are
+EVENT_COSTS = {
+    "accesses": "L1_CACHE_HIT_CC",
+    "memory_fetches": "MEM_FETCH_CC",
+    "word_transfers": "BUS_UPDATE_WORD_CC",
+    "writebacks": "EVICT_DIRTY_CACHE_BLOCK_CC",
+    "wait_cycles": None,
+}
+LATENCIES = tuple(name for name in EVENT_COSTS.values() if name is not None)
+
+def build_ledger(simulation) -> dict:
+    """
+    The ledger of a finished (not sampled) run
+    """
+    if simulation.sampling is not None:
+        raise ValueError("A sampled run has no ledger, as its counts are estimates")
+    constants = constants_values()
+    cores = []
+    for core in simulation.cores:
+        cache = core.cache
+        events = {"accesses": cache.cache_hits + cache.cache_misses}
+        if simulation.bus is None:
+            events.update(memory_fetches=cache.cache_misses, word_transfers=0, writebacks=cache.dirty_evictions, wait_cycles=0)
+        else:
+            events.update(zip(LEDGER_EVENTS, simulation.bus.ledger[core.id]))
+        cores.append({
+            "core": core.id,
+            "compute_cycles": core.compute_cycles,
+            "execution_cycles": core.measured_cycles,
+            "events": events,
+        })
+    return {
+        "version": LEDGER_VERSION,
+        "traces": [source.name for source in simulation.trace_sources],
+        "protocol": simulation.protocol,
+        "cache_size": simulation.cache_size,
+        "associativity": simulation.associativity,
+        "block_size_bytes": simulation.block_size_bytes,
+        "latencies": {name: constants[name] for name in LATENCIES},
+        "exact": simulation.bus is None or len(simulation.cores) == 1,
+        "cores": cores,
+    }
+
+def recost(ledger: dict, latencies: dict) -> dict:
+    """
+    Execution cycles per core had the run used `latencies` (constant name ->
+    cycles, defaulting to those the ledger was recorded with)
+    """
+    unknown = set(latencies) - set(LATENCIES)
+    if unknown:
+        raise ValueError(f"Unknown latencies {', '.join(sorted(unknown))}, expected some of {', '.join(LATENCIES)}")
+    costs = {**ledger["latencies"], **latencies}
+    cores = []
+    for core in ledger["cores"]:
+        cycles = core["compute_cycles"]
+        for event, count in core["events"].items():
+            cost = EVENT_COSTS[event]
+            cycles += count * (costs[cost] if cost is not None else 1)
+        cores.append({
+            "core": core["core"],
+            "execution_cycles": cycles,
+            "compute_cycles": core["compute_cycles"],
+            "idle_cycles": cycles - core["compute_cycles"],
+        })
+    return {
+        "execution_cycles": max(core["execution_cycles"] for core in cores),
+        "cores": cores,
+        "latencies": costs,
+        "exact": ledger["exact"],
+    }
+
+def save_ledger(ledger: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(ledger, f, indent=2)
+        f.write("\n")
+
+def load_ledger(path: str) -> dict:
+    with open(path) as f:
+        ledger = json.load(f)
+    if ledger.get("version") != LEDGER_VERSION:
+        raise ValueError(f"{path} is not a version {LEDGER_VERSION} ledger")
+    return ledger
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        raise SystemExit("usage: python ledger.py LEDGER [NAME=CYCLES ...]")
+    ledger = load_ledger(argv[0])
+    latencies = {}
+    for assignment in argv[1:]:
+        name, _, value = assignment.partition("=")
+        latencies[name] = int(value)
+    results = recost(ledger, latencies)
+    print(", ".join(f"{name}={cycles}" for name, cycles in results["latencies"].items()))
+    for core in results["cores"]:
+        prefix = f"Core: {core['core']}: "
+        print(prefix + f"{core['execution_cycles']} Execution cycles")
+        print(prefix + f"{core['idle_cycles']} idle cycles")
+    print(f"{results['execution_cycles']} Overall execution cycles")
+    if not results["exact"]:
+        print("Approximate: the cores contend for a shared bus, so their timing does not scale linearly with latencies")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Set-partitioned parallel simulation.
+
+Without a coherence protocol a core's cache never interacts with another, and
+within a cache each set's hits, misses and write-backs depend only on the
+accesses that map to that set. So a core's trace can be split by set index:
+worker process `p` of `n` simulates only the accesses to sets p, p + n,
+p + 2n, ... in a cache of its own, and the counters and set contents of all
+workers add up to exactly those of the serial run. A core's execution cycles
+are its compute cycles plus its cache cycles, so they merge the same way.
+
+The same holds for a lone core under a coherence protocol: no other cache
+ever shares a block, and a core never waits for a bus transaction of its own,
+so every set's transactions and their cost are independent too. With more
+than one core on a bus, the caches interact and cannot be partitioned.
+
+Traces are decoded into shared memory once (as for sweeps) and every worker
+filters them itself, so only counters and set contents are sent back.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from instruction import OTHER
+from traces import SharedTrace
+try:
+    import numpy as np
+except ImportError: # partitions are filtered in plain Python
+    np = None
+
+def run_partitioned(simulation):
+    """
+    Run `simulation` with its cores' sets split into simulation.set_partitions
+    worker processes, leaving its cores as a serial run would
+    """
+    partitions = min(simulation.set_partitions, simulation.cores[0].cache.set_count)
+    config = {
+        "cache_size": simulation.cache_size,
+        "associativity": simulation.associativity,
+        "block_size_bytes": simulation.block_size_bytes,
+        "word_size_bits": simulation.word_size_bits,
+        "chunk_size": simulation.chunk_size,
+        "cache_engine": simulation.cache_engine,
+        "coalesce": simulation.coalesce,
+        "protocol": simulation.protocol,
+    }
+    traces = []
+    blocks = []
+    try:
+        for source in simulation.trace_sources:
+            if isinstance(source, SharedTrace):
+                traces.append(source)
+            else:
+                trace, shm = SharedTrace.create(source)
+                traces.append(trace)
+                blocks.append(shm)
+        with ProcessPoolExecutor(max_workers=simulation.set_partitions) as executor:
+            futures = [
+                [
+                    executor.submit(simulate_partition, trace, config, partition, partitions, simulation._collapses_runs())
+                    for partition in range(partitions)
+                ]
+                for trace in traces
+            ]
+            for core, core_futures in zip(simulation.cores, futures):
+                parts = [future.result() for future in core_futures]
+                _merge(core, parts, partitions)
+                if simulation.bus is not None:
+                    _merge_bus(simulation.bus, parts)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def simulate_partition(trace: SharedTrace, config: dict, partition: int, partitions: int, collapse_runs: bool) -> dict:
+    """
+    Simulate the accesses of `trace` to sets partition, partition + partitions,
+    ... in a cache of their own. The first partition also sums the compute
+    cycles, which belong to no set. Same-block runs are collapsed if the serial
+    run collapses them.
+    """
+    # imported here, as simulation.py imports this module
+    from simulation import Simulation
+    simulation = Simulation([trace], use_binary_trace=False, **config)
+    core = simulation.cores[0]
+    totals = {"records": 0, "compute_cycles": 0}
+    with ExitStack() as stack:
+        chunks = simulation._chunks(trace, stack)
+        if simulation.coalesce:
+            chunks = simulation._coalesce(chunks, collapse_runs)
+        core.attach(_partition_chunks(chunks, core.cache, partition, partitions, totals))
+        core.run_until(float("inf"), 0)
+    return {
+        "records": totals["records"],
+        "compute_cycles": totals["compute_cycles"],
+        "load_store_instrs": core.load_store_instrs,
+        "cache": core.cache.get_state(),
+        "bus": simulation.bus.get_state() if simulation.bus is not None else None,
+    }
+
+def _partition_chunks(chunks, cache, partition: int, partitions: int, totals: dict):
+    # the accesses of each chunk that map to the partition's sets
+    n_block, set_mask = cache.n_block, cache.set_count - 1
+    for chunk in chunks:
+        totals["records"] += len(chunk[0])
+        if np is not None:
+            types = np.asarray(chunk[0], dtype=np.uint8)
+            values = np.asarray(chunk[1], dtype=np.uint32)
+            is_access = types != OTHER
+            if partition == 0:
+                totals["compute_cycles"] += int(values[~is_access].sum(dtype=np.uint64))
+            keep = is_access & (((values >> n_block) & set_mask) % partitions == partition)
+            yield tuple(np.asarray(column)[keep].tolist() for column in chunk)
+            continue
+        keep = []
+        for i, (type_code, value) in enumerate(zip(chunk[0], chunk[1])):
+            if type_code == OTHER:
+                if partition == 0:
+                    totals["compute_cycles"] += value
+            elif ((value >> n_block) & set_mask) % partitions == partition:
+                keep.append(i)
+        yield tuple([column[i] for i in keep] for column in chunk)
+
+def _merge(core, parts: list[dict], partitions: int):
+    cache = core.cache
+    for partition, part in enumerate(parts):
+        core.compute_cycles += part["compute_cycles"]
+        core.load_store_instrs += part["load_store_instrs"]
+        cache.cache_hits += part["cache"]["cache_hits"]
+        cache.cache_misses += part["cache"]["cache_misses"]
+        cache.cycles += part["cache"]["cycles"]
+        cache.dirty_evictions += part["cache"]["dirty_evictions"]
+        cache.merge_sets(part["cache"]["storage"], range(partition, cache.set_count, partitions))
+    core.execution_cycles += core.compute_cycles + cache.cycles
+    # nothing is left to run, the core is only told how far its trace went
+    core.attach((), parts[0]["records"])
+
+def _merge_bus(bus, parts: list[dict]):
+    state = bus.get_state()
+    for part in parts:
+        for key in ("data_traffic_bytes", "invalidations", "updates"):
+            state[key] += part["bus"][key]
+        state["transaction_counts"] = [a + b for a, b in zip(state["transaction_counts"], part["bus"]["transaction_counts"])]
+        state["ledger"] = [
+            [a + b for a, b in zip(events, part_events)] for events, part_events in zip(state["ledger"], part["bus"]["ledger"])
+        ]
+    # also rebuilds the directory from the merged cache
+    bus.set_state(state)
@@ -0,0 +1,312 @@
+"""
+Conservative parallel discrete-event simulation of the cores.
+
+Every core runs with its own cache in a worker process of its own, which also
+reads and parses the core's trace. How much the workers have to synchronise
+depends on how the cores interact:
+
+Without a protocol (or with a lone core) no core ever waits on another, so
+each worker simply runs its core to the end of its trace, as a one-core
+Simulation.
+
+On a shared bus, the serial scheduler orders every access by the cycle it is
+issued at, with the core id breaking ties. Another core's accesses only matter
+to an access that misses or issues a bus transaction (or to a hit whose block
+a transaction snooped), as a hit that needs none, say a read of an S block
+under MESI, does the same whatever the other caches hold. So:
+
+    - every worker looks ahead (Core.lookahead) for the cycle of its next
+      access that misses or issues a transaction, assuming no other cache
+      interferes. No transaction can happen before the earliest of these
+      cycles, so that core's access is the next transaction of the whole
+      system, and every other core's lookahead stays valid until a
+      transaction snoops its cache.
+    - the coordinator (the parent process) holds the bus and its directory,
+      and has the transactions executed one at a time in that order. The
+      requesting worker's cache calls the bus through the pipe, and the bus
+      relays its snoops to the other workers, each of which first catches up
+      on its hits up to the cycle of the transaction.
+    - in between, every worker is told to catch up on its hits, up to the
+      latest transaction, whenever it lags ADVANCE_CYCLES behind, and does so
+      in parallel with the transactions.
+
+Results, including the bus's counters and ledger, are the same as the serial
+scheduler's. Transactions stay serial and each costs a few messages between
+processes, so the speed-up depends on the share of a trace's accesses that
+are hits needing no transaction. Tracing, sharing classification, profiling,
+interval statistics, sampling and checkpoints need every access to happen in
+one process, so cannot be combined with it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+import math
+import multiprocessing
+import traceback
+from coherent_cache import CoherentCache
+from core import Core
+from directory import Directory
+from preprocess import coalesce_chunks
+from protocols import INVALID, get_protocol
+
+# cycles a worker's hits may lag behind the latest transaction before it is told to catch up
+ADVANCE_CYCLES = 4096
+
+# kinds of the fill and eviction events a worker's cache reports
+FILLED, EVICTED = range(2)
+
+def run_parallel(simulation):
+    """
+    Run `simulation` with each core in a worker process, leaving its cores
+    (and bus) as a serial run would
+    """
+    if any(simulation._start_positions):
+        raise ValueError("Parallel cores cannot resume from a checkpoint")
+    config = {
+        "cache_size": simulation.cache_size,
+        "associativity": simulation.associativity,
+        "block_size_bytes": simulation.block_size_bytes,
+        "word_size_bits": simulation.word_size_bits,
+        "use_binary_trace": simulation.use_binary_trace,
+        "chunk_size": simulation.chunk_size,
+        "buffer_size": simulation.buffer_size,
+        "background_decode": simulation.background_decode,
+        "cache_engine": simulation.cache_engine,
+        "coalesce": simulation.coalesce,
+        "protocol": simulation.protocol,
+        "directory_entries": simulation.directory_entries,
+    }
+    if simulation.bus is None or len(simulation.cores) == 1:
+        _run_independent(simulation, config)
+    else:
+        _run_coherent(simulation, config)
+
+def _run_independent(simulation, config: dict):
+    with ProcessPoolExecutor(max_workers=len(simulation.cores)) as executor:
+        # same-block runs are collapsed as in a serial run of all the cores
+        collapse_runs = simulation._collapses_runs()
+        futures = [executor.submit(simulate_core, source, config, collapse_runs) for source in simulation.trace_sources]
+        for core, future in zip(simulation.cores, futures):
+            state = future.result()
+            core.set_state(state["core"])
+            core.attach((), state["core"]["position"])
+            if simulation.bus is not None:
+                simulation.bus.set_state(state["bus"])
+
+def simulate_core(source, config: dict, collapse_runs: bool) -> dict:
+    """
+    Run one core's trace on its own, as a one-core Simulation
+    """
+    # imported here, as simulation.py imports this module
+    from simulation import Simulation
+    simulation = Simulation([source], **config)
+    core = simulation.cores[0]
+    with ExitStack() as stack:
+        chunks = simulation._chunks(source, stack, core.cache)
+        if simulation.coalesce:
+            chunks = simulation._coalesce(chunks, collapse_runs)
+        core.attach(chunks)
+        core.run_until(math.inf, 0)
+    return {
+        "core": simulation.cores[0].get_state(),
+        "bus": simulation.bus.get_state() if simulation.bus is not None else None,
+    }
+
+@dataclass
+class _RemoteCache:
+    """
+    The bus's view of a worker's cache. A snoop is relayed to the worker once
+    it has caught up to `point`, the (cycle, core id) of the transaction.
+    """
+    id: int
+    conn: object = field(repr=False)
+    directory: Directory = field(repr=False)
+    point: tuple = (-1, -1)
+    # the point the worker was last told to catch up to
+    synced: tuple = (-1, -1)
+    # set when a snoop changed a block's state, which invalidates the worker's lookahead
+    snooped: bool = False
+
+    def sync(self):
+        if self.synced != self.point:
+            self.conn.send(("advance", *self.point))
+            self.synced = self.point
+
+    def block_state(self, block: int) -> int:
+        self.sync()
+        self.conn.send(("state", block))
+        return _receive(self.conn, self.id)[0]
+
+    def set_block_state(self, block: int, state: int):
+        self.sync()
+        self.conn.send(("snoop", block, state))
+        self.snooped = True
+        if state == INVALID:
+            self.directory.evicted(self.id, block)
+
+def _run_coherent(simulation, config: dict):
+    bus = simulation.bus
+    caches = bus.caches
+    workers, conns = [], []
+    try:
+        for core, source in zip(simulation.cores, simulation.trace_sources):
+            conn, child_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=serve_core, args=(child_conn, source, config, core.id), daemon=True)
+            worker.start()
+            child_conn.close()
+            workers.append(worker)
+            conns.append(conn)
+        bus.caches = [_RemoteCache(core.id, conn, bus.directory) for core, conn in zip(simulation.cores, conns)]
+        _schedule(bus, conns)
+        for core, conn in zip(simulation.cores, conns):
+            conn.send(("finish",))
+            state = _receive(conn, core.id)[0]
+            core.set_state(state)
+            core.attach((), state["position"])
+        for worker in workers:
+            worker.join()
+    finally:
+        bus.caches = caches
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+def _schedule(bus, conns):
+    # every live worker's latest lookahead, (position, cycle, found)
+    targets = [_receive(conn, i)[0] for i, conn in enumerate(conns)]
+    remotes = bus.caches
+    while True:
+        live = [(target[1], i) for i, target in enumerate(targets) if target is not None]
+        if not live:
+            return
+        point = min(live)
+        cycle, core_id = point
+        for remote in remotes:
+            remote.point = point
+            if remote.id != core_id and targets[remote.id] is not None and cycle - remote.synced[0] >= ADVANCE_CYCLES:
+                remote.sync()
+        targets[core_id] = _step(bus, conns[core_id], core_id)
+        snooped = [remote for remote in remotes if remote.snooped]
+        for remote in snooped:
+            remote.snooped = False
+            remote.conn.send(("lookahead",))
+        for remote in snooped:
+            targets[remote.id] = _receive(remote.conn, remote.id)[0]
+
+def _step(bus, conn, core_id: int):
+    """
+    Have worker `core_id` execute up to its lookahead, serving its cache's
+    bus calls, and return its next lookahead
+    """
+    conn.send(("step",))
+    directory = bus.directory
+    while True:
+        command, events, *args = _receive_message(conn, core_id)
+        for kind, block in events:
+            if kind == FILLED:
+                directory.filled(core_id, block)
+            else:
+                directory.evicted(core_id, block)
+        if command == "shared":
+            conn.send(bus.shared(core_id, *args))
+        elif command == "transact":
+            conn.send(bus.transact(core_id, *args))
+        else:
+            return args[0]
+
+def _receive_message(conn, core_id: int) -> tuple:
+    message = conn.recv()
+    if message[0] == "failed":
+        raise RuntimeError(f"Worker of core {core_id} failed:\n{message[2]}")
+    return message
+
+def _receive(conn, core_id: int) -> list:
+    # the arguments of a reply
+    return _receive_message(conn, core_id)[2:]
+
+@dataclass
+class _BusClient:
+    """
+    A worker cache's bus and observer, both forwarded to the coordinator. Fills
+    and evictions are sent along with the next message, which keeps them in
+    order with the bus calls.
+    """
+    conn: object
+    events: list = field(default_factory=list)
+    # cleared while applying a snoop, whose eviction the coordinator already made
+    forward: bool = True
+
+    def filled(self, cache_id: int, block: int):
+        if self.forward:
+            self.events.append((FILLED, block))
+
+    def evicted(self, cache_id: int, block: int):
+        if self.forward:
+            self.events.append((EVICTED, block))
+
+    def send(self, command: str, *args):
+        self.conn.send((command, self.events, *args))
+        self.events = []
+
+    def shared(self, requester_id: int, block: int) -> bool:
+        self.send("shared", block)
+        return self.conn.recv()
+
+    def transact(self, requester_id: int, block: int, txn: int, now: int) -> int:
+        self.send("transact", block, txn, now)
+        return self.conn.recv()
+
+def serve_core(conn, source, config: dict, core_id: int):
+    """
+    Worker process: simulate core `core_id` on the coordinator's commands
+    """
+    try:
+        _serve_core(conn, source, config, core_id)
+    except BaseException:
+        conn.send(("failed", [], traceback.format_exc()))
+        raise
+    finally:
+        conn.close()
+
+def _serve_core(conn, source, config: dict, core_id: int):
+    # imported here, as simulation.py imports this module
+    from simulation import Simulation
+    # opens the trace as a serial run would
+    opener = Simulation([source], **{**config, "protocol": None, "cache_engine": "default"})
+    cache = CoherentCache(core_id, opener.cache_size, opener.associativity, opener.block_size_bytes, get_protocol(config["protocol"]))
+    bus = cache.bus = cache.observer = _BusClient(conn)
+    core = Core(core_id, cache)
+    with ExitStack() as stack:
+        chunks = opener._chunks(source, stack)
+        if opener.coalesce:
+            # other cores can intervene, so same-block runs are left alone as in a serial run
+            chunks = coalesce_chunks(chunks, opener.block_size_bytes, False, opener.chunk_size)
+        core.attach(chunks)
+        target = core.lookahead()
+        bus.send("next", target)
+        while True:
+            command, *args = conn.recv()
+            if command == "advance":
+                # hits up to (cycle, core id) args, never past the lookahead
+                if target is not None and core.position < target[0] and (core.execution_cycles, core_id) < tuple(args):
+                    core.run_until(*args, target[0] - core.position)
+            elif command == "state":
+                bus.send("state", cache.block_state(*args))
+            elif command == "snoop":
+                bus.forward = False
+                cache.set_block_state(*args)
+                bus.forward = True
+            elif command == "lookahead":
+                target = core.lookahead()
+                bus.send("next", target)
+            elif command == "step":
+                position, _, found = target
+                # through the access that needs the bus, or to the end of the chunk
+                records = position + found - core.position
+                if records:
+                    core.run_until(math.inf, 0, records)
+                target = core.lookahead()
+                bus.send("next", target)
+            elif command == "finish":
+                bus.send("state", core.get_state())
+                return
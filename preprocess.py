@@ -0,0 +1,65 @@
+"""
+Trace preprocessing between trace reading and Core.
+
+coalesce_chunks rewrites a stream of (types, values) chunks into (types, values,
+repeats) chunks with fewer records:
+    - adjacent compute records are merged into one, which never changes timing
+      since a core does nothing else while computing
+    - with collapse_runs, a run of accesses to the same cache block becomes one
+      access followed by repeats[i] accesses that are guaranteed hits, and the
+      compute records inside the run are merged after it
+
+A run is only safe to collapse when no other core can touch the block in
+between and no bus follows the cache, i.e. for single-core simulations without
+a protocol. The collapsed access is a store if any access of the run is one,
+which leaves a private cache's block in the same state (dirty, most recently
+used) as the original run; under a protocol it would also turn a read miss
+followed by a write hit into a write miss, trading a BusRd for a BusRdX.
+"""
+from array import array
+import math
+from instruction import OTHER, STORE
+
+def coalesce_chunks(chunks, block_size_bytes: int, collapse_runs: bool, chunk_size: int = 1 << 16):
+    n_block = int(math.log(block_size_bytes, 2))
+    out_types, out_values, out_repeats = array("B"), array("I"), array("I")
+    compute = 0
+    # the open access run, emitted once an access to another block arrives
+    run_type = None
+    run_addr = run_block = run_repeats = 0
+
+    for types, values in chunks:
+        for type_code, value in zip(types, values):
+            if type_code == OTHER:
+                compute += value
+                continue
+            block = value >> n_block
+            if collapse_runs and run_type is not None and block == run_block:
+                run_repeats += 1
+                if type_code == STORE:
+                    run_type = STORE
+                continue
+            if run_type is not None:
+                out_types.append(run_type)
+                out_values.append(run_addr)
+                out_repeats.append(run_repeats)
+            if compute:
+                out_types.append(OTHER)
+                out_values.append(compute)
+                out_repeats.append(0)
+                compute = 0
+            run_type, run_addr, run_block, run_repeats = type_code, value, block, 0
+            if len(out_types) >= chunk_size:
+                yield out_types, out_values, out_repeats
+                out_types, out_values, out_repeats = array("B"), array("I"), array("I")
+
+    if run_type is not None:
+        out_types.append(run_type)
+        out_values.append(run_addr)
+        out_repeats.append(run_repeats)
+    if compute:
+        out_types.append(OTHER)
+        out_values.append(compute)
+        out_repeats.append(0)
+    if out_types:
+        yield out_types, out_values, out_repeats
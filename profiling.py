@@ -0,0 +1,108 @@
+"""
+Per-phase timing for a simulation run.
+
+Like tracing.py, nothing here is on the access path unless asked for:
+attach_profiler replaces a cache's methods with timed wrappers on that one
+instance, so an unprofiled run executes exactly the same code as before.
+
+Phases:
+    parse   producing trace chunks (reading, converting or slicing the trace)
+    decode  splitting addresses into set indexes and tags
+    lookup  set lookups and fills, excluding evictions
+    evict   choosing and removing LRU victims (Cache and CoherentCache;
+            CompactCache evicts inline, so its evictions count as lookup)
+    bus     bus transactions, including snooping the other caches
+    other   everything else: the core loop, scheduling and statistics
+
+The wrappers add a couple of perf_counter calls per access, so the absolute
+times are inflated; the split between phases is what to look at.
+"""
+from dataclasses import dataclass, field
+import time
+
+PHASES = ("parse", "decode", "lookup", "evict", "bus")
+
+@dataclass
+class PhaseTimer:
+    seconds: dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    calls: dict[str, int] = field(default_factory=lambda: dict.fromkeys(PHASES, 0))
+    # wall time of the whole run, set by whoever runs the simulation
+    total: float = 0.0
+
+    def timed(self, phase: str, func):
+        """
+        Wrap `func` so that the time spent in it is added to `phase`
+        """
+        seconds, calls = self.seconds, self.calls
+        perf_counter = time.perf_counter
+
+        def wrapper(*args):
+            start = perf_counter()
+            try:
+                return func(*args)
+            finally:
+                seconds[phase] += perf_counter() - start
+                calls[phase] += 1
+        return wrapper
+
+    def timed_chunks(self, chunks):
+        """
+        Iterate over `chunks`, adding the time spent producing each to "parse"
+        """
+        chunks = iter(chunks)
+        perf_counter = time.perf_counter
+        while True:
+            start = perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                self.seconds["parse"] += perf_counter() - start
+            self.calls["parse"] += 1
+            yield chunk
+
+    def breakdown(self) -> dict[str, float]:
+        """
+        Exclusive seconds per phase, plus "other" when the total is known
+        """
+        phases = dict(self.seconds)
+        # lookups time the evictions and bus transactions they make, which are reported separately
+        nested = phases["evict"] + phases["bus"]
+        phases["lookup"] -= nested
+        if self.total:
+            phases["other"] = max(0.0, self.total - sum(self.seconds.values()) + nested)
+        return phases
+
+    def print_report(self):
+        phases = self.breakdown()
+        whole = self.total or sum(phases.values()) or 1.0
+        print("Phase breakdown:")
+        for phase, seconds in phases.items():
+            calls = f" {self.calls[phase]} calls" if phase in self.calls else ""
+            print(f"{phase:>8} {seconds:10.3f} s {100 * seconds / whole:6.1f}%{calls}")
+        if self.total:
+            print(f"{'total':>8} {self.total:10.3f} s")
+
+def attach_profiler(cache, timer: PhaseTimer):
+    """
+    Time `cache`'s address decoding, lookups and evictions into `timer`
+    """
+    cache.decode_addrs = timer.timed("decode", cache.decode_addrs)
+    cache.read_block = timer.timed("lookup", cache.read_block)
+    cache.write_block = timer.timed("lookup", cache.write_block)
+
+    def time_evictions():
+        for cache_set in cache.sets or ():
+            handler = cache_set.eviction_handler
+            handler.evict = timer.timed("evict", handler.evict)
+
+    # restoring a checkpoint rebuilds the sets, whose handlers need wrapping again
+    init_storage = cache.init_storage
+
+    def profiled_init_storage():
+        init_storage()
+        time_evictions()
+
+    cache.init_storage = profiled_init_storage
+    time_evictions()
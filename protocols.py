@@ -0,0 +1,124 @@
+"""
+Coherence protocols as transition tables.
+
+A protocol is data: for every (state, processor event) the next state and the
+bus transactions to issue, chosen by whether another cache holds the block
+(the shared line), and for every (state, snooped transaction) the next state
+and whether this cache supplies the block. CoherentCache and Bus only index
+these tables, so adding a protocol (MOESI, MESIF, ...) means adding a table.
+
+State 0 is always invalid (the block is not held).
+"""
+from dataclasses import dataclass
+
+INVALID = 0
+
+# processor events
+PR_RD = 0
+PR_WR = 1
+EVENTS = ("PrRd", "PrWr")
+
+# bus transactions
+BUS_RD = 0 # read, fetching the block
+BUS_RDX = 1 # read for ownership, fetching the block and invalidating other copies
+BUS_UPGR = 2 # invalidate other copies of a block already held, no data
+BUS_UPD = 3 # send one written word to the other copies
+BUS_WB = 4 # write a dirty block back to memory, not snooped
+TRANSACTIONS = ("BusRd", "BusRdX", "BusUpgr", "BusUpd", "BusWB")
+
+@dataclass(frozen=True)
+class Protocol:
+    name: str
+    states: tuple[str, ...]
+    # dirty[state]: the block differs from memory, so evicting it writes it back
+    dirty: tuple[bool, ...]
+    # processor[state][event] = (next if alone, transactions if alone, next if shared, transactions if shared)
+    processor: tuple
+    # snoop[state][transaction] = (next state, supplies the block)
+    snoop: tuple
+
+def build_protocol(name: str, states, dirty, processor: dict, snoop: dict) -> Protocol:
+    """
+    Build a Protocol from readable specs: `processor` maps (state, event) to
+    (next alone, transactions alone, next shared, transactions shared) and
+    `snoop` maps (state, transaction) to (next state, supplies), all by name.
+    Snooped transactions missing from `snoop` leave the state unchanged.
+    """
+    code = {state: i for i, state in enumerate(states)}
+    txn = {t: i for i, t in enumerate(TRANSACTIONS)}
+    processor_table = [[None] * len(EVENTS) for _ in states]
+    for (state, event), (alone, alone_txns, shared, shared_txns) in processor.items():
+        processor_table[code[state]][EVENTS.index(event)] = (
+            code[alone], tuple(txn[t] for t in alone_txns), code[shared], tuple(txn[t] for t in shared_txns),
+        )
+    for state in states:
+        for event in EVENTS:
+            if processor_table[code[state]][EVENTS.index(event)] is None:
+                raise ValueError(f"{name}: no transition for ({state}, {event})")
+    snoop_table = [[(i, False)] * len(TRANSACTIONS) for i in range(len(states))]
+    for (state, transaction), (next_state, supplies) in snoop.items():
+        snoop_table[code[state]][txn[transaction]] = (code[next_state], supplies)
+    return Protocol(
+        name, tuple(states), tuple(state in dirty for state in states),
+        tuple(tuple(row) for row in processor_table), tuple(tuple(row) for row in snoop_table),
+    )
+
+MESI = build_protocol(
+    "MESI",
+    states=("I", "S", "E", "M"),
+    dirty={"M"},
+    processor={
+        ("I", "PrRd"): ("E", ["BusRd"], "S", ["BusRd"]),
+        ("I", "PrWr"): ("M", ["BusRdX"], "M", ["BusRdX"]),
+        ("S", "PrRd"): ("S", [], "S", []),
+        ("S", "PrWr"): ("M", ["BusUpgr"], "M", ["BusUpgr"]),
+        ("E", "PrRd"): ("E", [], "E", []),
+        ("E", "PrWr"): ("M", [], "M", []),
+        ("M", "PrRd"): ("M", [], "M", []),
+        ("M", "PrWr"): ("M", [], "M", []),
+    },
+    snoop={
+        ("S", "BusRd"): ("S", True),
+        ("S", "BusRdX"): ("I", True),
+        ("S", "BusUpgr"): ("I", False),
+        ("E", "BusRd"): ("S", True),
+        ("E", "BusRdX"): ("I", True),
+        ("M", "BusRd"): ("S", True),
+        ("M", "BusRdX"): ("I", True),
+    },
+)
+
+DRAGON = build_protocol(
+    "Dragon",
+    # "I" stands for a block not present, Dragon has no invalid state of its own
+    states=("I", "Sc", "E", "Sm", "M"),
+    dirty={"Sm", "M"},
+    processor={
+        ("I", "PrRd"): ("E", ["BusRd"], "Sc", ["BusRd"]),
+        ("I", "PrWr"): ("M", ["BusRd"], "Sm", ["BusRd", "BusUpd"]),
+        ("Sc", "PrRd"): ("Sc", [], "Sc", []),
+        ("Sc", "PrWr"): ("M", ["BusUpd"], "Sm", ["BusUpd"]),
+        ("E", "PrRd"): ("E", [], "E", []),
+        ("E", "PrWr"): ("M", [], "M", []),
+        ("Sm", "PrRd"): ("Sm", [], "Sm", []),
+        ("Sm", "PrWr"): ("M", ["BusUpd"], "Sm", ["BusUpd"]),
+        ("M", "PrRd"): ("M", [], "M", []),
+        ("M", "PrWr"): ("M", [], "M", []),
+    },
+    snoop={
+        ("Sc", "BusRd"): ("Sc", True),
+        ("Sc", "BusUpd"): ("Sc", False),
+        ("E", "BusRd"): ("Sc", True),
+        ("Sm", "BusRd"): ("Sm", True),
+        ("Sm", "BusUpd"): ("Sc", False),
+        ("M", "BusRd"): ("Sm", True),
+    },
+)
+
+PROTOCOLS = {protocol.name: protocol for protocol in (MESI, DRAGON)}
+
+def get_protocol(name: str) -> Protocol:
+    for protocol_name, protocol in PROTOCOLS.items():
+        if protocol_name.lower() == name.lower():
+            return protocol
+    raise ValueError(f"Unknown protocol {name}, expected one of {', '.join(PROTOCOLS)}")
@@ -0,0 +1,141 @@
+"""
+On-disk store of simulation results.
+
+A result is keyed by a SHA-256 over everything it depends on:
+    - the content of every trace file (and, for archives, which members make
+      up the cores, in core order)
+    - the configuration: protocol, cache size, associativity, block size and
+      word size
+    - every constant in constants.py, so changing a latency is a new key
+    - RESULT_CACHE_VERSION, to be bumped when the simulator itself changes
+      what it computes
+Options that do not change results (cache engine, coalescing, chunk sizes,
+directory bounds, set partitioning, parallel cores, background decoding) are
+left out, so runs that differ only in those share entries.
+
+Trace digests are remembered per (path, size, mtime), so a hit does not re-read
+the trace. Entries are JSON files; reading one marks it as used, and once the
+store grows past max_bytes the least recently used entries are deleted.
+"""
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import os
+import constants
+from traces import TraceSource, file_digest
+
+LOGGER = logging.getLogger("coherence")
+
+RESULT_CACHE_VERSION = 1
+DEFAULT_RESULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "coherence")
+DEFAULT_MAX_BYTES = 64 << 20
+DIGESTS_FILE = "digests.json"
+
+def constants_values() -> dict:
+    return {name: getattr(constants, name) for name in sorted(dir(constants)) if name.isupper()}
+
+@dataclass
+class ResultCache:
+    directory: str = DEFAULT_RESULT_CACHE_DIR
+    max_bytes: int = DEFAULT_MAX_BYTES
+    hits: int = 0
+    misses: int = 0
+
+    def __post_init__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._digests = None
+
+    def key(self, sources: list[TraceSource], protocol: str, cache_size: int, associativity: int,
+            block_size_bytes: int, word_size_bits: int) -> str:
+        if not all(isinstance(source, TraceSource) for source in sources):
+            raise ValueError("Results can only be cached for traces read from files")
+        material = {
+            "version": RESULT_CACHE_VERSION,
+            "traces": [[self.trace_digest(source.path), source.member] for source in sources],
+            "config": {
+                "protocol": protocol.lower() if protocol is not None else None,
+                "cache_size": cache_size,
+                "associativity": associativity,
+                "block_size_bytes": block_size_bytes,
+                "word_size_bits": word_size_bits,
+            },
+            "constants": constants_values(),
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    def key_for(self, simulation) -> str:
+        return self.key(
+            simulation.trace_sources, simulation.protocol, simulation.cache_size, simulation.associativity,
+            simulation.block_size_bytes, simulation.word_size_bits,
+        )
+
+    def trace_digest(self, path: str) -> str:
+        if self._digests is None:
+            self._digests = self._read_json(os.path.join(self.directory, DIGESTS_FILE)) or {}
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self._digests.get(path)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        digest = file_digest(path)
+        self._digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._write_json(os.path.join(self.directory, DIGESTS_FILE), self._digests)
+        return digest
+
+    def get(self, key: str):
+        """
+        The stored results for `key`, or None
+        """
+        path = self._entry_path(key)
+        results = self._read_json(path)
+        if results is None:
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return results
+
+    def put(self, key: str, results: dict):
+        self._write_json(self._entry_path(key), results)
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the store fits in max_bytes
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and name != DIGESTS_FILE:
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            LOGGER.debug(f"Evicted cached result {name}")
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def _read_json(self, path: str):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_json(self, path: str, value):
+        # written aside and renamed, so concurrent readers never see half an entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
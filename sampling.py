@@ -0,0 +1,122 @@
+"""
+Sampled simulation: approximate results for a fraction of the work.
+
+Each core's trace is cut into periods of `period` records. The first
+period - window records of a period only warm the cache (Core.warm /
+Cache.warm: contents, LRU order and dirty bits follow the trace, nothing is
+counted), and the last `window` records are simulated in detail. Since every
+record still passes through the cache, each window starts from the exact cache
+state of a full run and only the choice of windows introduces error.
+
+Warming still visits every access, so it bounds the speed-up. With `warmup`,
+only the last `warmup` records before each window warm the cache and the rest
+are skipped outright (Core.skip). That is much faster, but windows then start
+from a partly stale cache, which biases the estimates (typically towards more
+misses) by an amount the confidence intervals do not cover.
+
+Totals are extrapolated with a ratio estimator (measured count per measured
+record, times the trace's records) and reported with a normal confidence
+interval over the per-window rates, including the finite population correction
+for the share of records measured.
+
+Sampling needs cores that do not interact, so it supports private caches
+(no protocol) or a single core.
+"""
+from dataclasses import dataclass
+import math
+from statistics import NormalDist, stdev
+
+METRICS = ("load_store_instrs", "compute_cycles", "execution_cycles", "cache_hits", "cache_misses")
+BUS_METRICS = ("data_traffic_bytes", "invalidations", "updates")
+
+@dataclass
+class Sampling:
+    period: int = 100_000
+    window: int = 10_000
+    confidence: float = 0.95
+    # records warmed before each window, None to warm all of the rest of the period
+    warmup: int = None
+
+    def __post_init__(self):
+        if not 0 < self.window <= self.period:
+            raise ValueError("Sampling window must be positive and no longer than the period")
+        if self.warmup is not None and not 0 <= self.warmup <= self.period - self.window:
+            raise ValueError("Sampling warmup must fit in the period, beside the window")
+        if not 0 < self.confidence < 1:
+            raise ValueError("Confidence must be between 0 and 1")
+
+def sample_core(core, sampling: Sampling) -> list[dict]:
+    """
+    Run `core`'s attached trace in sampling mode, returning the counts of
+    every measured window
+    """
+    windows = []
+    gap = sampling.period - sampling.window
+    warmup = gap if sampling.warmup is None else sampling.warmup
+    while core.skip(gap - warmup) and core.warm(warmup):
+        before, position = core.stats(), core.position
+        more = core.run_until(math.inf, 0, sampling.window)
+        after = core.stats()
+        if core.position > position:
+            window = {"records": core.position - position}
+            window.update((metric, after[metric] - before[metric]) for metric in METRICS)
+            windows.append(window)
+        if not more:
+            break
+    return windows
+
+def _estimate(values, records, total_records, periods, z) -> dict:
+    measured = sum(records)
+    estimate = sum(values) / measured * total_records if measured else 0.0
+    if len(values) < 2:
+        # a single window says nothing about the spread
+        low, high = (estimate, estimate) if len(values) == periods else (0.0, math.inf)
+    else:
+        spread = stdev(v / n for v, n in zip(values, records))
+        fpc = math.sqrt(max(0.0, 1 - sum(records) / total_records))
+        half = z * spread / math.sqrt(len(values)) * fpc * total_records
+        low, high = max(0.0, estimate - half), estimate + half
+    return {"estimate": round(estimate), "low": round(low), "high": high if math.isinf(high) else round(high)}
+
+def sampled_results(simulation, samples: list[list[dict]]) -> dict:
+    """
+    Simulation.results() for a sampled run: every count is an estimate, and
+    results["sampling"] has the confidence interval of each
+    """
+    sampling = simulation.sampling
+    z = NormalDist().inv_cdf((1 + sampling.confidence) / 2)
+    cores, intervals = [], []
+    measured_records = 0
+    for core, windows in zip(simulation.cores, samples):
+        total_records = core.position
+        periods = max(1, math.ceil(total_records / sampling.period))
+        records = [window["records"] for window in windows]
+        measured_records += sum(records)
+        estimates = {
+            metric: _estimate([window[metric] for window in windows], records, total_records, periods, z)
+            for metric in METRICS
+        }
+        stats = {"core": core.id}
+        stats.update((metric, estimate["estimate"]) for metric, estimate in estimates.items())
+        stats["idle_cycles"] = stats["execution_cycles"] - stats["compute_cycles"]
+        cores.append(stats)
+        intervals.append({metric: [estimate["low"], estimate["high"]] for metric, estimate in estimates.items()})
+    results = {
+        "execution_cycles": max(core["execution_cycles"] for core in cores),
+        "cores": cores,
+    }
+    if simulation.bus is not None:
+        # only a lone core is sampled with a bus, and the bus is only used in its windows
+        bus = simulation.bus.stats()
+        scale = simulation.cores[0].position / measured_records if measured_records else 0.0
+        results["bus"] = {metric: round(bus[metric] * scale) for metric in BUS_METRICS}
+    results["sampling"] = {
+        "period": sampling.period,
+        "window": sampling.window,
+        "confidence": sampling.confidence,
+        "windows": [len(windows) for windows in samples],
+        "measured_records": measured_records,
+        "total_records": sum(core.position for core in simulation.cores),
+        "intervals": intervals,
+    }
+    return results
@@ -0,0 +1,271 @@
+"""
+Long-lived simulation server that keeps decoded traces in memory.
+
+    python server.py serve [--socket PATH] [--workers N] [--memory-mb MB]
+    python server.py run protocol input_file [cache_size associativity block_size] [--socket PATH]
+
+The server listens on a Unix socket for jobs, one JSON object per line:
+
+    {"input_file": "bodytrack", "protocol": "MESI", "cache_size": 4096,
+     "associativity": 2, "block_size": 32, "cache_engine": "default"}
+
+and answers each with one line, {"results": ...} as from Simulation.run(), or
+{"error": "..."}. {"command": "status"} reports what the trace store holds.
+
+Traces are decoded into shared memory on first use, as for sweeps, and kept
+in a store bounded by a memory budget; the least recently used traces that no
+running job needs are dropped to make room. Jobs run in a process pool that
+lives as long as the server, so a repeat query pays neither Python start-up
+nor parsing and starts simulating straight away. A trace is decoded again if
+its file changes.
+"""
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import threading
+from simulation import CACHE_ENGINES, print_results
+from sweep import SweepPoint, run_point
+from traces import SharedTrace, TraceSource, resolve_trace_sources
+
+LOGGER = logging.getLogger("coherence")
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser("~"), ".cache", "coherence", "server.sock")
+DEFAULT_MEMORY_BYTES = 1 << 30
+
+@dataclass
+class _StoredTrace:
+    trace: SharedTrace = None
+    shm: object = None
+    # jobs currently using the trace, which keep it from being dropped
+    users: int = 0
+    ready: threading.Event = field(default_factory=threading.Event)
+    error: Exception = None
+
+    @property
+    def size(self) -> int:
+        # 4 bytes of value and 1 of type per record
+        return 5 * self.trace.count if self.trace is not None else 0
+
+@dataclass
+class TraceStore:
+    """
+    Decoded traces in shared memory, least recently used first, bounded by
+    max_bytes (beyond which only traces in use are kept)
+    """
+    max_bytes: int = DEFAULT_MEMORY_BYTES
+    hits: int = 0
+    misses: int = 0
+
+    def __post_init__(self):
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, sources: list[TraceSource]) -> tuple[list, list[SharedTrace]]:
+        """
+        The decoded traces for `sources`, decoding those not held yet, and the
+        keys to give them back with release() once done
+        """
+        keys = [self._key(source) for source in sources]
+        traces = []
+        try:
+            for key, source in zip(keys, sources):
+                traces.append(self._acquire_one(key, source))
+        except Exception:
+            self.release(keys[:len(traces)])
+            raise
+        return keys, traces
+
+    def _acquire_one(self, key, source: TraceSource) -> SharedTrace:
+        with self._lock:
+            stored = self._traces.get(key)
+            decode = stored is None
+            if decode:
+                stored = self._traces[key] = _StoredTrace()
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._traces.move_to_end(key)
+            stored.users += 1
+        if decode:
+            # decoded outside the lock, so jobs on other traces are not held up
+            try:
+                stored.trace, stored.shm = SharedTrace.create(source)
+                LOGGER.info(f"Decoded {source.name}: {stored.trace.count} records")
+            except Exception as e:
+                stored.error = e
+                with self._lock:
+                    self._traces.pop(key, None)
+            stored.ready.set()
+            with self._lock:
+                self._evict()
+        stored.ready.wait()
+        if stored.error is not None:
+            with self._lock:
+                stored.users -= 1
+            raise stored.error
+        return stored.trace
+
+    def release(self, keys):
+        with self._lock:
+            for key in keys:
+                stored = self._traces.get(key)
+                if stored is not None:
+                    stored.users -= 1
+            self._evict()
+
+    def _evict(self):
+        # called with the lock held
+        total = sum(stored.size for stored in self._traces.values())
+        for key, stored in list(self._traces.items()):
+            if total <= self.max_bytes:
+                break
+            if stored.users or not stored.ready.is_set():
+                continue
+            del self._traces[key]
+            total -= stored.size
+            stored.shm.close()
+            stored.shm.unlink()
+            LOGGER.info(f"Dropped {stored.trace.name} from the trace store")
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "traces": [stored.trace.name for stored in self._traces.values() if stored.trace is not None],
+                "bytes": sum(stored.size for stored in self._traces.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def close(self):
+        with self._lock:
+            for stored in self._traces.values():
+                if stored.shm is not None:
+                    stored.shm.close()
+                    stored.shm.unlink()
+            self._traces.clear()
+
+    def _key(self, source: TraceSource):
+        # a changed file is a different trace
+        path = os.path.abspath(source.path)
+        stat = os.stat(path)
+        return (path, source.member, stat.st_size, stat.st_mtime_ns)
+
+def parse_job(job: dict) -> tuple[SweepPoint, str]:
+    point = SweepPoint(job["protocol"], int(job["cache_size"]), int(job["associativity"]), int(job["block_size"]))
+    if not point.is_valid():
+        raise ValueError(f"Invalid cache configuration {point}")
+    cache_engine = job.get("cache_engine", "default")
+    if cache_engine not in CACHE_ENGINES:
+        raise ValueError(f"Unknown cache engine {cache_engine}, expected one of {', '.join(CACHE_ENGINES)}")
+    return point, cache_engine
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.handle_job(json.loads(line))
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+class SimulationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves jobs on `socket_path` (see the module docstring), one thread per
+    connection, simulating them on `workers` processes
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, workers: int = None, max_bytes: int = DEFAULT_MEMORY_BYTES):
+        if os.path.exists(socket_path):
+            # left behind by a server that did not shut down cleanly
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        self.socket_path = socket_path
+        self.store = TraceStore(max_bytes)
+        # spawned rather than forked, as the server is multithreaded
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        super().__init__(socket_path, _Handler)
+
+    def handle_job(self, job: dict) -> dict:
+        if job.get("command") == "status":
+            return {"status": self.store.status()}
+        point, cache_engine = parse_job(job)
+        keys, traces = self.store.acquire(resolve_trace_sources(job["input_file"]))
+        try:
+            return {"results": self.executor.submit(run_point, point, traces, cache_engine).result()}
+        finally:
+            self.store.release(keys)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+        self.store.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+def request(socket_path: str, job: dict) -> dict:
+    """
+    Send one job to the server at `socket_path` and return its response
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(job).encode() + b"\n")
+            f.flush()
+            return json.loads(f.readline())
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the server until interrupted")
+    serve.add_argument("--socket", default=DEFAULT_SOCKET, metavar="PATH")
+    serve.add_argument("--workers", type=int, default=os.cpu_count())
+    serve.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_BYTES >> 20, help="budget for decoded traces")
+    run = commands.add_parser("run", help="simulate on a running server")
+    run.add_argument("protocol")
+    run.add_argument("input_file")
+    run.add_argument("cache_size", nargs="?", type=int, default=4096)
+    run.add_argument("associativity", nargs="?", type=int, default=2)
+    run.add_argument("block_size", nargs="?", type=int, default=32)
+    run.add_argument("--cache-engine", choices=list(CACHE_ENGINES), default="default")
+    run.add_argument("--socket", default=DEFAULT_SOCKET, metavar="PATH")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        with SimulationServer(args.socket, args.workers, args.memory_mb << 20) as server:
+            LOGGER.info(f"Listening on {args.socket}")
+            # stop cleanly on SIGTERM too, so shared memory and the socket are released
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return
+    response = request(args.socket, {
+        "input_file": os.path.abspath(args.input_file) if os.path.exists(args.input_file) else args.input_file,
+        "protocol": args.protocol,
+        "cache_size": args.cache_size,
+        "associativity": args.associativity,
+        "block_size": args.block_size,
+        "cache_engine": args.cache_engine,
+    })
+    if "error" in response:
+        raise SystemExit(response["error"])
+    print_results(response["results"])
+
+if __name__ == "__main__":
+    main()
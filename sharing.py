@@ -0,0 +1,181 @@
+"""
+Private versus shared access classification.
+
+An access is shared if, once it completes, some other cache also holds the
+block, and private otherwise. Answering that by probing every other cache on
+each access would cost O(cores) per access; instead SharerIndex keeps one
+bitmask per block (bit i set while cache i holds it), updated on fills and
+evictions only, the same events a coherence Directory follows. Blocks are
+remapped to dense ids the first time they are filled, so the masks live in a
+single array of the narrowest integer type that fits a bit per core.
+
+SharingClassifier.attach wraps each cache's read_block/write_block, as
+tracing does, so a run without classification pays nothing. Counts are kept per core and
+per address region (region_bytes of address space each).
+
+With a protocol, the caches follow it; without one the caches are private
+and never invalidate each other, which makes for a cheap pre-pass to
+characterise how much a multi-core trace shares:
+
+    python sharing.py input_file [cache_size associativity block_size] [--region-bytes N] [--top N]
+"""
+from array import array
+from dataclasses import dataclass, field
+import argparse
+import logging
+import math
+from cache import add_observer
+
+LOGGER = logging.getLogger("coherence")
+
+DEFAULT_REGION_BYTES = 4096
+
+# narrowest array type codes by the number of caches their bits cover
+MASK_TYPES = ((8, "B"), (16, "H"), (32, "I"), (64, "Q"))
+
+@dataclass
+class SharerIndex:
+    """
+    Bitmask of the caches holding each block, over dense block ids
+    """
+    cache_count: int
+    # block address -> dense id, in order of first fill
+    ids: dict[int, int] = field(default_factory=dict)
+    masks: array = field(init=False, repr=False)
+
+    def __post_init__(self):
+        for bits, typecode in MASK_TYPES:
+            if self.cache_count <= bits:
+                self.masks = array(typecode)
+                break
+        else:
+            raise ValueError(f"A sharer index covers at most {MASK_TYPES[-1][0]} caches")
+
+    def filled(self, cache_id: int, block: int):
+        block_id = self.ids.get(block)
+        if block_id is None:
+            block_id = self.ids[block] = len(self.masks)
+            self.masks.append(0)
+        self.masks[block_id] |= 1 << cache_id
+
+    def evicted(self, cache_id: int, block: int):
+        block_id = self.ids.get(block)
+        if block_id is not None:
+            self.masks[block_id] &= ~(1 << cache_id)
+
+    def sharer_mask(self, block: int) -> int:
+        block_id = self.ids.get(block)
+        return 0 if block_id is None else self.masks[block_id]
+
+    def rebuild(self, caches):
+        """
+        Refill the index from the caches' contents
+        """
+        self.ids.clear()
+        del self.masks[:]
+        for cache in caches:
+            for block in cache.blocks():
+                self.filled(cache.id, block)
+
+@dataclass
+class SharingClassifier:
+    region_bytes: int = DEFAULT_REGION_BYTES
+    index: SharerIndex = field(init=False, default=None)
+    # per cache, [private, shared] access counts
+    counts: list = field(init=False, default_factory=list)
+    # region number (address // region_bytes) -> [private, shared] access counts
+    regions: dict = field(init=False, default_factory=dict)
+
+    def __post_init__(self):
+        if self.region_bytes <= 0 or self.region_bytes & (self.region_bytes - 1):
+            raise ValueError("Region size must be a power of two")
+
+    def attach(self, caches):
+        """
+        Classify every access of `caches`, which must share one geometry
+        """
+        if self.region_bytes < caches[0].block_size_bytes:
+            raise ValueError("Regions cannot be smaller than a block")
+        self.index = SharerIndex(len(caches))
+        self.counts = [[0, 0] for _ in caches]
+        self.regions = {}
+        for cache in caches:
+            add_observer(cache, self.index)
+            self._wrap(cache)
+        self.index.rebuild(caches)
+
+    def _wrap(self, cache):
+        masks, ids, counts, regions = self.index.masks, self.index.ids, self.counts[cache.id], self.regions
+        others = ~(1 << cache.id)
+        m_set = cache.m_set
+        region_shift = int(math.log2(self.region_bytes)) - cache.n_block
+        read_block, write_block, record_hits = cache.read_block, cache.write_block, cache.record_hits
+        # whether the cache's last access was shared, and its region's counts, for hits collapsed by coalescing
+        last = [0, None]
+
+        def classified(block_access):
+            def access(set_ind: int, tag: int):
+                block_access(set_ind, tag)
+                block = (tag << m_set) | set_ind
+                shared = 1 if masks[ids[block]] & others else 0
+                counts[shared] += 1
+                region = regions.get(block >> region_shift)
+                if region is None:
+                    region = regions[block >> region_shift] = [0, 0]
+                region[shared] += 1
+                last[0] = shared
+                last[1] = region
+            return access
+
+        def hits(count: int):
+            record_hits(count)
+            counts[last[0]] += count
+            last[1][last[0]] += count
+
+        cache.read_block = classified(read_block)
+        cache.write_block = classified(write_block)
+        cache.record_hits = hits
+
+    def results(self) -> dict:
+        return {
+            "cores": [
+                {"core": i, "private_accesses": private, "shared_accesses": shared}
+                for i, (private, shared) in enumerate(self.counts)
+            ],
+            "region_bytes": self.region_bytes,
+            # [first address, private accesses, shared accesses], by address
+            "regions": [[region * self.region_bytes, *counts] for region, counts in sorted(self.regions.items())],
+        }
+
+def main(argv=None):
+    # imported here, as simulation.py imports this module
+    from simulation import Simulation
+    from constants import WORD_SIZE_BITS
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="sharing")
+    parser.add_argument("input_file")
+    parser.add_argument("cache_size", nargs="?", type=int, default=4096)
+    parser.add_argument("associativity", nargs="?", type=int, default=2)
+    parser.add_argument("block_size", nargs="?", type=int, default=32)
+    parser.add_argument("--protocol", help="follow a coherence protocol instead of private caches")
+    parser.add_argument("--region-bytes", type=int, default=DEFAULT_REGION_BYTES)
+    parser.add_argument("--top", type=int, default=10, metavar="N", help="regions with the most shared accesses to list")
+    args = parser.parse_args(argv)
+
+    classifier = SharingClassifier(args.region_bytes)
+    Simulation(
+        args.input_file, args.cache_size, args.associativity, args.block_size, WORD_SIZE_BITS,
+        protocol=args.protocol, sharing=classifier,
+    ).run()
+    results = classifier.results()
+    for core in results["cores"]:
+        total = core["private_accesses"] + core["shared_accesses"]
+        share = core["shared_accesses"] / total if total else 0.0
+        print(f"Core: {core['core']}: {core['private_accesses']} private, {core['shared_accesses']} shared accesses ({share:.2%} shared)")
+    print(f"Regions of {args.region_bytes} bytes with the most shared accesses:")
+    for start, private, shared in sorted(results["regions"], key=lambda region: -region[2])[:args.top]:
+        if shared:
+            print(f"0x{start:08x}: {private} private, {shared} shared")
+
+if __name__ == "__main__":
+    main()
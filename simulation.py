@@ -1,14 +1,49 @@
+from contextlib import ExitStack
 from dataclasses import dataclass, field
+from block_ids import load_dense_trace
+from bus import Bus
 from core import Core
 from cache import Cache
-from instruction import (
-    Instruction,
-    InstructionType
+from coherent_cache import CoherentCache
+from compact_cache import CompactCache
+from dense_cache import DenseCache
+from directory import Directory
+from partition import run_partitioned
+from pdes import run_parallel
+from preprocess import coalesce_chunks
+from profiling import attach_profiler
+from protocols import get_protocol
+from sampling import sample_core, sampled_results
+from sharing import SharingClassifier
+from tracing import attach_tracer
+from traces import (
+    BACKGROUND_MODES,
+    READ_AHEAD_BYTES,
+    SharedTrace,
+    TraceSource,
+    background_chunks,
+    file_digest,
+    load_trace,
+    resolve_trace_sources,
 )
+import heapq
 import logging
+import math
+import os
+import pickle
+import zlib
 
 LOGGER = logging.getLogger("coherence")
 
+CHECKPOINT_MAGIC = b"CCSNAP01"
+
+CACHE_ENGINES = {
+    "default": Cache,
+    "compact": CompactCache,
+    # replays a copy of the trace with dense block ids for addresses, see block_ids.py
+    "dense": DenseCache,
+}
+
 @dataclass
 class Simulation:
     input_file: str
@@ -16,15 +51,130 @@ class Simulation:
     associativity: int
     block_size_bytes: int
     word_size_bits: int
-    core: Core = field(init=False)
+    # replay a memory-mapped binary copy of the trace instead of parsing the text
+    use_binary_trace: bool = True
+    # records handed to Core.execute_many at a time when replaying a binary trace
+    chunk_size: int = 1 << 16
+    # bytes of read-ahead per streamed trace (e.g. a zip member)
+    buffer_size: int = READ_AHEAD_BYTES
+    # read and parse streamed traces in a background "thread" or "process"; None reads them inline
+    background_decode: str = None
+    # cache storage, one of CACHE_ENGINES
+    cache_engine: str = "default"
+    # coherence protocol between the cores' caches, a name in protocols.PROTOCOLS;
+    # None simulates private caches that never interact
+    protocol: str = None
+    # bound on exact coherence directory entries, None for unbounded (see directory.py)
+    directory_entries: int = None
+    # receives every cache access (see tracing.py); None disables tracing
+    tracer: object = None
+    # a sharing.SharingClassifier to count private and shared accesses; None disables it
+    sharing: SharingClassifier = None
+    # a hotspots.HotspotProfiler to find the blocks behind misses and coherence traffic; None disables it
+    hotspots: object = None
+    # shrink the instruction stream with preprocess.coalesce_chunks
+    coalesce: bool = False
+    # write a snapshot to checkpoint_path every checkpoint_interval instructions
+    checkpoint_path: str = None
+    checkpoint_interval: int = 10_000_000
+    # a profiling.PhaseTimer to time each phase of the run into; None disables profiling
+    profiler: object = None
+    # an interval_stats.IntervalStats to stream per-interval statistics to
+    interval_stats: object = None
+    # a sampling.Sampling to estimate results from periodic windows; None simulates everything
+    sampling: object = None
+    # worker processes to split each cache's sets between (see partition.py); None runs serially
+    set_partitions: int = None
+    # run every core in a worker process of its own (see pdes.py)
+    parallel_cores: bool = False
+    trace_sources: list[TraceSource] = field(init=False)
+    cores: list[Core] = field(init=False)
+    bus: Bus = field(init=False)
+    # set when interval_stats.stop_when ended the last run before the end of the trace
+    stopped_early: bool = field(init=False, default=False)
 
     def __post_init__(self):
-        cache = Cache(0, self.cache_size, self.associativity, self.block_size_bytes)
-        self.core = Core(0, cache)
-
-    def _parse_line(self, line) -> Instruction:
-        line_list = line.split()
-        return Instruction(InstructionType(line_list[0]), int(line_list[1], 16))
+        # one core, with its own cache, per trace
+        if isinstance(self.input_file, str):
+            self.trace_sources = resolve_trace_sources(self.input_file)
+        else:
+            # already resolved, e.g. traces decoded into shared memory by a sweep
+            self.trace_sources = list(self.input_file)
+        if self.background_decode is not None and self.background_decode not in BACKGROUND_MODES:
+            raise ValueError(f"Unknown background mode {self.background_decode}, expected one of {', '.join(BACKGROUND_MODES)}")
+        if self.cache_engine not in CACHE_ENGINES:
+            raise ValueError(f"Unknown cache engine {self.cache_engine}, expected one of {', '.join(CACHE_ENGINES)}")
+        if self.protocol is None:
+            cache_type = CACHE_ENGINES[self.cache_engine]
+            caches = [
+                cache_type(i, self.cache_size, self.associativity, self.block_size_bytes)
+                for i in range(len(self.trace_sources))
+            ]
+            self.bus = None
+        else:
+            if self.cache_engine != "default":
+                raise ValueError(f"Cache engine {self.cache_engine} does not support coherence protocols")
+            protocol = get_protocol(self.protocol)
+            caches = [
+                CoherentCache(i, self.cache_size, self.associativity, self.block_size_bytes, protocol)
+                for i in range(len(self.trace_sources))
+            ]
+            self.bus = Bus(protocol, self.block_size_bytes, self.word_size_bits)
+            self.bus.connect(caches, Directory(len(caches), self.directory_entries))
+        self.cores = [Core(i, cache) for i, cache in enumerate(caches)]
+        if self.cache_engine == "dense" and (self.tracer is not None or self.sharing is not None):
+            raise ValueError("Tracing and sharing classification need tags, which the dense engine's accesses do not carry")
+        if self.tracer is not None:
+            for core in self.cores:
+                attach_tracer(core.cache, self.tracer)
+        if self.sharing is not None:
+            if self.checkpoint_path:
+                raise ValueError("Sharing classification cannot be combined with checkpoints")
+            self.sharing.attach([core.cache for core in self.cores])
+        if self.hotspots is not None:
+            if self.checkpoint_path or self.sampling is not None:
+                # a snapshot does not hold the sketches, and warming would count as misses
+                raise ValueError("Hotspot profiling cannot be combined with checkpoints or sampling")
+            self.hotspots.attach([core.cache for core in self.cores], self.bus)
+        if self.profiler is not None:
+            for core in self.cores:
+                attach_profiler(core.cache, self.profiler)
+            if self.bus is not None:
+                self.bus.transact = self.profiler.timed("bus", self.bus.transact)
+        # where each core's trace starts, set when resuming from a checkpoint
+        self._start_positions = [0] * len(self.cores)
+        if self.sampling is not None:
+            if self.bus is not None and len(self.cores) > 1:
+                raise ValueError("Sampling needs private caches, so cannot be combined with a protocol on several cores")
+            if self.checkpoint_path or self.interval_stats is not None:
+                raise ValueError("Sampling cannot be combined with checkpoints or interval statistics")
+        self._samples = None
+        # content digests of the trace files, taken the first time a checkpoint needs them
+        self._trace_digests = None
+        if self.set_partitions is not None:
+            if self.set_partitions < 1:
+                raise ValueError("Set partitions must be positive")
+            if self.bus is not None and len(self.cores) > 1:
+                raise ValueError("Set partitioning needs private caches, so cannot be combined with a protocol on several cores")
+            instruments = (self.tracer, self.sharing, self.hotspots, self.profiler, self.interval_stats, self.sampling)
+            if any(option is not None for option in instruments):
+                raise ValueError(
+                    "Set partitioning cannot be combined with tracing, sharing classification, hotspot profiling, "
+                    "profiling, interval statistics or sampling"
+                )
+            if self.checkpoint_path:
+                raise ValueError("Set partitioning cannot be combined with checkpoints")
+            if self.cache_engine == "dense":
+                raise ValueError("Set partitioning needs addresses, which the dense engine's trace does not carry")
+        if self.parallel_cores:
+            instruments = (self.tracer, self.sharing, self.hotspots, self.profiler, self.interval_stats, self.sampling)
+            if any(option is not None for option in instruments) or self.checkpoint_path:
+                raise ValueError(
+                    "Parallel cores cannot be combined with tracing, sharing classification, hotspot profiling, "
+                    "profiling, interval statistics, sampling or checkpoints"
+                )
+            if self.set_partitions is not None:
+                raise ValueError("Parallel cores cannot be combined with set partitioning")
 
     def simulate(self):
         """
@@ -45,9 +195,260 @@ class Simulation:
         8. Distribution of accesses to private data versus shared data (for example,
         access to modified state is private, while access to shared state is shared data)
         """
-        with open(self.input_file) as f:
-            for line in f:
-                instr: Instruction = self._parse_line(line)
-                self.core.execute_instr(instr)
-            LOGGER.info("All instructions executed.")             
-            self.core.print_final_outputs()
+        results = self.run()
+        print_results(results)
+        return results
+
+    def run(self) -> dict:
+        """
+        Simulate the whole trace without printing, returning results()
+        """
+        if self.set_partitions is not None:
+            run_partitioned(self)
+            LOGGER.info("All instructions executed.")
+            return self.results()
+        if self.parallel_cores:
+            run_parallel(self)
+            LOGGER.info("All instructions executed.")
+            return self.results()
+        open_chunks = self._chunks
+        if self.profiler is not None:
+            # opening a trace may convert it to binary, which counts as parsing too
+            open_chunks = self.profiler.timed("parse", self._chunks)
+        with ExitStack() as stack:
+            for core, source, position in zip(self.cores, self.trace_sources, self._start_positions):
+                chunks = open_chunks(source, stack, core.cache)
+                if self.profiler is not None:
+                    chunks = self.profiler.timed_chunks(chunks)
+                if self.coalesce:
+                    chunks = self._coalesce(chunks, self._collapses_runs())
+                if position:
+                    chunks = _skip_records(chunks, position)
+                core.attach(chunks, position)
+            self._run()
+            if self.stopped_early:
+                for core in self.cores:
+                    core.detach()
+        if self.stopped_early:
+            LOGGER.info("Run stopped early by its interval statistics.")
+        else:
+            LOGGER.info("All instructions executed.")
+        return self.results()
+
+    def _chunks(self, source, stack: ExitStack, cache: Cache = None):
+        if self.cache_engine == "dense":
+            trace = stack.enter_context(load_dense_trace(source, self.block_size_bytes, lambda: self._trace_chunks(source, stack)))
+            cache.bind_blocks(trace.blocks)
+            return self._slices(trace.types, trace.values)
+        return self._trace_chunks(source, stack)
+
+    def _trace_chunks(self, source, stack: ExitStack):
+        if isinstance(source, SharedTrace):
+            types, values = stack.enter_context(source.attach())
+            return self._slices(types, values)
+        if isinstance(source, TraceSource) and source.member is None and self.use_binary_trace:
+            trace = stack.enter_context(load_trace(source.path))
+            return self._slices(trace.types, trace.values)
+        # archive members (and generated traces) are streamed rather than converted
+        if self.background_decode is not None:
+            chunks = background_chunks(source, self.chunk_size, self.buffer_size, self.background_decode)
+            # stops the reader if the run ends before the trace does
+            stack.callback(chunks.close)
+            return chunks
+        return source.chunks(self.chunk_size, self.buffer_size)
+
+    def _collapses_runs(self) -> bool:
+        # same-block runs can only be collapsed when no other core can intervene and no
+        # protocol turns each access into its own bus transactions
+        return len(self.cores) == 1 and self.bus is None
+
+    def _coalesce(self, chunks, collapse_runs: bool):
+        # a dense trace's accesses carry block ids, so every value is a block of its own
+        block_size_bytes = 1 if self.cache_engine == "dense" else self.block_size_bytes
+        return coalesce_chunks(chunks, block_size_bytes, collapse_runs, self.chunk_size)
+
+    def _slices(self, types, values):
+        return (
+            (types[start:start + self.chunk_size], values[start:start + self.chunk_size])
+            for start in range(0, len(types), self.chunk_size)
+        )
+
+    def _run(self):
+        """
+        Event-driven schedule over the cores. The heap holds (next ready cycle,
+        core id) for every core that still has instructions; the earliest core
+        runs until it passes the next core's ready cycle, so simulated time
+        jumps from event to event instead of being ticked.
+        """
+        if self.sampling is not None:
+            # the cores do not interact, so each can be sampled on its own
+            self._samples = [sample_core(core, self.sampling) for core in self.cores]
+            return
+        heap = [(core.execution_cycles, core.id) for core in self.cores]
+        heapq.heapify(heap)
+        next_checkpoint = self._executed() + self.checkpoint_interval if self.checkpoint_path else math.inf
+        stats = self.interval_stats
+        self.stopped_early = False
+        if stats is not None:
+            stats.begin(self, heap[0][0] if heap else 0)
+        try:
+            while heap:
+                _, core_id = heapq.heappop(heap)
+                core = self.cores[core_id]
+                limit_cycle, limit_id = heap[0] if heap else (math.inf, 0)
+                # stop at the next checkpoint or interval boundary, so that even
+                # a lone core gets there on time
+                max_records = math.inf
+                if self.checkpoint_path:
+                    max_records = max(1, next_checkpoint - self._executed())
+                if stats is not None:
+                    if stats.unit == "instructions":
+                        max_records = min(max_records, max(1, stats.next_at - self._executed()))
+                    elif stats.next_at <= limit_cycle:
+                        limit_cycle, limit_id = stats.next_at, len(self.cores)
+                if core.run_until(limit_cycle, limit_id, max_records):
+                    heapq.heappush(heap, (core.execution_cycles, core_id))
+                if self.checkpoint_path and self._executed() >= next_checkpoint:
+                    # between two scheduling steps every core is at a consistent point
+                    self.save_checkpoint(self.checkpoint_path)
+                    next_checkpoint = self._executed() + self.checkpoint_interval
+                if stats is not None and heap and stats.due(self._executed(), heap[0][0]):
+                    if stats.emit(self, heap[0][0]):
+                        self.stopped_early = True
+                        return
+            if stats is not None:
+                stats.emit(self, max(core.execution_cycles for core in self.cores), final=True)
+        finally:
+            if stats is not None:
+                stats.close()
+
+    def _executed(self) -> int:
+        return sum(core.position for core in self.cores)
+
+    def _config(self) -> dict:
+        # everything a checkpoint's contents depend on
+        if self._trace_digests is None:
+            # traces without a file of their own are known by name only
+            self._trace_digests = [
+                file_digest(source.path) if isinstance(source, TraceSource) else None for source in self.trace_sources
+            ]
+        return {
+            "traces": [source.name for source in self.trace_sources],
+            "trace_digests": self._trace_digests,
+            "cache_size": self.cache_size,
+            "associativity": self.associativity,
+            "block_size_bytes": self.block_size_bytes,
+            "cache_engine": self.cache_engine,
+            "protocol": self.protocol,
+            "coalesce": self.coalesce,
+        }
+
+    def save_checkpoint(self, path: str):
+        """
+        Write the complete simulation state (trace positions, cache contents
+        with LRU order and dirty bits, all counters) to `path`. The snapshot
+        is written to a temporary file and renamed, so a crash while saving
+        leaves the previous snapshot intact.
+        """
+        state = {
+            "config": self._config(),
+            "cores": [core.get_state() for core in self.cores],
+            "bus": self.bus.get_state() if self.bus is not None else None,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(CHECKPOINT_MAGIC)
+            f.write(zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)))
+        os.replace(tmp_path, path)
+        LOGGER.info(f"Checkpoint written to {path} at {self._executed()} instructions")
+
+    def load_checkpoint(self, path: str, reset_stats: bool = False):
+        """
+        Restore the state saved by save_checkpoint, so that run() carries on
+        from that point with identical results. With reset_stats the warmed
+        caches are kept but counting starts afresh, e.g. to fork several
+        measurement runs from one warm-up.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(CHECKPOINT_MAGIC):
+            raise ValueError(f"{path} is not a simulation checkpoint")
+        state = pickle.loads(zlib.decompress(data[len(CHECKPOINT_MAGIC):]))
+        if state["config"] != self._config():
+            raise ValueError(f"Checkpoint {path} was taken with a different configuration: {state['config']}")
+        if self.hotspots is not None and not reset_stats:
+            raise ValueError("Hotspot profiling cannot resume from a checkpoint, only start afresh from one with reset_stats")
+        for core, core_state in zip(self.cores, state["cores"]):
+            core.set_state(core_state)
+            if reset_stats:
+                core.reset_stats()
+        if self.bus is not None:
+            self.bus.set_state(state["bus"])
+            if reset_stats:
+                self.bus.reset_stats()
+        self._start_positions = [core_state["position"] for core_state in state["cores"]]
+
+    def results(self) -> dict:
+        """
+        Per-core statistics, plus the overall execution cycles (the maximum
+        across cores).
+        """
+        if self._samples is not None:
+            return sampled_results(self, self._samples)
+        cores = [core.stats() for core in self.cores]
+        results = {
+            "execution_cycles": max(core["execution_cycles"] for core in cores),
+            "cores": cores,
+        }
+        if self.bus is not None:
+            results["bus"] = self.bus.stats()
+        if self.sharing is not None:
+            results["sharing"] = self.sharing.results()
+        return results
+
+def print_results(results: dict):
+    """
+    Print results() as Simulation.simulate does, e.g. for results read back
+    from a result_cache.ResultCache
+    """
+    for core in results["cores"]:
+        prefix = f"Core: {core['core']}: "
+        print(prefix + f"{core['execution_cycles']} Execution cycles")
+        print(prefix + f"{core['compute_cycles']} Compute cycles")
+        print(prefix + f"{core['load_store_instrs']} load/store instructions")
+        print(prefix + f"{core['idle_cycles']} idle cycles")
+        print(prefix + f"{core['cache_hits']} cache hits")
+        print(prefix + f"{core['cache_misses']} cache misses")
+    print(f"{results['execution_cycles']} Overall execution cycles")
+    if "bus" in results:
+        print(f"{results['bus']['data_traffic_bytes']} Bytes of data traffic on the bus")
+        print(f"{results['bus']['invalidations']} Invalidations on the bus")
+        print(f"{results['bus']['updates']} Updates on the bus")
+    if "sharing" in results:
+        for core in results["sharing"]["cores"]:
+            prefix = f"Core: {core['core']}: "
+            print(prefix + f"{core['private_accesses']} accesses to private data")
+            print(prefix + f"{core['shared_accesses']} accesses to shared data")
+    if "sampling" in results:
+        sampling = results["sampling"]
+        print(
+            f"Estimated from {sampling['measured_records']} of {sampling['total_records']} records, "
+            f"{sampling['confidence']:.0%} confidence intervals:"
+        )
+        for core, intervals in zip(results["cores"], sampling["intervals"]):
+            for metric, (low, high) in intervals.items():
+                print(f"Core: {core['core']}: {metric} {low} - {high}")
+
+def _skip_records(chunks, count: int):
+    """
+    Drop the first `count` records of a chunk stream
+    """
+    for chunk in chunks:
+        n = len(chunk[0])
+        if count >= n:
+            count -= n
+            continue
+        if count:
+            chunk = tuple(column[count:] for column in chunk)
+            count = 0
+        yield chunk
@@ -0,0 +1,190 @@
+"""
+Hit/miss curves for every cache size from one pass over a trace.
+
+For an LRU set, an access hits in a cache of associativity A exactly when fewer
+than A other blocks of the same set have been used since the block was last
+used (its stack distance). So one histogram of per-set stack distances gives
+the hits of Cache/LRUEvictionHandler for every associativity at that set count,
+and keeping one histogram per set count (power of two) gives every cache size
+at a fixed associativity and block size.
+
+Distances are counted with a Fenwick tree per set over that set's access times,
+where a time is marked while it is the latest use of some block. The tree is
+compacted when its time axis fills up, so memory stays proportional to the
+number of distinct blocks rather than the length of the trace.
+
+Only hits and misses are derived; dirty write-backs depend on more than the
+stack distance and still need a full simulation.
+
+    python stack_distance.py input_file [--associativity 2] [--block-size 32]
+        [--cache-sizes 1024:1048576]
+"""
+import argparse
+from dataclasses import dataclass, field
+import math
+from instruction import OTHER
+from sweep import SweepPoint, parse_values
+from traces import load_trace, resolve_trace_sources
+
+MIN_FENWICK_CAPACITY = 16
+
+@dataclass
+class SetStack:
+    """
+    LRU stack distances for the accesses to one cache set
+    """
+    time: int = 0
+    last_use: dict[int, int] = field(default_factory=dict)
+    tree: list[int] = field(default_factory=lambda: [0] * (MIN_FENWICK_CAPACITY + 1))
+
+    def _add(self, i: int, delta: int):
+        tree = self.tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i: int) -> int:
+        # number of marked times in [0, i)
+        tree = self.tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _compact(self):
+        # renumber the live times 0..n-1, in the same order, into a tree with room to grow
+        blocks = sorted(self.last_use, key=self.last_use.__getitem__)
+        self.last_use = {block: i for i, block in enumerate(blocks)}
+        self.time = len(blocks)
+        capacity = max(MIN_FENWICK_CAPACITY, 2 * len(blocks))
+        tree = [1] * (self.time + 1) + [0] * (capacity - self.time)
+        tree[0] = 0
+        for i in range(1, capacity + 1):
+            parent = i + (i & -i)
+            if parent <= capacity:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def use(self, block: int) -> int:
+        """
+        Record an access to `block`, returning its stack distance, or -1 if it
+        has not been used before.
+        """
+        if self.time == len(self.tree) - 1:
+            self._compact()
+        time = self.time
+        prev = self.last_use.get(block)
+        if prev is None:
+            distance = -1
+        else:
+            distance = self._prefix(time) - self._prefix(prev + 1)
+            self._add(prev, -1)
+        self._add(time, 1)
+        self.last_use[block] = time
+        self.time = time + 1
+        return distance
+
+@dataclass
+class StackDistanceProfile:
+    """
+    Stack distance histograms for every power-of-two set count from min_sets
+    to max_sets. histograms[sets][d] counts accesses with stack distance d, for
+    d < max_distance; the last bucket counts longer distances and first uses.
+    """
+    block_size_bytes: int
+    min_sets: int
+    max_sets: int
+    max_distance: int = 64
+    accesses: int = 0
+    histograms: dict[int, list[int]] = field(init=False)
+
+    def __post_init__(self):
+        self.n_block = int(math.log(self.block_size_bytes, 2))
+        self.set_counts = []
+        sets = self.min_sets
+        while sets <= self.max_sets:
+            self.set_counts.append(sets)
+            sets *= 2
+        self.histograms = {sets: [0] * (self.max_distance + 1) for sets in self.set_counts}
+        self._stacks = {sets: [SetStack() for _ in range(sets)] for sets in self.set_counts}
+
+    def access(self, mem_addr: int):
+        block = mem_addr >> self.n_block
+        max_distance = self.max_distance
+        for sets in self.set_counts:
+            distance = self._stacks[sets][block & (sets - 1)].use(block)
+            histogram = self.histograms[sets]
+            histogram[distance if 0 <= distance < max_distance else max_distance] += 1
+        self.accesses += 1
+
+    def access_trace(self, types, values):
+        access = self.access
+        for type_code, value in zip(types, values):
+            if type_code != OTHER:
+                access(value)
+
+    def hits(self, sets: int, associativity: int) -> int:
+        if associativity > self.max_distance:
+            raise ValueError(f"Associativity {associativity} is above max_distance {self.max_distance}")
+        return sum(self.histograms[sets][:associativity])
+
+    def curve(self, associativity: int) -> list[dict]:
+        """
+        Hits and misses of every profiled cache size at this associativity
+        """
+        rows = []
+        for sets in self.set_counts:
+            hits = self.hits(sets, associativity)
+            rows.append({
+                "cache_size": sets * associativity * self.block_size_bytes,
+                "sets": sets,
+                "associativity": associativity,
+                "block_size": self.block_size_bytes,
+                "cache_hits": hits,
+                "cache_misses": self.accesses - hits,
+            })
+        return rows
+
+def profile_for_sizes(cache_sizes: list[int], associativity: int, block_size_bytes: int) -> StackDistanceProfile:
+    invalid = [size for size in cache_sizes if not SweepPoint(None, size, associativity, block_size_bytes).is_valid()]
+    if invalid or not cache_sizes:
+        raise ValueError(
+            f"Cache sizes must be a power-of-two number of sets of {associativity} x {block_size_bytes} bytes, got {invalid or 'none'}"
+        )
+    set_counts = [size // (associativity * block_size_bytes) for size in cache_sizes]
+    return StackDistanceProfile(
+        block_size_bytes, min(set_counts), max(set_counts), max_distance=max(associativity, 64),
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="stack_distance")
+    parser.add_argument("input_file")
+    parser.add_argument("--associativity", type=int, default=2)
+    parser.add_argument("--block-size", type=int, default=32)
+    parser.add_argument("--cache-sizes", default="1024:1048576")
+    args = parser.parse_args(argv)
+
+    # as in a sweep, sizes that make no valid cache at this associativity and block size are skipped
+    cache_sizes = [
+        size for size in parse_values(args.cache_sizes)
+        if SweepPoint(None, size, args.associativity, args.block_size).is_valid()
+    ]
+    if not cache_sizes:
+        parser.error("No valid cache size for this associativity and block size")
+    print("core,cache_size,sets,associativity,block_size,cache_hits,cache_misses")
+    for core, source in enumerate(resolve_trace_sources(args.input_file)):
+        profile = profile_for_sizes(cache_sizes, args.associativity, args.block_size)
+        if source.member is None:
+            with load_trace(source.path) as trace:
+                profile.access_trace(trace.types, trace.values)
+        else:
+            for types, values in source.chunks(1 << 16):
+                profile.access_trace(types, values)
+        for row in profile.curve(args.associativity):
+            print(f"{core},{row['cache_size']},{row['sets']},{row['associativity']},{row['block_size']},"
+                  f"{row['cache_hits']},{row['cache_misses']}")
+
+if __name__ == "__main__":
+    main()
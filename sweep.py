@@ -0,0 +1,166 @@
+"""
+Parameter sweeps over cache configurations for one trace.
+
+    python sweep.py input_file [--protocols MESI,Dragon] [--cache-sizes 1024:65536]
+        [--associativities 1,2,4] [--block-sizes 16,32] [--workers N]
+        [--result-cache [DIR]] [--output results.csv]
+
+Each list is either comma separated values or lo:hi, meaning every power of two
+from lo to hi. The trace is decoded once into shared memory, configurations are
+simulated in a process pool, and the results are written as a single CSV or
+JSON table (chosen by the output file's extension).
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+from constants import WORD_SIZE_BITS
+from result_cache import DEFAULT_RESULT_CACHE_DIR, ResultCache
+from simulation import Simulation, CACHE_ENGINES
+from traces import SharedTrace, resolve_trace_sources
+
+LOGGER = logging.getLogger("coherence")
+
+@dataclass(frozen=True)
+class SweepPoint:
+    protocol: str
+    cache_size: int
+    associativity: int
+    block_size: int
+
+    def is_valid(self) -> bool:
+        set_count, remainder = divmod(self.cache_size, self.block_size * self.associativity)
+        return remainder == 0 and set_count > 0 and set_count & (set_count - 1) == 0 \
+            and self.block_size & (self.block_size - 1) == 0
+
+def parse_values(spec: str) -> list[int]:
+    """
+    "16,32,64" -> [16, 32, 64]; "1024:8192" -> [1024, 2048, 4096, 8192]
+    """
+    if ":" in spec:
+        lo, hi = (int(v) for v in spec.split(":"))
+        if lo <= 0 or lo & (lo - 1):
+            raise ValueError(f"Range start {lo} is not a power of two")
+        values = []
+        while lo <= hi:
+            values.append(lo)
+            lo *= 2
+        return values
+    return [int(v) for v in spec.split(",")]
+
+def sweep_points(protocols, cache_sizes, associativities, block_sizes) -> list[SweepPoint]:
+    points = [SweepPoint(*p) for p in itertools.product(protocols, cache_sizes, associativities, block_sizes)]
+    return [point for point in points if point.is_valid()]
+
+def run_point(point: SweepPoint, traces: list[SharedTrace], cache_engine: str = "default") -> dict:
+    simulation = Simulation(
+        traces, point.cache_size, point.associativity, point.block_size, WORD_SIZE_BITS,
+        cache_engine=cache_engine, protocol=point.protocol,
+    )
+    return simulation.run()
+
+def point_row(point: SweepPoint, results: dict) -> dict:
+    row = asdict(point)
+    row["execution_cycles"] = results["execution_cycles"]
+    for key in ("cache_hits", "cache_misses", "idle_cycles"):
+        row[key] = sum(core[key] for core in results["cores"])
+    for key in ("data_traffic_bytes", "invalidations", "updates"):
+        row[key] = results["bus"][key]
+    row["cores"] = results["cores"]
+    return row
+
+def run_sweep(input_file: str, points: list[SweepPoint], workers: int = None, cache_engine: str = "default",
+              result_cache: ResultCache = None) -> list[dict]:
+    """
+    Simulate every point against `input_file`, returning one result row per
+    point in the order given. With a result_cache, points simulated before
+    are read from it and only the rest are run.
+    """
+    sources = resolve_trace_sources(input_file)
+    results = [None] * len(points)
+    keys = []
+    if result_cache is not None:
+        for i, point in enumerate(points):
+            keys.append(result_cache.key(
+                sources, point.protocol, point.cache_size, point.associativity, point.block_size, WORD_SIZE_BITS,
+            ))
+            results[i] = result_cache.get(keys[i])
+        LOGGER.info(f"{result_cache.hits} of {len(points)} configurations found in the result cache")
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    traces = []
+    blocks = []
+    try:
+        if pending:
+            for source in sources:
+                trace, shm = SharedTrace.create(source)
+                traces.append(trace)
+                blocks.append(shm)
+            LOGGER.info(f"Decoded {sum(t.count for t in traces)} records into shared memory, running {len(pending)} configurations")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {i: executor.submit(run_point, points[i], traces, cache_engine) for i in pending}
+                for i, future in futures.items():
+                    results[i] = future.result()
+                    if result_cache is not None:
+                        result_cache.put(keys[i], results[i])
+        return [point_row(point, result) for point, result in zip(points, results)]
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def write_results(rows: list[dict], output):
+    """
+    Write rows to `output` (a path, or "-" for stdout). CSV gets the totals only,
+    JSON also has the per-core results.
+    """
+    out = sys.stdout if output == "-" else open(output, "w", newline="")
+    try:
+        if output.endswith(".json"):
+            json.dump(rows, out, indent=2)
+            out.write("\n")
+        else:
+            fields = [key for key in rows[0] if key != "cores"] if rows else []
+            writer = csv.DictWriter(out, fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="sweep")
+    parser.add_argument("input_file")
+    parser.add_argument("--protocols", default="MESI")
+    parser.add_argument("--cache-sizes", default="4096")
+    parser.add_argument("--associativities", default="2")
+    parser.add_argument("--block-sizes", default="32")
+    parser.add_argument("--cache-engine", choices=list(CACHE_ENGINES), default="default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--result-cache", nargs="?", const=DEFAULT_RESULT_CACHE_DIR, metavar="DIR",
+        help="reuse results of configurations simulated before, stored in DIR",
+    )
+    parser.add_argument("--output", default="-", help="CSV or JSON file, by extension; - for CSV on stdout")
+    args = parser.parse_args(argv)
+
+    points = sweep_points(
+        args.protocols.split(","),
+        parse_values(args.cache_sizes),
+        parse_values(args.associativities),
+        parse_values(args.block_sizes),
+    )
+    if not points:
+        parser.error("No valid cache configuration in the given ranges")
+    result_cache = ResultCache(args.result_cache) if args.result_cache else None
+    rows = run_sweep(args.input_file, points, args.workers, args.cache_engine, result_cache)
+    write_results(rows, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import unittest
+
+from benchmarks.run import regressions
+from benchmarks.synthetic import PATTERNS, SyntheticTrace
+from constants import WORD_SIZE_BITS
+from instruction import OTHER
+from simulation import Simulation
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_synthetic_trace_shape(self):
+        for pattern in PATTERNS:
+            trace = SyntheticTrace(pattern, 1000, seed=3)
+            chunks = list(trace.chunks(300))
+            types = [t for chunk_types, _ in chunks for t in chunk_types]
+            self.assertEqual(len(types), len(trace))
+            self.assertTrue(all(t == OTHER for t in types[1::2]))
+            self.assertTrue(all(t != OTHER for t in types[0::2]))
+
+    def test_synthetic_trace_simulates(self):
+        simulation = Simulation(
+            [SyntheticTrace("sharing", 500, seed) for seed in range(2)], 1024, 2, 16, WORD_SIZE_BITS,
+        )
+        results = simulation.run()
+        self.assertEqual(sum(core["load_store_instrs"] for core in results["cores"]), 1000)
+
+    def test_unknown_pattern(self):
+        with self.assertRaises(ValueError):
+            SyntheticTrace("zigzag", 10)
+
+    def test_regressions(self):
+        baseline = {"cases": {"a": {"records_per_sec": 1000.0}, "b": {"records_per_sec": 1000.0}}}
+        results = {"cases": {
+            "a": {"records_per_sec": 950.0},
+            "b": {"records_per_sec": 850.0},
+            "c": {"records_per_sec": 1.0},
+        }}
+        failures = regressions(results, baseline, 0.1)
+        self.assertEqual(len(failures), 1)
+        self.assertTrue(failures[0].startswith("b:"))
+
+
+if __name__ == "__main__":
+    unittest.main()
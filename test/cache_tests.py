@@ -205,5 +205,21 @@ class TestCache(unittest.TestCase):
         assert evicted_tag == 3
         assert str(eviction_handler.dll) == "4,2"
 
+    def test_access_many_matches_single_accesses(self):
+        types = [0, 1, 0, 0, 1, 1, 0, 1]
+        mem_addrs = [0x00, 0x10, 0x20, 0x40, 0x00, 0x30, 0x10, 0x20]
+        for type_code, addr in zip(types, mem_addrs):
+            if type_code == 1:
+                self.cache.write(addr)
+            else:
+                self.cache.read(addr)
+
+        batched = Cache(id=0, size=64, associativity=2, block_size_bytes=16)
+        summary = batched.access_many(types, mem_addrs)
+        self.assertEqual(summary.hits, self.cache.cache_hits)
+        self.assertEqual(summary.misses, self.cache.cache_misses)
+        self.assertEqual(summary.cycles, self.cache.cycles)
+        self.assertEqual(batched.cycles, self.cache.cycles)
+
 if __name__ == "__main__":
     unittest.main()
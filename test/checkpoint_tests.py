@@ -0,0 +1,53 @@
+import os
+import unittest
+
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture, write_trace
+
+
+class TestCheckpoint(SimulationFixture):
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(self.dir.name, "run.snap")
+
+    def simulation(self, input_file=None, **kwargs):
+        return Simulation(input_file or self.archive, 256, 2, 16, 32, chunk_size=128, **kwargs)
+
+    def test_resume_is_identical(self):
+        for input_file, options in self.configurations():
+            with self.subTest(input_file=input_file, **options):
+                expected = self.simulation(input_file, **options).run()
+                # snapshots are taken throughout; the last one is a few hundred records before the end
+                self.simulation(input_file, checkpoint_path=self.checkpoint, checkpoint_interval=2500, **options).run()
+                resumed = self.simulation(input_file, **options)
+                resumed.load_checkpoint(self.checkpoint)
+                self.assertGreater(sum(resumed._start_positions), 0)
+                self.assertEqual(resumed.run(), expected)
+
+    def test_fork_from_warm_state(self):
+        self.simulation(checkpoint_path=self.checkpoint, checkpoint_interval=4000).run()
+        forked = self.simulation()
+        forked.load_checkpoint(self.checkpoint, reset_stats=True)
+        results = forked.run()
+        total = self.simulation().run()
+        for measured, whole in zip(results["cores"], total["cores"]):
+            self.assertLess(measured["load_store_instrs"], whole["load_store_instrs"])
+            self.assertEqual(measured["idle_cycles"], measured["execution_cycles"] - measured["compute_cycles"])
+
+    def test_rejects_other_configuration(self):
+        self.simulation(checkpoint_path=self.checkpoint, checkpoint_interval=1000).run()
+        other = Simulation(self.archive, 512, 2, 16, 32)
+        with self.assertRaises(ValueError):
+            other.load_checkpoint(self.checkpoint)
+
+    def test_rejects_edited_trace(self):
+        self.simulation(self.single, checkpoint_path=self.checkpoint, checkpoint_interval=1000).run()
+        write_trace(self.dir.name, self.seed + 100, self.length)
+        edited = self.simulation(self.single)
+        with self.assertRaises(ValueError):
+            edited.load_checkpoint(self.checkpoint)
+
+
+if __name__ == "__main__":
+    unittest.main()
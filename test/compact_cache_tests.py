@@ -0,0 +1,41 @@
+import random
+import unittest
+
+from cache import Cache
+from compact_cache import CompactCache
+from constants import MEM_FETCH_CC, L1_CACHE_HIT_CC, EVICT_DIRTY_CACHE_BLOCK_CC
+
+
+class TestCompactCache(unittest.TestCase):
+
+    def test_dirty_eviction(self):
+        cache = CompactCache(id=0, size=64, associativity=2, block_size_bytes=16)
+        cache.write(0x00)
+        cache.read(0x20)
+        cache.read(0x40) # evicts the dirty block at 0x00
+        cache.read(0x00) # evicts the clean block at 0x20
+        self.assertEqual(cache.cache_misses, 4)
+        self.assertEqual(cache.cache_hits, 0)
+        self.assertEqual(cache.cycles, 4 * (MEM_FETCH_CC + L1_CACHE_HIT_CC) + EVICT_DIRTY_CACHE_BLOCK_CC)
+
+    def test_matches_cache(self):
+        rng = random.Random(4223)
+        for size, associativity, block_size in [(64, 1, 16), (256, 2, 16), (1024, 4, 32), (512, 8, 8)]:
+            cache = Cache(0, size, associativity, block_size)
+            compact = CompactCache(0, size, associativity, block_size)
+            for _ in range(5000):
+                addr = rng.randrange(0, 1 << 13)
+                if rng.random() < 0.4:
+                    cache.write(addr)
+                    compact.write(addr)
+                else:
+                    cache.read(addr)
+                    compact.read(addr)
+            self.assertEqual(
+                (compact.cache_hits, compact.cache_misses, compact.cycles),
+                (cache.cache_hits, cache.cache_misses, cache.cycles),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import unittest
+from array import array
+
+from block_ids import dense_path_for, load_dense_trace, read_dense_header, remap_chunks
+from dense_cache import DenseCache
+from hotspots import HotspotProfiler
+from instruction import LOAD, OTHER, STORE
+from sampling import Sampling
+from simulation import Simulation
+from traces import TraceSource
+from test.simulation_tests import SimulationFixture, write_trace
+
+
+class TestRemap(unittest.TestCase):
+
+    def test_ids_in_order_of_first_access(self):
+        types = array("B", [LOAD, OTHER, STORE, LOAD, STORE, OTHER])
+        values = array("I", [0x40, 7, 0x10, 0x4c, 0x90, 0x40])
+        chunks = [(types[:3], values[:3]), (types[3:], values[3:])]
+        remapped_types, remapped_values, blocks = remap_chunks(chunks, 16)
+        self.assertEqual(list(remapped_types), list(types))
+        # compute records keep their cycles
+        self.assertEqual(list(remapped_values), [0, 7, 1, 0, 2, 0x40])
+        self.assertEqual(list(blocks), [0x4, 0x1, 0x9])
+
+
+class TestDenseCache(SimulationFixture):
+
+    def test_matches_other_engines(self):
+        for input_file, options in self.configurations():
+            if "protocol" in options:
+                continue
+            options = {**options, "chunk_size": 97}
+            default = Simulation(input_file, 256, 2, 16, 32, **options)
+            expected = default.run()
+            dense = Simulation(input_file, 256, 2, 16, 32, **{**options, "cache_engine": "dense"})
+            self.assertEqual(dense.run()["cores"], expected["cores"])
+            self.assertIsInstance(dense.cores[0].cache, DenseCache)
+            for core, default_core in zip(dense.cores, default.cores):
+                self.assertEqual(sorted(core.cache.blocks()), sorted(default_core.cache.blocks()))
+
+    def test_hotspots_see_block_addresses(self):
+        expected = HotspotProfiler(k=5)
+        Simulation(self.archive, 256, 2, 16, 32, hotspots=expected).run()
+        profiler = HotspotProfiler(k=5)
+        Simulation(self.archive, 256, 2, 16, 32, cache_engine="dense", hotspots=profiler).run()
+        self.assertEqual(profiler.report(), expected.report())
+
+    def test_sampling_warms_like_a_full_run(self):
+        full = Simulation(self.single, 256, 2, 16, 32, cache_engine="dense")
+        full.run()
+        warmed = Simulation(self.single, 256, 2, 16, 32, cache_engine="dense", sampling=Sampling(period=6000, window=2000))
+        warmed.run()
+        self.assertEqual(warmed.cores[0].cache.get_storage_state(), full.cores[0].cache.get_storage_state())
+
+    def test_resume_is_identical(self):
+        checkpoint = os.path.join(self.dir.name, "run.snap")
+        expected = Simulation(self.archive, 256, 2, 16, 32, chunk_size=128, cache_engine="dense").run()
+        Simulation(
+            self.archive, 256, 2, 16, 32, chunk_size=128, cache_engine="dense",
+            checkpoint_path=checkpoint, checkpoint_interval=4000,
+        ).run()
+        resumed = Simulation(self.archive, 256, 2, 16, 32, chunk_size=128, cache_engine="dense")
+        resumed.load_checkpoint(checkpoint)
+        self.assertEqual(resumed.run(), expected)
+
+    def test_remapped_trace_is_stored_and_reused(self):
+        source = TraceSource(self.single)
+        path = dense_path_for(source, 16)
+        Simulation(self.single, 256, 2, 16, 32, cache_engine="dense").run()
+        self.assertTrue(os.path.exists(path))
+        stamp = os.stat(path).st_mtime_ns
+        Simulation(self.single, 256, 2, 16, 32, cache_engine="dense").run()
+        self.assertEqual(os.stat(path).st_mtime_ns, stamp)
+        # another block size is numbered separately
+        Simulation(self.single, 256, 2, 32, 32, cache_engine="dense").run()
+        self.assertTrue(os.path.exists(dense_path_for(source, 32)))
+
+    def test_stale_remap_is_rebuilt(self):
+        source = TraceSource(self.single)
+        with load_dense_trace(source, 16) as trace:
+            self.assertEqual(len(trace), self.length)
+        write_trace(self.dir.name, self.seed + 100, 1000)
+        expected = Simulation(self.single, 256, 2, 16, 32).run()
+        self.assertEqual(Simulation(self.single, 256, 2, 16, 32, cache_engine="dense").run()["cores"], expected["cores"])
+        self.assertEqual(read_dense_header(dense_path_for(source, 16))[0], 1000)
+
+    def test_rejects_address_based_features(self):
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, cache_engine="dense", protocol="MESI")
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, cache_engine="dense", set_partitions=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import random
+import unittest
+
+from cache import Cache
+from compact_cache import CompactCache
+from directory import Directory, attach_directory
+
+
+def holders(caches, block):
+    return [cache.id for cache in caches if block in cache.blocks()]
+
+
+class TestDirectory(unittest.TestCase):
+
+    def run_accesses(self, cache_type, directory, count=3000):
+        caches = [cache_type(i, 256, 2, 16) for i in range(3)]
+        attach_directory(caches, directory)
+        rng = random.Random(7)
+        for _ in range(count):
+            cache = rng.choice(caches)
+            addr = rng.randrange(0, 1 << 12, 4)
+            if rng.random() < 0.3:
+                cache.write(addr)
+            else:
+                cache.read(addr)
+        return caches
+
+    def test_tracks_exact_sharers(self):
+        for cache_type in (Cache, CompactCache):
+            directory = Directory(3)
+            caches = self.run_accesses(cache_type, directory)
+            for block in range(1 << 8):
+                self.assertEqual(directory.sharers(block), holders(caches, block))
+            held = {block for cache in caches for block in cache.blocks()}
+            self.assertEqual(set(directory.entries), held)
+
+    def test_sharers_excludes_requester(self):
+        directory = Directory(4)
+        directory.filled(0, 5)
+        directory.filled(2, 5)
+        directory.filled(3, 5)
+        self.assertEqual(directory.sharers(5, exclude=2), [0, 3])
+        directory.evicted(0, 5)
+        self.assertEqual(directory.sharers(5), [2, 3])
+        self.assertEqual(directory.sharers(6), [])
+
+    def test_bounded_is_superset(self):
+        for cache_type in (Cache, CompactCache):
+            directory = Directory(3, max_entries=16, overflow_slots=8)
+            caches = self.run_accesses(cache_type, directory)
+            self.assertLessEqual(len(directory.entries), 16)
+            self.assertGreater(directory.spills, 0)
+            for block in range(1 << 8):
+                self.assertTrue(set(holders(caches, block)) <= set(directory.sharers(block)))
+
+    def test_overflow_masks_follow_evictions(self):
+        for cache_type in (Cache, CompactCache):
+            directory = Directory(3, max_entries=16, overflow_slots=8)
+            caches = self.run_accesses(cache_type, directory, count=20000)
+            expected = [0] * 8
+            for cache in caches:
+                for block in cache.blocks():
+                    # copies without an exact entry were folded into their slot
+                    if not directory.entries.get(block, 0) & (1 << cache.id):
+                        expected[block % 8] |= 1 << cache.id
+            self.assertEqual(directory.overflow, expected)
+
+    def test_rebuild_after_restore(self):
+        directory = Directory(3)
+        caches = self.run_accesses(Cache, directory, count=500)
+        expected = dict(directory.entries)
+        directory.clear()
+        directory.rebuild(caches)
+        self.assertEqual(sorted(directory.entries.items()), sorted(expected.items()))
+
+
+if __name__ == "__main__":
+    unittest.main()
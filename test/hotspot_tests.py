@@ -0,0 +1,113 @@
+import os
+import random
+import unittest
+from collections import Counter
+
+from cache import add_observer
+from hotspots import CountMinSketch, HotspotProfiler, TopK
+from sampling import Sampling
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture
+
+
+class ExactCounts:
+    """
+    Observer that counts every fill and eviction per block
+    """
+
+    def __init__(self):
+        self.fills = Counter()
+        self.evictions = Counter()
+
+    def filled(self, cache_id, block):
+        self.fills[block] += 1
+
+    def evicted(self, cache_id, block):
+        self.evictions[block] += 1
+
+
+class TestSketches(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(5)
+        # a few heavy items over a long tail
+        self.stream = [rng.choice((1, 2, 3)) if rng.random() < 0.3 else rng.randrange(10, 5000) for _ in range(20000)]
+        self.exact = Counter(self.stream)
+
+    def test_never_undercounts(self):
+        sketch = CountMinSketch(width=256, depth=4)
+        for item in self.stream:
+            sketch.add(item)
+        self.assertEqual(sketch.total, len(self.stream))
+        for item, count in self.exact.items():
+            estimate = sketch.estimate(item)
+            self.assertGreaterEqual(estimate, count)
+            self.assertLessEqual(estimate, count + 2 * len(self.stream) // 256)
+        self.assertEqual(sketch.memory_bytes, 256 * 4 * 8)
+        with self.assertRaises(ValueError):
+            CountMinSketch(width=1000)
+
+    def test_top_k_finds_heavy_hitters(self):
+        sketch = CountMinSketch(width=256, depth=4)
+        top = TopK(3)
+        for item in self.stream:
+            top.offer(item, sketch.add(item))
+        self.assertEqual({item for item, _ in top.items()}, {1, 2, 3})
+        for item, estimate in top.items():
+            self.assertGreaterEqual(estimate, self.exact[item])
+
+
+class TestHotspotProfiler(SimulationFixture):
+    cores = 4
+
+    def test_counts_match_the_run(self):
+        for protocol in (None, "MESI", "Dragon"):
+            profiler = HotspotProfiler(k=5, width=512)
+            simulation = Simulation(self.archive, 256, 2, 16, 32, protocol=protocol, hotspots=profiler)
+            exact = ExactCounts()
+            for core in simulation.cores:
+                add_observer(core.cache, exact)
+            results = simulation.run()
+            report = profiler.report()
+
+            self.assertEqual(report["misses"]["total"], sum(core["cache_misses"] for core in results["cores"]))
+            self.assertEqual(report["misses"]["total"], sum(exact.fills.values()))
+            self.assertEqual(report["evictions"]["total"], sum(exact.evictions.values()))
+            bus = results.get("bus", {"invalidations": 0, "updates": 0})
+            self.assertEqual(report["invalidations"]["total"], bus["invalidations"])
+            self.assertEqual(report["updates"]["total"], bus["updates"])
+            self.assertLessEqual(sum(count for _, count in report["misses"]["sets"]), report["misses"]["total"])
+
+            n_block = simulation.cores[0].cache.n_block
+            blocks = report["misses"]["blocks"]
+            self.assertEqual(len(blocks), 5)
+            for address, estimate in blocks:
+                self.assertGreaterEqual(estimate, exact.fills[address >> n_block])
+            # the hottest block is among the estimated top five
+            hottest = exact.fills.most_common(1)[0][0]
+            self.assertIn(hottest << n_block, [address for address, _ in blocks])
+        self.assertEqual(report["memory_bytes"], 4 * 512 * 4 * 8)
+
+    def test_rejects_set_partitions(self):
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, hotspots=HotspotProfiler(), set_partitions=2)
+
+    def test_rejects_checkpoints_and_sampling(self):
+        checkpoint = os.path.join(self.dir.name, "run.snap")
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, hotspots=HotspotProfiler(), checkpoint_path=checkpoint)
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, hotspots=HotspotProfiler(), sampling=Sampling())
+        Simulation(self.archive, 256, 2, 16, 32, checkpoint_path=checkpoint, checkpoint_interval=2000).run()
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, hotspots=HotspotProfiler()).load_checkpoint(checkpoint)
+        # forking with fresh statistics profiles from the fork on
+        profiler = HotspotProfiler()
+        forked = Simulation(self.archive, 256, 2, 16, 32, hotspots=profiler)
+        forked.load_checkpoint(checkpoint, reset_stats=True)
+        results = forked.run()
+        self.assertEqual(profiler.report()["misses"]["total"], sum(core["cache_misses"] for core in results["cores"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import os
+import unittest
+
+from interval_stats import IntervalStats
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture
+
+
+class TestIntervalStats(SimulationFixture):
+
+    def setUp(self):
+        super().setUp()
+        self.out = os.path.join(self.dir.name, "stats.ndjson")
+
+    def records(self):
+        with open(self.out) as f:
+            return [json.loads(line) for line in f]
+
+    def test_intervals_add_up_to_totals(self):
+        for input_file, options in self.configurations():
+            expected = Simulation(input_file, 256, 2, 16, 32, **options).run()
+            stats = IntervalStats(self.out, 500)
+            results = Simulation(input_file, 256, 2, 16, 32, interval_stats=stats, **options).run()
+            self.assertEqual(results, expected)
+
+            records = self.records()
+            self.assertGreater(len(records), 3)
+            self.assertTrue(records[-1]["final"])
+            self.assertTrue(all(r["instructions"] % 500 == 0 for r in records[:-1]))
+            for i, core in enumerate(results["cores"]):
+                for key in ("cache_hits", "cache_misses", "load_store_instrs", "execution_cycles"):
+                    self.assertEqual(sum(r["cores"][i][key] for r in records), core[key])
+            if "protocol" in options:
+                self.assertEqual(
+                    sum(r["bus"]["data_traffic_bytes"] for r in records), results["bus"]["data_traffic_bytes"]
+                )
+
+    def test_cycle_intervals(self):
+        stats = IntervalStats(self.out, 20000, unit="cycles")
+        Simulation(self.archive, 256, 2, 16, 32, interval_stats=stats).run()
+        cycles = [r["cycle"] for r in self.records()]
+        self.assertGreater(len(cycles), 2)
+        self.assertEqual(cycles, sorted(cycles))
+
+    def test_stop_early(self):
+        stats = IntervalStats(self.out, 400, stop_when=lambda record: record["interval"] == 2)
+        simulation = Simulation(self.single, 256, 2, 16, 32, interval_stats=stats)
+        results = simulation.run()
+        self.assertTrue(simulation.stopped_early)
+        self.assertEqual(len(self.records()), 3)
+        self.assertEqual(sum(core.position for core in simulation.cores), 1200)
+        self.assertLess(results["cores"][0]["load_store_instrs"], 3000)
+
+
+if __name__ == "__main__":
+    unittest.main()
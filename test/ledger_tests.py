@@ -0,0 +1,79 @@
+import os
+import unittest
+from unittest import mock
+
+from ledger import build_ledger, load_ledger, recost, save_ledger
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture
+
+OTHER_LATENCIES = {"L1_CACHE_HIT_CC": 3, "MEM_FETCH_CC": 250, "BUS_UPDATE_WORD_CC": 5, "EVICT_DIRTY_CACHE_BLOCK_CC": 40}
+
+
+def patched_latencies(latencies):
+    # every module that charges a latency imported it by name
+    patches = [
+        mock.patch(f"{module}.{name}", value)
+        for module, names in (
+            ("cache", ("L1_CACHE_HIT_CC", "MEM_FETCH_CC", "EVICT_DIRTY_CACHE_BLOCK_CC")),
+            ("compact_cache", ("L1_CACHE_HIT_CC", "MEM_FETCH_CC", "EVICT_DIRTY_CACHE_BLOCK_CC")),
+            ("coherent_cache", ("L1_CACHE_HIT_CC",)),
+            ("bus", ("MEM_FETCH_CC", "BUS_UPDATE_WORD_CC", "EVICT_DIRTY_CACHE_BLOCK_CC")),
+        )
+        for name, value in latencies.items() if name in names
+    ]
+    return patches
+
+
+class TestLedger(SimulationFixture):
+
+    def run_with(self, latencies, *args, **kwargs) -> dict:
+        patches = patched_latencies(latencies)
+        for patch in patches:
+            patch.start()
+        try:
+            return Simulation(*args, **kwargs).run()
+        finally:
+            for patch in patches:
+                patch.stop()
+
+    def test_recost_matches_rerun(self):
+        # a shared bus makes the ledger approximate, see below
+        runs = self.configurations(shared_bus=False) + [(self.single, {"protocol": "Dragon", "set_partitions": 2})]
+        for input_file, options in runs:
+            simulation = Simulation(input_file, 256, 2, 16, 32, **options)
+            results = simulation.run()
+            ledger = build_ledger(simulation)
+            self.assertTrue(ledger["exact"])
+            self.assertEqual(recost(ledger, {})["execution_cycles"], results["execution_cycles"])
+
+            rerun = self.run_with(OTHER_LATENCIES, input_file, 256, 2, 16, 32, **options)
+            recosted = recost(ledger, OTHER_LATENCIES)
+            self.assertEqual(recosted["execution_cycles"], rerun["execution_cycles"])
+            for core, expected in zip(recosted["cores"], rerun["cores"]):
+                self.assertEqual(core["execution_cycles"], expected["execution_cycles"])
+                self.assertEqual(core["idle_cycles"], expected["idle_cycles"])
+
+    def test_shared_bus_is_approximate(self):
+        simulation = Simulation(self.archive, 256, 2, 16, 32, protocol="MESI")
+        results = simulation.run()
+        ledger = build_ledger(simulation)
+        self.assertFalse(ledger["exact"])
+        self.assertTrue(any(core["events"]["wait_cycles"] for core in ledger["cores"]))
+        # the recorded latencies still reproduce the run
+        recosted = recost(ledger, {})
+        self.assertEqual([core["execution_cycles"] for core in recosted["cores"]],
+                         [core["execution_cycles"] for core in results["cores"]])
+        self.assertFalse(recosted["exact"])
+
+    def test_save_and_load(self):
+        simulation = Simulation(self.single, 256, 2, 16, 32)
+        simulation.run()
+        path = os.path.join(self.dir.name, "ledger.json")
+        save_ledger(build_ledger(simulation), path)
+        self.assertEqual(load_ledger(path), build_ledger(simulation))
+        with self.assertRaises(ValueError):
+            recost(load_ledger(path), {"DRAM_CC": 5})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -31,5 +31,14 @@ class TestCache(unittest.TestCase):
     def test_mem_addr_5(self):
         create_mem_addr_test(64,2,16,16,0,1,0)
 
+    def test_decode_addrs_matches_get_info_from_addr(self):
+        cache = Cache(id=0, size=256, associativity=2, block_size_bytes=32)
+        addrs = [0, 16, 36, 0x1F4, 0x7fe891b0, 0xFFFFFFFF]
+        set_indexes, tags = cache.decode_addrs(addrs)
+        for addr, set_ind, tag in zip(addrs, set_indexes, tags):
+            info = cache.get_info_from_addr(addr)
+            self.assertEqual(set_ind, info.set_index)
+            self.assertEqual(tag, info.tag)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
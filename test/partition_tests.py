@@ -0,0 +1,30 @@
+import unittest
+
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture
+
+
+class TestSetPartitioning(SimulationFixture):
+
+    def test_identical_to_serial(self):
+        for input_file, options in self.configurations(shared_bus=False):
+            serial = Simulation(input_file, 256, 2, 16, 32, **options)
+            expected = serial.run()
+            for partitions in (3, 64):
+                parallel = Simulation(input_file, 256, 2, 16, 32, set_partitions=partitions, **options)
+                self.assertEqual(parallel.run(), expected)
+                for core, serial_core in zip(parallel.cores, serial.cores):
+                    self.assertEqual(core.position, serial_core.position)
+                    self.assertEqual(sorted(core.cache.blocks()), sorted(serial_core.cache.blocks()))
+                    if options.get("cache_engine", "default") == "default":
+                        self.assertEqual(core.cache.get_storage_state(), serial_core.cache.get_storage_state())
+
+    def test_rejects_shared_caches(self):
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, protocol="MESI", set_partitions=2)
+        with self.assertRaises(ValueError):
+            Simulation(self.single, 256, 2, 16, 32, set_partitions=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from cache import CacheBlock
+from ledger import build_ledger
+from protocols import MESI
+from coherent_cache import CoherentCache
+from core import Core
+from instruction import LOAD, OTHER, STORE
+from sharing import SharingClassifier
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture
+
+
+class TestLookahead(unittest.TestCase):
+
+    def test_stops_at_first_access_needing_the_bus(self):
+        cache = CoherentCache(0, 256, 2, 16, MESI)
+        # 0x100 is tag 2 of set 0, held in E, which a write makes M without the bus
+        cache.sets[0].cache_blocks[2] = CacheBlock(2, state=MESI.states.index("E"))
+        cache.sets[0].eviction_handler.use(2)
+        core = Core(0, cache)
+        types = [LOAD, OTHER, STORE, LOAD, STORE, LOAD]
+        values = [0x100, 5, 0x100, 0x100, 0x110, 0x100]
+        core.attach([(types, values)])
+        # 0x110 is in set 1, which holds nothing: a miss
+        self.assertEqual(core.lookahead(), (4, 1 + 5 + 1 + 1, True))
+        cache.bus = None
+        core.run_until(float("inf"), 0, 4)
+        self.assertEqual(core.execution_cycles, 8)
+        self.assertEqual(cache.sets[0].cache_blocks[2].state, MESI.states.index("M"))
+
+
+class TestParallelCores(SimulationFixture):
+
+    def test_identical_to_serial(self):
+        runs = self.configurations() + [(self.archive, {"protocol": "MESI", "directory_entries": 16, "chunk_size": 100})]
+        for input_file, options in runs:
+            serial = Simulation(input_file, 256, 2, 16, 32, **options)
+            expected = serial.run()
+            parallel = Simulation(input_file, 256, 2, 16, 32, parallel_cores=True, **options)
+            self.assertEqual(parallel.run(), expected)
+            for core, serial_core in zip(parallel.cores, serial.cores):
+                self.assertEqual(core.position, serial_core.position)
+                self.assertEqual(core.cache.get_state(), serial_core.cache.get_state())
+            if serial.bus is not None:
+                self.assertEqual(parallel.bus.get_state(), serial.bus.get_state())
+                self.assertEqual(build_ledger(parallel), build_ledger(serial))
+                self.assertEqual(parallel.bus.directory.entries, serial.bus.directory.entries)
+
+    def test_rejects_instruments(self):
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, sharing=SharingClassifier(), parallel_cores=True)
+        with self.assertRaises(ValueError):
+            Simulation(self.single, 256, 2, 16, 32, set_partitions=2, parallel_cores=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
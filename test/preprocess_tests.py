@@ -0,0 +1,42 @@
+import tempfile
+import unittest
+
+from preprocess import coalesce_chunks
+from simulation import Simulation
+from test.simulation_tests import write_trace
+
+
+class TestCoalesce(unittest.TestCase):
+
+    def coalesce(self, records, collapse_runs, chunk_size=1 << 16):
+        chunks = [([t for t, _ in records], [v for _, v in records])]
+        return [
+            record
+            for types, values, repeats in coalesce_chunks(chunks, 16, collapse_runs, chunk_size)
+            for record in zip(types, values, repeats)
+        ]
+
+    def test_merges_compute(self):
+        records = [(2, 3), (2, 4), (0, 0x10), (2, 5), (0, 0x14), (2, 1), (2, 1)]
+        self.assertEqual(self.coalesce(records, False), [(2, 7, 0), (0, 0x10, 0), (2, 5, 0), (0, 0x14, 0), (2, 2, 0)])
+
+    def test_collapses_same_block_runs(self):
+        records = [(0, 0x10), (2, 5), (1, 0x14), (0, 0x1c), (2, 1), (0, 0x20), (1, 0x10)]
+        self.assertEqual(
+            self.coalesce(records, True, chunk_size=1),
+            [(1, 0x10, 2), (2, 6, 0), (0, 0x20, 0), (1, 0x10, 0)],
+        )
+
+    def test_identical_statistics(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_trace(tmp, 11, 5000)
+            for engine, protocol in (("default", None), ("compact", None), ("default", "MESI"), ("default", "Dragon")):
+                for associativity in (1, 2, 4):
+                    options = {"cache_engine": engine, "protocol": protocol, "chunk_size": 100}
+                    plain = Simulation(path, 256, associativity, 16, 32, **options).run()
+                    coalesced = Simulation(path, 256, associativity, 16, 32, coalesce=True, **options).run()
+                    self.assertEqual(plain, coalesced)
+
+
+if __name__ == "__main__":
+    unittest.main()
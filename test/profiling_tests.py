@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+
+from cache import Cache
+from profiling import PhaseTimer, attach_profiler
+from simulation import Simulation
+from test.simulation_tests import write_trace
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_counts_phases(self):
+        cache = Cache(id=0, size=64, associativity=2, block_size_bytes=16)
+        timer = PhaseTimer()
+        attach_profiler(cache, timer)
+        set_indexes, tags = cache.decode_addrs([0x00, 0x40, 0x80, 0x00])
+        for set_ind, tag in zip(set_indexes, tags):
+            cache.read_block(set_ind, tag)
+        self.assertEqual(timer.calls["decode"], 1)
+        self.assertEqual(timer.calls["lookup"], 4)
+        # 0x00, 0x40 and 0x80 share set 0 of 2 ways, so the third and fourth reads evict
+        self.assertEqual(timer.calls["evict"], 2)
+
+        timer.total = sum(timer.seconds.values()) + 1.0
+        phases = timer.breakdown()
+        self.assertAlmostEqual(sum(phases.values()), timer.total)
+
+    def test_profiled_run_matches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_trace(tmp, 0, name="bench_0.data")
+            plain = Simulation(path, 256, 2, 16, 32).run()
+            timer = PhaseTimer()
+            profiled = Simulation(path, 256, 2, 16, 32, chunk_size=300, profiler=timer).run()
+        self.assertEqual(profiled, plain)
+        self.assertEqual(timer.calls["lookup"], plain["cores"][0]["load_store_instrs"])
+        self.assertGreater(timer.calls["parse"], 1)
+        self.assertGreater(timer.calls["evict"], 0)
+
+    def test_restored_storage_still_timed(self):
+        cache = Cache(id=0, size=64, associativity=2, block_size_bytes=16)
+        timer = PhaseTimer()
+        attach_profiler(cache, timer)
+        cache.set_storage_state(cache.get_storage_state())
+        for addr in (0x00, 0x40, 0x80):
+            cache.read(addr)
+        self.assertEqual(timer.calls["evict"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
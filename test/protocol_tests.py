@@ -0,0 +1,110 @@
+import unittest
+
+from bus import Bus
+from coherent_cache import CoherentCache
+from constants import BUS_UPDATE_WORD_CC, EVICT_DIRTY_CACHE_BLOCK_CC, L1_CACHE_HIT_CC, MEM_FETCH_CC
+from protocols import DRAGON, MESI, build_protocol
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture
+
+BLOCK = 16
+TRANSFER_CC = BUS_UPDATE_WORD_CC * BLOCK // 4
+
+
+def bus_with_caches(protocol, count=2):
+    caches = [CoherentCache(i, 64, 2, BLOCK, protocol) for i in range(count)]
+    bus = Bus(protocol, BLOCK)
+    bus.connect(caches)
+    return bus, caches
+
+
+def access(cache, now, addr, write=False):
+    cycles = cache.cycles
+    cache.now = now
+    if write:
+        cache.write(addr)
+    else:
+        cache.read(addr)
+    return cache.cycles - cycles
+
+
+def state(cache, addr):
+    return cache.protocol.states[cache.block_state(addr // BLOCK)]
+
+
+class TestProtocols(unittest.TestCase):
+
+    def test_mesi(self):
+        bus, (c0, c1) = bus_with_caches(MESI)
+        self.assertEqual(access(c0, 0, 0x40), MEM_FETCH_CC + L1_CACHE_HIT_CC)
+        self.assertEqual(state(c0, 0x40), "E")
+        # supplied by cache 0 rather than memory
+        self.assertEqual(access(c1, 200, 0x40), TRANSFER_CC + L1_CACHE_HIT_CC)
+        self.assertEqual((state(c0, 0x40), state(c1, 0x40)), ("S", "S"))
+        self.assertEqual(access(c0, 300, 0x40, write=True), L1_CACHE_HIT_CC)
+        self.assertEqual((state(c0, 0x40), state(c1, 0x40)), ("M", "I"))
+        self.assertEqual(bus.invalidations, 1)
+        self.assertEqual(access(c1, 400, 0x44), TRANSFER_CC + L1_CACHE_HIT_CC)
+        self.assertEqual((state(c0, 0x40), state(c1, 0x40)), ("S", "S"))
+        self.assertEqual(c1.cache_misses, 2)
+        self.assertEqual(bus.data_traffic_bytes, 3 * BLOCK)
+
+    def test_dragon(self):
+        bus, (c0, c1) = bus_with_caches(DRAGON)
+        access(c0, 0, 0x40)
+        access(c1, 200, 0x40)
+        self.assertEqual((state(c0, 0x40), state(c1, 0x40)), ("Sc", "Sc"))
+        self.assertEqual(access(c0, 300, 0x40, write=True), BUS_UPDATE_WORD_CC + L1_CACHE_HIT_CC)
+        self.assertEqual((state(c0, 0x40), state(c1, 0x40)), ("Sm", "Sc"))
+        self.assertEqual(bus.updates, 1)
+        # updated rather than invalidated, so still a hit
+        self.assertEqual(access(c1, 400, 0x40), L1_CACHE_HIT_CC)
+        self.assertEqual(c1.cache_misses, 1)
+        self.assertEqual(bus.data_traffic_bytes, 2 * BLOCK + 4)
+        self.assertEqual(bus.invalidations, 0)
+
+    def test_dirty_eviction_writes_back(self):
+        for protocol in (MESI, DRAGON):
+            bus, (c0, _) = bus_with_caches(protocol)
+            # 64 byte, 2-way cache of 16 byte blocks: 0x00, 0x20 and 0x40 share set 0
+            access(c0, 0, 0x00, write=True)
+            access(c0, 1000, 0x20)
+            self.assertEqual(
+                access(c0, 2000, 0x40), EVICT_DIRTY_CACHE_BLOCK_CC + MEM_FETCH_CC + L1_CACHE_HIT_CC
+            )
+            self.assertEqual(bus.directory.sharers(0x00 // BLOCK), [])
+
+    def test_bus_contention(self):
+        _, (c0, c1) = bus_with_caches(MESI)
+        access(c0, 0, 0x00)
+        # the bus is busy fetching for cache 0 until cycle 100
+        self.assertEqual(access(c1, 10, 0x20), 90 + MEM_FETCH_CC + L1_CACHE_HIT_CC)
+
+    def test_incomplete_table_rejected(self):
+        with self.assertRaises(ValueError):
+            build_protocol("Broken", ("I", "V"), set(), {("I", "PrRd"): ("V", ["BusRd"], "V", ["BusRd"])}, {})
+
+
+class TestCoherentSimulation(SimulationFixture):
+
+    def test_single_core_matches_private_cache(self):
+        expected = Simulation(self.single, 256, 2, 16, 32).run()
+        for protocol in ("MESI", "Dragon"):
+            results = Simulation(self.single, 256, 2, 16, 32, protocol=protocol).run()
+            self.assertEqual(results["cores"], expected["cores"])
+            self.assertEqual(results["bus"]["invalidations"], 0)
+
+    def test_bounded_directory_gives_same_results(self):
+        for protocol in ("MESI", "Dragon"):
+            exact = Simulation(self.archive, 256, 2, 16, 32, protocol=protocol).run()
+            bounded = Simulation(self.archive, 256, 2, 16, 32, protocol=protocol, directory_entries=4).run()
+            self.assertEqual(bounded, exact)
+            self.assertGreater(exact["bus"]["data_traffic_bytes"], 0)
+
+    def test_compact_engine_rejected(self):
+        with self.assertRaises(ValueError):
+            Simulation(self.single, 256, 2, 16, 32, protocol="MESI", cache_engine="compact")
+
+
+if __name__ == "__main__":
+    unittest.main()
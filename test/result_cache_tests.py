@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import constants
+from result_cache import ResultCache
+from simulation import Simulation
+from sweep import run_sweep, sweep_points
+from test.simulation_tests import random_trace, write_trace
+from traces import resolve_trace_sources
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.trace = os.path.join(self.dir.name, "bench_0.data")
+        self.write_trace(1)
+        self.cache = ResultCache(os.path.join(self.dir.name, "results"))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write_trace(self, seed):
+        with open(self.trace, "w") as f:
+            f.write(random_trace(seed, 500))
+        # make sure a rewrite is seen even on coarse mtime clocks
+        os.utime(self.trace, ns=(time.time_ns(), time.time_ns() + seed))
+
+    def key(self, **config):
+        args = {"protocol": "MESI", "cache_size": 256, "associativity": 2, "block_size_bytes": 16, "word_size_bits": 32}
+        args.update(config)
+        return self.cache.key(resolve_trace_sources(self.trace), **args)
+
+    def test_key_covers_trace_config_and_constants(self):
+        key = self.key()
+        self.assertEqual(self.key(protocol="mesi"), key)
+        self.assertNotEqual(self.key(protocol="Dragon"), key)
+        self.assertNotEqual(self.key(associativity=4), key)
+        with mock.patch.object(constants, "MEM_FETCH_CC", 50):
+            self.assertNotEqual(self.key(), key)
+        self.write_trace(2)
+        self.assertNotEqual(self.key(), key)
+
+    def test_round_trip(self):
+        simulation = Simulation(self.trace, 256, 2, 16, 32, protocol="MESI")
+        key = self.cache.key_for(simulation)
+        self.assertIsNone(self.cache.get(key))
+        results = simulation.run()
+        self.cache.put(key, results)
+        self.assertEqual(self.cache.get(key), results)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_coalescing_shares_entries(self):
+        # coalescing is left out of the key, so it must not change what is cached
+        path = write_trace(self.dir.name, 3, 5000)
+        for protocol in ("MESI", "Dragon"):
+            plain = Simulation(path, 256, 2, 16, 32, protocol=protocol)
+            coalesced = Simulation(path, 256, 2, 16, 32, protocol=protocol, coalesce=True)
+            self.assertEqual(self.cache.key_for(coalesced), self.cache.key_for(plain))
+            self.assertEqual(coalesced.run(), plain.run())
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(os.path.join(self.dir.name, "small"), max_bytes=2500)
+        payload = {"data": "x" * 1000}
+        cache.put("a", payload)
+        cache.put("b", payload)
+        # mark "a" as used after "b"
+        os.utime(os.path.join(cache.directory, "b.json"), ns=(1, 1))
+        cache.get("a")
+        cache.put("c", payload)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), payload)
+        self.assertEqual(cache.get("c"), payload)
+
+    def test_sweep_reuses_results(self):
+        points = sweep_points(["MESI", "Dragon"], [128, 256], [2], [16])
+        first = run_sweep(self.trace, points, workers=2, result_cache=self.cache)
+        again = ResultCache(self.cache.directory)
+        second = run_sweep(self.trace, points, workers=2, result_cache=again)
+        self.assertEqual(second, first)
+        self.assertEqual(again.hits, len(points))
+
+
+if __name__ == "__main__":
+    unittest.main()
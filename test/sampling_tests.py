@@ -0,0 +1,63 @@
+import unittest
+
+from compact_cache import CompactCache
+from sampling import Sampling
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture
+
+
+class TestSampling(SimulationFixture):
+    cores = 2
+    length = 20000
+
+    def test_window_of_whole_period_is_exact(self):
+        for input_file, options in self.configurations(shared_bus=False):
+            expected = Simulation(input_file, 256, 2, 16, 32, **options).run()
+            sampling = Sampling(period=1000, window=1000)
+            results = Simulation(input_file, 256, 2, 16, 32, sampling=sampling, **options).run()
+            for core, exact in zip(results["cores"], expected["cores"]):
+                for key in ("load_store_instrs", "cache_hits", "cache_misses", "execution_cycles"):
+                    self.assertEqual(core[key], exact[key])
+            self.assertEqual(results["sampling"]["measured_records"], results["sampling"]["total_records"])
+
+    def test_estimates_within_intervals(self):
+        expected = Simulation(self.archive, 256, 2, 16, 32).run()
+        results = Simulation(self.archive, 256, 2, 16, 32, sampling=Sampling(1000, 200, 0.99)).run()
+        self.assertEqual(results["sampling"]["windows"], [20, 20])
+        self.assertEqual(results["sampling"]["measured_records"], 8000)
+        for exact, intervals in zip(expected["cores"], results["sampling"]["intervals"]):
+            for key in ("cache_hits", "cache_misses", "load_store_instrs"):
+                low, high = intervals[key]
+                self.assertLess(low, high)
+                self.assertTrue(low <= exact[key] <= high, (key, low, exact[key], high))
+
+    def test_warming_leaves_full_run_state(self):
+        # with no windows measured before the end, warming alone must reach the state of a full run
+        for engine, protocol in (("default", None), ("compact", None), ("default", "Dragon")):
+            full = Simulation(self.single, 256, 2, 16, 32, cache_engine=engine, protocol=protocol)
+            full.run()
+            warmed = Simulation(
+                self.single, 256, 2, 16, 32, cache_engine=engine, protocol=protocol,
+                sampling=Sampling(period=30000, window=10000),
+            )
+            results = warmed.run()
+            self.assertEqual(results["sampling"]["windows"], [0])
+            self.assertEqual(warmed.cores[0].cache.get_storage_state(), full.cores[0].cache.get_storage_state())
+            if engine == "compact":
+                self.assertIsInstance(warmed.cores[0].cache, CompactCache)
+
+    def test_partial_warmup(self):
+        results = Simulation(self.archive, 256, 2, 16, 32, sampling=Sampling(1000, 200, warmup=100)).run()
+        self.assertEqual(results["sampling"]["measured_records"], 8000)
+        with self.assertRaises(ValueError):
+            Sampling(1000, 200, warmup=900)
+
+    def test_rejects_interacting_cores(self):
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, protocol="MESI", sampling=Sampling())
+        with self.assertRaises(ValueError):
+            Sampling(period=100, window=200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from server import SimulationServer, TraceStore, request
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture, write_trace
+from traces import resolve_trace_sources
+
+
+class TestSimulationServer(SimulationFixture):
+    cores = 2
+
+    def setUp(self):
+        super().setUp()
+        self.socket_path = os.path.join(self.dir.name, "server.sock")
+        self.server = SimulationServer(self.socket_path, workers=1)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        super().tearDown()
+
+    def job(self, **overrides):
+        job = {"input_file": self.archive, "protocol": "MESI", "cache_size": 256, "associativity": 2, "block_size": 16}
+        job.update(overrides)
+        return job
+
+    def test_results_match_local_run(self):
+        expected = Simulation(self.archive, 256, 2, 16, 32, protocol="MESI").run()
+        for protocol in ("MESI", "MESI", "Dragon"):
+            response = request(self.socket_path, self.job(protocol=protocol))
+            if protocol == "MESI":
+                self.assertEqual(response["results"], expected)
+        status = request(self.socket_path, {"command": "status"})["status"]
+        # decoded once, both traces reused by the later jobs
+        self.assertEqual((status["misses"], status["hits"]), (2, 4))
+        self.assertEqual(status["traces"], ["bench_0.data", "bench_1.data"])
+
+    def test_errors(self):
+        self.assertIn("error", request(self.socket_path, self.job(cache_size=100)))
+        self.assertIn("error", request(self.socket_path, self.job(input_file="no_such_benchmark")))
+        self.assertIn("error", request(self.socket_path, self.job(protocol="MSI")))
+        self.assertIn("results", request(self.socket_path, self.job()))
+
+
+class TestTraceStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            self.paths.append(write_trace(self.dir.name, i, 1000, name=f"trace_{i}.data"))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_least_recently_used_dropped_over_budget(self):
+        store = TraceStore(max_bytes=2 * 5 * 1000)
+        try:
+            for path in self.paths[:2]:
+                keys, _ = store.acquire(resolve_trace_sources(path))
+                store.release(keys)
+            # in use, so kept even though the store is over budget
+            held, _ = store.acquire(resolve_trace_sources(self.paths[0]))
+            keys, _ = store.acquire(resolve_trace_sources(self.paths[2]))
+            store.release(keys)
+            self.assertEqual(store.status()["traces"], ["trace_0.data", "trace_2.data"])
+            store.release(held)
+
+            # an edited trace is decoded again
+            with open(self.paths[2], "a") as f:
+                f.write("2 0x5\n")
+            keys, traces = store.acquire(resolve_trace_sources(self.paths[2]))
+            store.release(keys)
+            self.assertEqual(traces[0].count, 1001)
+            self.assertEqual(store.misses, 4)
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
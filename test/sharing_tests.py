@@ -0,0 +1,88 @@
+import unittest
+
+from sharing import SharerIndex, SharingClassifier
+from simulation import Simulation
+from test.simulation_tests import SimulationFixture
+from tracing import attach_tracer
+
+
+class BruteForceSharing:
+    """
+    Tracer that classifies each access by looking into every other cache
+    """
+
+    def __init__(self, caches):
+        self.caches = caches
+        self.counts = [[0, 0] for _ in caches]
+
+    def record(self, cache_id, flags, set_index, tag, cycles):
+        shared = any(
+            tag in cache.sets[set_index].cache_blocks for cache in self.caches if cache.id != cache_id
+        )
+        self.counts[cache_id][int(shared)] += 1
+
+
+class TestSharerIndex(unittest.TestCase):
+
+    def test_fills_and_evictions(self):
+        index = SharerIndex(3)
+        self.assertEqual(index.masks.typecode, "B")
+        index.filled(0, 0x40)
+        index.filled(2, 0x40)
+        index.filled(1, 0x80)
+        index.evicted(0, 0x40)
+        index.evicted(1, 0x1000)
+        self.assertEqual(index.sharer_mask(0x40), 0b100)
+        self.assertEqual(index.sharer_mask(0x80), 0b010)
+        self.assertEqual(index.sharer_mask(0x1000), 0)
+        self.assertEqual(index.ids, {0x40: 0, 0x80: 1})
+        self.assertEqual(SharerIndex(40).masks.typecode, "Q")
+        with self.assertRaises(ValueError):
+            SharerIndex(65)
+
+
+class TestSharingClassifier(SimulationFixture):
+    # random traces span a small address range, so the cores share plenty
+    cores = 4
+
+    def test_matches_probing_every_cache(self):
+        for protocol in (None, "MESI", "Dragon"):
+            classifier = SharingClassifier(region_bytes=1024)
+            simulation = Simulation(self.archive, 256, 2, 16, 32, protocol=protocol, sharing=classifier)
+            brute = BruteForceSharing([core.cache for core in simulation.cores])
+            # attached last, so it sees each access after the classifier
+            for core in simulation.cores:
+                attach_tracer(core.cache, brute)
+            results = simulation.run()
+
+            sharing = results["sharing"]
+            self.assertEqual(
+                [[core["private_accesses"], core["shared_accesses"]] for core in sharing["cores"]], brute.counts
+            )
+            self.assertTrue(all(shared for _, shared in brute.counts))
+            for core, counts in zip(results["cores"], brute.counts):
+                self.assertEqual(sum(counts), core["load_store_instrs"])
+            self.assertEqual(
+                sum(private + shared for _, private, shared in sharing["regions"]),
+                sum(core["load_store_instrs"] for core in results["cores"]),
+            )
+            self.assertTrue(all(start % 1024 == 0 for start, _, _ in sharing["regions"]))
+
+    def test_lone_core_is_private(self):
+        results = Simulation(self.single, 256, 2, 16, 32, coalesce=True, sharing=SharingClassifier()).run()
+        core = results["cores"][0]
+        self.assertEqual(results["sharing"]["cores"], [
+            {"core": 0, "private_accesses": core["load_store_instrs"], "shared_accesses": 0}
+        ])
+        # hits collapsed by coalescing count towards their region too
+        self.assertEqual(sum(private + shared for _, private, shared in results["sharing"]["regions"]), core["load_store_instrs"])
+
+    def test_rejects_bad_regions(self):
+        with self.assertRaises(ValueError):
+            SharingClassifier(region_bytes=1000)
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, sharing=SharingClassifier(region_bytes=8))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import random
+import tempfile
+import unittest
+import zipfile
+
+from cache import Cache
+from core import Core
+from simulation import Simulation
+
+
+def random_trace(seed, length=2000):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(length):
+        kind = rng.choice("0012")
+        if kind == "2":
+            lines.append(f"2 0x{rng.randint(1, 40):x}")
+        else:
+            lines.append(f"{kind} 0x{rng.randrange(0, 1 << 12, 4):x}")
+    return "\n".join(lines) + "\n"
+
+
+def write_archive(directory, seeds, length=2000, name="bench.zip"):
+    """
+    Zip a random trace per seed into `directory`, as the cores of one benchmark
+    """
+    path = os.path.join(directory, name)
+    with zipfile.ZipFile(path, "w") as zf:
+        for i, seed in enumerate(seeds):
+            zf.writestr(f"bench_{i}.data", random_trace(seed, length))
+    return path
+
+
+def write_trace(directory, seed, length=2000, name="single_0.data"):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write(random_trace(seed, length))
+    return path
+
+
+class SimulationFixture(unittest.TestCase):
+    """
+    A temporary archive of random traces, one per core, and a single trace,
+    for tests that check a way of running against the plain serial run
+    """
+    cores = 3
+    length = 3000
+    seed = 0
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.archive = write_archive(self.dir.name, range(self.seed, self.seed + self.cores), self.length)
+        self.single = write_trace(self.dir.name, self.seed + self.cores, self.length)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def configurations(self, shared_bus: bool = True):
+        """
+        (input file, Simulation options) runs covering the cache engines,
+        coalescing and protocols; without shared_bus, only the lone core runs
+        under a protocol
+        """
+        runs = [
+            (self.single, {}),
+            (self.single, {"cache_engine": "compact", "coalesce": True}),
+            (self.single, {"protocol": "MESI"}),
+            (self.single, {"protocol": "Dragon", "coalesce": True}),
+            (self.archive, {}),
+            (self.archive, {"cache_engine": "compact", "coalesce": True}),
+        ]
+        if shared_bus:
+            runs += [(self.archive, {"protocol": "MESI"}), (self.archive, {"protocol": "Dragon", "coalesce": True})]
+        return runs
+
+
+class TestSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.archive = os.path.join(self.dir.name, "bench_four.zip")
+        self.traces = [random_trace(seed) for seed in range(4)]
+        with zipfile.ZipFile(self.archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i, text in enumerate(self.traces):
+                zf.writestr(f"bench_{i}.data", text)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def reference_core(self, i, text):
+        # a core on its own, one instruction at a time
+        core = Core(i, Cache(i, 256, 2, 16))
+        for line in text.splitlines():
+            type_code, value = line.split()
+            core.execute(int(type_code), int(value, 16))
+        return core
+
+    def test_multi_core_matches_cores_run_alone(self):
+        simulation = Simulation(self.archive, 256, 2, 16, 32, chunk_size=97)
+        results = simulation.simulate()
+        self.assertEqual(len(results["cores"]), 4)
+        for i, text in enumerate(self.traces):
+            self.assertEqual(results["cores"][i], self.reference_core(i, text).stats())
+        self.assertEqual(
+            results["execution_cycles"],
+            max(core["execution_cycles"] for core in results["cores"]),
+        )
+
+    def test_binary_replay_matches_text(self):
+        path = os.path.join(self.dir.name, "bench_0.data")
+        with open(path, "w") as f:
+            f.write(self.traces[0])
+        binary = Simulation(path, 256, 2, 16, 32).simulate()
+        text = Simulation(path, 256, 2, 16, 32, use_binary_trace=False).simulate()
+        self.assertEqual(binary, text)
+
+    def test_background_decode_matches_inline(self):
+        expected = Simulation(self.archive, 256, 2, 16, 32, chunk_size=97).run()
+        for mode in ("thread", "process"):
+            results = Simulation(self.archive, 256, 2, 16, 32, chunk_size=97, background_decode=mode).run()
+            self.assertEqual(results, expected)
+        with self.assertRaises(ValueError):
+            Simulation(self.archive, 256, 2, 16, 32, background_decode="fiber")
+
+
+if __name__ == "__main__":
+    unittest.main()
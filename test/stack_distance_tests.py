@@ -0,0 +1,53 @@
+import io
+import random
+import unittest
+from contextlib import redirect_stderr
+
+from cache import Cache
+from stack_distance import SetStack, StackDistanceProfile, main, profile_for_sizes
+
+
+class TestStackDistance(unittest.TestCase):
+
+    def test_set_stack_distances(self):
+        stack = SetStack()
+        distances = [stack.use(block) for block in [1, 2, 3, 1, 1, 3, 2, 4, 1]]
+        self.assertEqual(distances, [-1, -1, -1, 2, 0, 1, 2, -1, 3])
+
+    def test_distances_survive_compaction(self):
+        rng = random.Random(7)
+        stack = SetStack()
+        lru = []
+        for _ in range(3000):
+            block = rng.randrange(40)
+            expected = lru.index(block) if block in lru else -1
+            self.assertEqual(stack.use(block), expected)
+            if block in lru:
+                lru.remove(block)
+            lru.insert(0, block)
+
+    def test_matches_cache_for_every_size(self):
+        rng = random.Random(4223)
+        addrs = [rng.randrange(0, 1 << 14) for _ in range(4000)]
+        block_size = 16
+        profile = StackDistanceProfile(block_size, min_sets=1, max_sets=32)
+        for addr in addrs:
+            profile.access(addr)
+        for associativity in (1, 2, 4, 8):
+            for row in profile.curve(associativity):
+                cache = Cache(0, row["cache_size"], associativity, block_size)
+                for addr in addrs:
+                    cache.read(addr)
+                self.assertEqual((row["cache_hits"], row["cache_misses"]), (cache.cache_hits, cache.cache_misses))
+
+    def test_rejects_sizes_without_a_power_of_two_of_sets(self):
+        self.assertEqual(profile_for_sizes([1024, 4096], 2, 32).set_counts, [16, 32, 64])
+        for sizes in ([1536], [1024, 1536], [32], []):
+            with self.assertRaises(ValueError):
+                profile_for_sizes(sizes, 2, 32)
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            main(["unused.data", "--associativity", "4", "--block-size", "32", "--cache-sizes", "64,96"])
+
+
+if __name__ == "__main__":
+    unittest.main()
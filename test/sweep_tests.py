@@ -0,0 +1,39 @@
+import tempfile
+import unittest
+
+from simulation import Simulation
+from sweep import SweepPoint, parse_values, run_sweep, sweep_points
+from test.simulation_tests import write_archive
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_parse_values(self):
+        self.assertEqual(parse_values("16,32,64"), [16, 32, 64])
+        self.assertEqual(parse_values("1024:8192"), [1024, 2048, 4096, 8192])
+        with self.assertRaises(ValueError):
+            parse_values("1000:4000")
+
+    def test_invalid_points_dropped(self):
+        points = sweep_points(["MESI"], [64, 96], [1, 4], [16, 32])
+        self.assertEqual(points, [
+            SweepPoint("MESI", 64, 1, 16),
+            SweepPoint("MESI", 64, 1, 32),
+            SweepPoint("MESI", 64, 4, 16),
+        ])
+
+    def test_matches_single_runs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = write_archive(tmp, range(2), 500)
+            points = sweep_points(["MESI"], [128, 256], [1, 2], [16])
+            rows = run_sweep(archive, points, workers=2)
+            for point, row in zip(points, rows):
+                expected = Simulation(
+                    archive, point.cache_size, point.associativity, point.block_size, 32, protocol=point.protocol,
+                ).run()
+                self.assertEqual(row["cores"], expected["cores"])
+                self.assertEqual(row["execution_cycles"], expected["execution_cycles"])
+
+
+if __name__ == "__main__":
+    unittest.main()
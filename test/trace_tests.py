@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+import zipfile
+
+from traces import (
+    BinaryTrace,
+    TraceSource,
+    background_chunks,
+    binary_path_for,
+    convert_trace,
+    is_binary_trace,
+    load_trace,
+    resolve_trace_sources,
+)
+
+TRACE_TEXT = "0 0x7fe891b0\n2 0x29\n1 0x7f3ae0c8\n2 0x2d\n0 0xffffffff\n"
+TRACE_RECORDS = [(0, 0x7fe891b0), (2, 0x29), (1, 0x7f3ae0c8), (2, 0x2d), (0, 0xffffffff)]
+
+
+class TestBinaryTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.text_path = os.path.join(self.dir.name, "small.data")
+        with open(self.text_path, "w") as f:
+            f.write(TRACE_TEXT)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_convert_and_replay(self):
+        binary_path = os.path.join(self.dir.name, "small.bin")
+        count = convert_trace(self.text_path, binary_path)
+        self.assertEqual(count, len(TRACE_RECORDS))
+        self.assertTrue(is_binary_trace(binary_path))
+        with BinaryTrace(binary_path) as trace:
+            self.assertEqual(len(trace), len(TRACE_RECORDS))
+            self.assertEqual(list(trace), TRACE_RECORDS)
+
+    def test_load_trace_reconverts_when_source_changes(self):
+        with load_trace(self.text_path) as trace:
+            self.assertEqual(list(trace), TRACE_RECORDS)
+        self.assertTrue(os.path.exists(binary_path_for(self.text_path)))
+
+        with open(self.text_path, "a") as f:
+            f.write("1 0x10\n")
+        with load_trace(self.text_path) as trace:
+            self.assertEqual(list(trace), TRACE_RECORDS + [(1, 0x10)])
+
+
+class TestTraceSources(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_zip_members_one_per_core(self):
+        archive = os.path.join(self.dir.name, "four.zip")
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            # written out of order; cores follow the trailing number
+            for i in (2, 0, 10, 1):
+                zf.writestr(f"bench_{i}.data", f"0 0x{i:x}\n2 0x5\n")
+        sources = resolve_trace_sources(archive)
+        self.assertEqual([s.member for s in sources], ["bench_0.data", "bench_1.data", "bench_2.data", "bench_10.data"])
+        self.assertEqual(list(sources[3].records(buffer_size=16)), [(0, 10), (2, 5)])
+
+    def test_plain_file_and_chunks(self):
+        path = os.path.join(self.dir.name, "small.data")
+        with open(path, "w") as f:
+            f.write(TRACE_TEXT)
+        sources = resolve_trace_sources(path)
+        self.assertEqual(sources, [TraceSource(path)])
+        chunks = list(sources[0].chunks(2))
+        self.assertEqual([len(types) for types, _ in chunks], [2, 2, 1])
+        self.assertEqual([r for types, values in chunks for r in zip(types, values)], TRACE_RECORDS)
+
+    def test_background_chunks(self):
+        archive = os.path.join(self.dir.name, "two.zip")
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i in range(2):
+                zf.writestr(f"bench_{i}.data", "".join(f"{j % 3} 0x{i * 1000 + j:x}\n" for j in range(1000)))
+        sources = resolve_trace_sources(archive)
+        for mode in ("thread", "process"):
+            # both cores' readers run at once
+            readers = [background_chunks(source, 64, mode=mode, depth=2) for source in sources]
+            for source, reader in zip(sources, readers):
+                self.assertEqual(
+                    [(list(types), list(values)) for types, values in reader],
+                    [(list(types), list(values)) for types, values in source.chunks(64)],
+                )
+
+            # closed before the end, with the reader blocked on a full queue
+            reader = background_chunks(sources[0], 16, mode=mode, depth=1)
+            next(reader)
+            reader.close()
+
+            with self.assertRaises(FileNotFoundError):
+                list(background_chunks(TraceSource(os.path.join(self.dir.name, "missing.data")), 16, mode=mode))
+
+    def test_unknown_benchmark(self):
+        with self.assertRaises(FileNotFoundError):
+            resolve_trace_sources("no_such_benchmark")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from cache import Cache
+from compact_cache import CompactCache
+from constants import L1_CACHE_HIT_CC, MEM_FETCH_CC
+from tracing import EventRing, attach_tracer, load_events
+
+
+class TestEventRing(unittest.TestCase):
+
+    def test_keeps_last_accesses(self):
+        for cache_type in (Cache, CompactCache):
+            cache = cache_type(id=3, size=64, associativity=2, block_size_bytes=16)
+            ring = EventRing(3)
+            attach_tracer(cache, ring)
+            for addr in (0x00, 0x10, 0x00, 0x20):
+                cache.read(addr)
+            cache.write(0x20)
+
+            events = ring.events()
+            self.assertEqual(len(ring), 3)
+            self.assertEqual([e.seq for e in events], [2, 3, 4])
+            self.assertEqual([(e.write, e.hit) for e in events], [(False, True), (False, False), (True, True)])
+            self.assertEqual([e.cache_id for e in events], [3, 3, 3])
+            self.assertEqual([e.cycles for e in events], [L1_CACHE_HIT_CC, MEM_FETCH_CC + L1_CACHE_HIT_CC, L1_CACHE_HIT_CC])
+            self.assertEqual((events[1].set_index, events[1].tag), (0, 1))
+
+    def test_dump_and_load(self):
+        cache = Cache(id=0, size=64, associativity=2, block_size_bytes=16)
+        ring = EventRing(8)
+        attach_tracer(cache, ring)
+        cache.write(0x40)
+        cache.read(0x40)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events.bin")
+            ring.dump(path)
+            self.assertEqual(load_events(path), ring.events())
+
+
+if __name__ == "__main__":
+    unittest.main()
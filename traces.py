@@ -0,0 +1,408 @@
+"""
+Trace files and their compact binary form.
+
+A text trace holds one "type value" record per line, e.g. "0 0x7fe891b0", where
+type is 0 (load), 1 (store) or 2 (other, value is the number of compute cycles).
+
+Parsing the text is by far the most expensive part of a run, so a trace can be
+converted once into a fixed-width columnar file that is memory-mapped on replay:
+
+    header   magic, format version, record count, sha256 of the source trace
+    values   record count x uint32
+    types    record count x uint8
+
+The values column comes first so it stays 4-byte aligned.
+
+A simulation input may also be a zip archive holding one trace per core (e.g.
+data/blackscholes_four.zip), or a benchmark name that is looked up in data/.
+Zip members are decompressed lazily while they are read, through a bounded
+read-ahead buffer, so they are never extracted to disk or held in memory.
+Streamed traces can also be read and parsed in the background while the
+simulation runs, see background_chunks.
+"""
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+import glob
+import hashlib
+import io
+import logging
+import mmap
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+import zipfile
+
+LOGGER = logging.getLogger("coherence")
+
+BINARY_TRACE_MAGIC = b"CCTRACE\0"
+BINARY_TRACE_VERSION = 1
+BINARY_TRACE_SUFFIX = ".bin"
+HEADER = struct.Struct("<8sIQ32s")
+HEADER_SIZE = 64 # header is padded so the values column is aligned
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+READ_AHEAD_BYTES = 1 << 16
+# parsed chunks a background reader may run ahead by, see background_chunks
+PREFETCH_CHUNKS = 4
+BACKGROUND_MODES = ("thread", "process")
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def is_binary_trace(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_TRACE_MAGIC)) == BINARY_TRACE_MAGIC
+
+def read_header(path: str):
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path} is not a binary trace")
+    magic, version, count, digest = HEADER.unpack(header)
+    if magic != BINARY_TRACE_MAGIC:
+        raise ValueError(f"{path} is not a binary trace")
+    if version != BINARY_TRACE_VERSION:
+        raise ValueError(f"{path} has unsupported binary trace version {version}")
+    return count, digest.hex()
+
+def convert_trace(text_path: str, binary_path: str) -> int:
+    """
+    Convert a text trace into the binary format. Returns the number of records.
+    The file is written under a temporary name and renamed into place, so a
+    partially written trace is never picked up by a later run.
+    """
+    types = array("B")
+    values = array("I")
+    with open(text_path, "rb") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            types.append(int(parts[0]))
+            values.append(int(parts[1], 16))
+
+    digest = bytes.fromhex(file_digest(text_path))
+    tmp_path = binary_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(BINARY_TRACE_MAGIC, BINARY_TRACE_VERSION, len(types), digest).ljust(HEADER_SIZE, b"\0"))
+        values.tofile(f)
+        types.tofile(f)
+    os.replace(tmp_path, binary_path)
+    LOGGER.info(f"Converted {text_path} to {binary_path} ({len(types)} records)")
+    return len(types)
+
+@dataclass
+class BinaryTrace:
+    """
+    Memory-mapped binary trace. `types` and `values` are zero-copy memoryviews
+    over the file, and iterating yields (type code, value) pairs of plain ints.
+    """
+    path: str
+    count: int
+    source_digest: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count, self.source_digest = read_header(path)
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        values_end = HEADER_SIZE + 4 * self.count
+        self.values = view[HEADER_SIZE:values_end].cast("I")
+        self.types = view[values_end:values_end + self.count]
+        view.release()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return zip(self.types, self.values)
+
+    def close(self):
+        self.values.release()
+        self.types.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def binary_path_for(text_path: str) -> str:
+    return text_path + BINARY_TRACE_SUFFIX
+
+def load_trace(path: str) -> BinaryTrace:
+    """
+    Open `path` as a binary trace. A text trace is converted on first use and the
+    result kept next to it; the stored source hash is checked on every later use
+    so an edited trace is reconverted rather than replayed stale.
+    """
+    if is_binary_trace(path):
+        return BinaryTrace(path)
+    binary_path = binary_path_for(path)
+    if os.path.exists(binary_path):
+        try:
+            _, digest = read_header(binary_path)
+        except ValueError:
+            digest = None
+        if digest == file_digest(path):
+            return BinaryTrace(binary_path)
+        LOGGER.info(f"{binary_path} is stale, reconverting")
+    convert_trace(path, binary_path)
+    return BinaryTrace(binary_path)
+
+def _parse_records(stream):
+    for line in stream:
+        parts = line.split()
+        if parts:
+            yield int(parts[0]), int(parts[1], 16)
+
+@dataclass
+class TraceSource:
+    """
+    One core's trace: a plain file, or a member of a zip archive.
+    """
+    path: str
+    member: str = None
+
+    @property
+    def name(self) -> str:
+        return self.member if self.member is not None else os.path.basename(self.path)
+
+    def records(self, buffer_size: int = READ_AHEAD_BYTES):
+        """
+        Iterate over (type code, value) pairs, parsing the text as it is read.
+        At most `buffer_size` bytes of the trace are buffered at a time.
+        """
+        if self.member is None:
+            with open(self.path, "rb", buffering=buffer_size) as f:
+                yield from _parse_records(f)
+        else:
+            with zipfile.ZipFile(self.path) as zf, zf.open(self.member) as raw:
+                yield from _parse_records(io.BufferedReader(raw, buffer_size))
+
+    def chunks(self, chunk_size: int, buffer_size: int = READ_AHEAD_BYTES):
+        """
+        Iterate over (types, values) arrays of up to `chunk_size` records each.
+        """
+        types = array("B")
+        values = array("I")
+        for type_code, value in self.records(buffer_size):
+            types.append(type_code)
+            values.append(value)
+            if len(types) == chunk_size:
+                yield types, values
+                types = array("B")
+                values = array("I")
+        if types:
+            yield types, values
+
+def background_chunks(source, chunk_size: int, buffer_size: int = READ_AHEAD_BYTES,
+                      mode: str = "thread", depth: int = PREFETCH_CHUNKS):
+    """
+    Iterate over source.chunks(chunk_size, buffer_size), read and parsed in a
+    background thread or process while the caller simulates the previous
+    chunks. At most `depth` parsed chunks wait in between.
+
+    A thread overlaps reading and decompression (which release the GIL) with
+    the simulation; a process also overlaps the parsing itself, at the cost of
+    sending every chunk across, and needs a picklable source.
+    """
+    if mode == "thread":
+        return _thread_chunks(source, chunk_size, buffer_size, depth)
+    if mode == "process":
+        return _process_chunks(source, chunk_size, buffer_size, depth)
+    raise ValueError(f"Unknown background mode {mode}, expected one of {', '.join(BACKGROUND_MODES)}")
+
+@dataclass
+class _Failed:
+    # raised again on the consumer's side
+    error: BaseException
+
+def _produce(source, chunk_size, buffer_size, put):
+    # put() returns False once the consumer has gone away
+    try:
+        for chunk in source.chunks(chunk_size, buffer_size):
+            if not put(chunk):
+                return
+        put(None)
+    except Exception as e:
+        put(_Failed(e))
+
+def _thread_chunks(source, chunk_size, buffer_size, depth):
+    chunks = queue.Queue(depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    producer = threading.Thread(
+        target=_produce, args=(source, chunk_size, buffer_size, put), name=f"decode {source.name}", daemon=True,
+    )
+    producer.start()
+    try:
+        yield from _consume(chunks.get)
+    finally:
+        stop.set()
+        producer.join()
+
+def _process_main(source, chunk_size, buffer_size, chunks):
+    _produce(source, chunk_size, buffer_size, lambda item: chunks.put(item) or True)
+
+def _process_chunks(source, chunk_size, buffer_size, depth):
+    chunks = multiprocessing.Queue(depth)
+    producer = multiprocessing.Process(
+        target=_process_main, args=(source, chunk_size, buffer_size, chunks), name=f"decode {source.name}", daemon=True,
+    )
+    producer.start()
+
+    def get():
+        while True:
+            try:
+                return chunks.get(timeout=1)
+            except queue.Empty:
+                if not producer.is_alive():
+                    # it may have put its last chunk just before exiting
+                    try:
+                        return chunks.get_nowait()
+                    except queue.Empty:
+                        raise RuntimeError(f"Background reader of {source.name} exited with code {producer.exitcode}")
+
+    try:
+        yield from _consume(get)
+    finally:
+        if producer.is_alive():
+            # stopped early, the producer may be blocked on a full queue
+            producer.terminate()
+        producer.join()
+        chunks.close()
+
+def _consume(get):
+    while True:
+        item = get()
+        if item is None:
+            return
+        if isinstance(item, _Failed):
+            raise item.error
+        yield item
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # before 3.13 attaching also registers the block with the resource
+        # tracker, which worker processes share with the creator, so this is
+        # a no-op as long as the creator unlinks it
+        return shared_memory.SharedMemory(name)
+
+@dataclass
+class SharedTrace:
+    """
+    A decoded trace held in shared memory, laid out like the body of a binary
+    trace (values column, then types column). Worker processes attach to it by
+    name, so a trace decoded once can be replayed by many of them without
+    being copied.
+    """
+    shm_name: str
+    count: int
+    name: str
+
+    @classmethod
+    def create(cls, source: TraceSource) -> tuple["SharedTrace", shared_memory.SharedMemory]:
+        """
+        Decode `source` into a new shared memory block. The caller owns the
+        returned block and must close and unlink it when done.
+        """
+        if source.member is None:
+            with load_trace(source.path) as trace:
+                return cls._copy(source.name, trace.types, trace.values)
+        types = array("B")
+        values = array("I")
+        for chunk_types, chunk_values in source.chunks(1 << 16):
+            types.extend(chunk_types)
+            values.extend(chunk_values)
+        return cls._copy(source.name, types, values)
+
+    @classmethod
+    def _copy(cls, name, types, values):
+        count = len(types)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, 5 * count))
+        shm.buf[:4 * count] = memoryview(values).cast("B")
+        shm.buf[4 * count:5 * count] = types
+        return cls(shm.name, count, name), shm
+
+    @contextmanager
+    def attach(self):
+        """
+        Yield (types, values) memoryviews over the shared block
+        """
+        shm = _attach_shared_memory(self.shm_name)
+        values = shm.buf[:4 * self.count].cast("I")
+        types = shm.buf[4 * self.count:5 * self.count]
+        try:
+            yield types, values
+        finally:
+            values.release()
+            types.release()
+            shm.close()
+
+def _core_number(name: str):
+    match = re.search(r"(\d+)\D*$", name)
+    return (int(match.group(1)) if match else -1, name)
+
+def resolve_trace_sources(input_file: str) -> list[TraceSource]:
+    """
+    Map a simulation input to one trace per core. `input_file` is a trace file,
+    a zip archive of per-core traces, or a benchmark name such as "blackscholes",
+    which matches data/blackscholes_*.data or else data/blackscholes*.zip.
+    """
+    if os.path.isfile(input_file):
+        if zipfile.is_zipfile(input_file):
+            with zipfile.ZipFile(input_file) as zf:
+                members = [
+                    info.filename for info in zf.infolist()
+                    if not info.is_dir() and not os.path.basename(info.filename).startswith(".")
+                    and not info.filename.startswith("__MACOSX")
+                ]
+            if not members:
+                raise ValueError(f"{input_file} contains no traces")
+            return [TraceSource(input_file, member) for member in sorted(members, key=_core_number)]
+        return [TraceSource(input_file)]
+
+    paths = glob.glob(os.path.join(DATA_DIR, f"{input_file}_*.data"))
+    if paths:
+        return [TraceSource(path) for path in sorted(paths, key=_core_number)]
+    archives = sorted(glob.glob(os.path.join(DATA_DIR, f"{input_file}*.zip")))
+    if archives:
+        return resolve_trace_sources(archives[0])
+    raise FileNotFoundError(f"No trace file or benchmark named {input_file}")
+
+def main():
+    """
+    python traces.py input_file [output_file]
+    """
+    text_path = sys.argv[1]
+    binary_path = sys.argv[2] if len(sys.argv) > 2 else binary_path_for(text_path)
+    count = convert_trace(text_path, binary_path)
+    print(f"{count} records written to {binary_path}")
+
+if __name__ == "__main__":
+    main()
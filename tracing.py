@@ -0,0 +1,110 @@
+"""
+Per-access tracing for Cache.
+
+Caches do no logging of their own. When tracing is wanted, attach_tracer wraps
+a cache's read_block/write_block once, so an untraced run pays nothing per
+access and a traced one builds each event only because a tracer is listening.
+
+Two tracers are provided:
+    LogTracer  logs every access through the "coherence" logger
+    EventRing  keeps the last N accesses as fixed-size binary records, for
+               post-mortem inspection of what led up to a failure
+"""
+from collections import namedtuple
+from dataclasses import dataclass
+import logging
+import struct
+
+LOGGER = logging.getLogger("coherence")
+
+# event flags
+WRITE = 1
+HIT = 2
+
+CacheEvent = namedtuple("CacheEvent", ["seq", "cache_id", "write", "hit", "set_index", "tag", "cycles"])
+
+def attach_tracer(cache, tracer):
+    """
+    Route every access of `cache` through tracer.record(cache_id, flags,
+    set_index, tag, cycles), where cycles is what the access cost.
+    """
+    read_block, write_block = cache.read_block, cache.write_block
+
+    def traced(block_access, flags):
+        def access(set_ind: int, tag: int):
+            hits, cycles = cache.cache_hits, cache.cycles
+            block_access(set_ind, tag)
+            tracer.record(
+                cache.id, flags | (HIT if cache.cache_hits != hits else 0), set_ind, tag, cache.cycles - cycles
+            )
+        return access
+
+    cache.read_block = traced(read_block, 0)
+    cache.write_block = traced(write_block, WRITE)
+
+@dataclass
+class LogTracer:
+    level: int = logging.INFO
+
+    def record(self, cache_id, flags, set_index, tag, cycles):
+        LOGGER.log(
+            self.level,
+            f"Cache {cache_id}: {'write' if flags & WRITE else 'read'} "
+            f"{'hit' if flags & HIT else 'miss'} for tag: {tag}, set id = {set_index}, {cycles} cycles",
+        )
+
+@dataclass
+class EventRing:
+    """
+    Ring buffer of the last `capacity` cache accesses. Records are packed into
+    one preallocated bytearray, so recording allocates nothing.
+    """
+    capacity: int
+    seq: int = 0
+
+    RECORD = struct.Struct("<QHBxIIQ") # seq, cache id, flags, set index, tag, cycles
+    FILE_MAGIC = b"CCEVENTS"
+
+    def __post_init__(self):
+        if self.capacity <= 0:
+            raise ValueError("EventRing capacity must be positive")
+        self.buffer = bytearray(self.capacity * self.RECORD.size)
+
+    def record(self, cache_id, flags, set_index, tag, cycles):
+        self.RECORD.pack_into(
+            self.buffer, (self.seq % self.capacity) * self.RECORD.size, self.seq, cache_id, flags, set_index, tag, cycles
+        )
+        self.seq += 1
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    def raw_records(self) -> bytes:
+        """
+        Recorded events, oldest first, in their packed form
+        """
+        if self.seq <= self.capacity:
+            return bytes(self.buffer[:self.seq * self.RECORD.size])
+        split = (self.seq % self.capacity) * self.RECORD.size
+        return bytes(self.buffer[split:] + self.buffer[:split])
+
+    def events(self) -> list[CacheEvent]:
+        return _unpack_events(self.raw_records())
+
+    def dump(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.FILE_MAGIC)
+            f.write(self.raw_records())
+
+def _unpack_events(data: bytes) -> list[CacheEvent]:
+    return [
+        CacheEvent(seq, cache_id, bool(flags & WRITE), bool(flags & HIT), set_index, tag, cycles)
+        for seq, cache_id, flags, set_index, tag, cycles in EventRing.RECORD.iter_unpack(data)
+    ]
+
+def load_events(path: str) -> list[CacheEvent]:
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(EventRing.FILE_MAGIC):
+        raise ValueError(f"{path} is not an event dump")
+    return _unpack_events(data[len(EventRing.FILE_MAGIC):])